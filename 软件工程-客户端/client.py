@@ -1,5 +1,5 @@
 #!/usr/bin/env python3
-import sys, json, socket, threading, traceback, time
+import sys, json, socket, threading, traceback, time, csv
 from PyQt5.QtWidgets import *
 from PyQt5.QtGui import *
 from PyQt5.QtCore import *
@@ -13,6 +13,8 @@ from functools import partial
 # ========================= 网络客户端 =========================
 class DesktopClient(QObject):
     real_time_message = pyqtSignal(dict)  # 供界面连接
+    presence = pyqtSignal(dict)  # 联系人在线状态变化推送
+    read_receipt = pyqtSignal(dict)  # 本账号在其他客户端标记已读后的未读数推送
     resp_sig = pyqtSignal(dict)  # 添加resp_sig信号定义
 
     def __init__(self, host="frp-off.com", port=52784):  # frp-off.com:52784
@@ -60,9 +62,19 @@ class DesktopClient(QObject):
         if resp.get("type") == "real_time_message":
             self.real_time_message.emit(resp)
             return
+        if resp.get("type") == "presence":
+            self.presence.emit(resp)
+            return
+        if resp.get("type") == "read_receipt":
+            self.read_receipt.emit(resp)
+            return
         # 正常响应
         seq = resp.get("seq")
-        cb = self._pendings.pop(seq, None)
+        # 流式响应的中间块保留回调，收到结束标记（done）后再移除
+        if resp.get("stream") and not resp.get("done"):
+            cb = self._pendings.get(seq)
+        else:
+            cb = self._pendings.pop(seq, None)
         if cb:
             # 修改为使用resp_sig信号发射响应
             # 直接调用回调函数
@@ -124,7 +136,6 @@ class MainWindow(QMainWindow):
         self.unread_count = 0  # 添加未读消息计数
         self.server_status_timer = QTimer()  # 添加服务器状态定时器
         self.server_status_timer.timeout.connect(self.refresh_server_status)
-        self.online_users = set()  # 在线用户集合
         self._init_ui()
         self._bind_signal()
 
@@ -212,19 +223,6 @@ class MainWindow(QMainWindow):
                 self.user = resp["user"]
                 self.status.setText(f"已登录：{self.user['Username']}")
 
-                # 更新在线用户列表
-                if "online_users" in resp:
-                    self.online_users = set(resp["online_users"])
-                    # 更新主窗口中的在线用户列表
-                    if hasattr(self, 'stack'):
-                        for i in range(self.stack.count()):
-                            page = self.stack.widget(i)
-                            if isinstance(page, MessagePage):
-                                page.online_users = self.online_users
-                                if hasattr(page, '_refresh_contact_list'):
-                                    page._refresh_contact_list()
-                                break
-
                 self._update_navbar_visibility()  # 添加：更新导航栏可见性
                 # 登录成功时上报在线状态
                 self.client.send({"type": "user_online", "user_id": self.user["UserID"]},
@@ -233,11 +231,12 @@ class MainWindow(QMainWindow):
                 # 登录成功后查询未读消息
                 self._check_unread_messages()
 
-                # 登录成功后立即获取联系人列表
+                # 登录成功后立即获取联系人列表，并开始增量同步消息
                 for i in range(self.stack.count()):
                     page = self.stack.widget(i)
                     if isinstance(page, MessagePage):
                         page._refresh_contacts()
+                        page.start_sync()
                         break
 
                 # 如果是管理员，显示管理员面板和服务器控制台
@@ -258,18 +257,6 @@ class MainWindow(QMainWindow):
             else:
                 QMessageBox.warning(self, "注册失败", resp.get("message", "未知错误"))
 
-        elif t == "user_online" or t == "get_contacts":
-            if "online_users" in resp:
-                self.online_users = set(resp["online_users"])
-                # 更新所有消息页面的在线用户列表
-                if hasattr(self, 'stack'):
-                    for i in range(self.stack.count()):
-                        page = self.stack.widget(i)
-                        if isinstance(page, MessagePage):
-                            page.online_users = self.online_users
-                            if hasattr(page, '_refresh_contact_list'):
-                                page._refresh_contact_list()
-
         # 添加对实时消息的处理
         elif t == "real_time_message":
             # 处理实时消息，即使不在传声筒页面也要处理未读消息
@@ -295,6 +282,9 @@ class MainWindow(QMainWindow):
         if resp.get("type") == "real_time_message":
             message = resp.get("message", {})
             sender_id = message.get("sender_id")
+            # 自己在其他客户端发出的消息，不计入未读
+            if self.user and str(sender_id) == str(self.user["UserID"]):
+                return
 
             # 更新未读消息计数（无论在哪个页面）
             sender_id_str = str(sender_id)
@@ -443,6 +433,13 @@ class MainWindow(QMainWindow):
         # 停止服务器状态定时器
         self.server_status_timer.stop()
 
+        # 停止消息增量同步
+        for i in range(self.stack.count()):
+            page = self.stack.widget(i)
+            if isinstance(page, MessagePage):
+                page.stop_sync()
+                break
+
         # 重置导航栏
         self.nav.clear()
         self.nav.addItems(["主页", "签到/排行", "个人资料"])
@@ -1160,10 +1157,19 @@ class AdminPage(BasePage):
     def __init__(self, parent):
         super().__init__(parent)
 
-        # 初始化分页相关变量
+        # 初始化分页相关变量（服务端按 UserID 键集分页，页码仅用于显示）
         self.current_page = 1
         self.total_pages = 1
         self.page_size = 10
+        self.page_cursor = {}  # 当前页的翻页参数（after_id / before_id / last），刷新时原样重发
+        self.page_first_uid = None
+        self.page_last_uid = None
+
+        # 白名单审批队列分页（服务端分页与筛选）
+        self.wl_page = 1
+        self.wl_total_pages = 1
+        self.wl_page_size = 20
+        self.wl_applications = []  # 当前页的申请，批量审批时按选中行取用
 
         # 创建标签页控件
         self.tabWidget = QTabWidget()
@@ -1176,6 +1182,29 @@ class AdminPage(BasePage):
         # 设置用户管理标签页
         userLayout = QVBoxLayout(self.userManagementTab)
         userLayout.addWidget(QLabel("管理员控制台——所有用户"))
+
+        # 用户筛选条件（服务端筛选）
+        userFilterWidget = QWidget()
+        userFilterLayout = QHBoxLayout(userFilterWidget)
+        userFilterLayout.setContentsMargins(0, 0, 0, 0)
+        self.roleFilterCombo = QComboBox()
+        for text, value in (("全部角色", None), ("管理员", 1), ("VIP用户", 2), ("用户", 3), ("访客", 4), ("封禁", 5)):
+            self.roleFilterCombo.addItem(text, value)
+        self.whiteFilterCombo = QComboBox()
+        for text, value in (("全部白名单状态", None), ("已通过", 1), ("未通过", 0)):
+            self.whiteFilterCombo.addItem(text, value)
+        self.onlineFilterCombo = QComboBox()
+        for text, value in (("全部在线状态", None), ("在线", True), ("离线", False)):
+            self.onlineFilterCombo.addItem(text, value)
+        self.namePrefixInput = QLineEdit()
+        self.namePrefixInput.setPlaceholderText("用户名/昵称/玩家名前缀")
+        self.namePrefixInput.returnPressed.connect(self._first_page)
+        userSearchBtn = QPushButton("查询")
+        userSearchBtn.clicked.connect(self._first_page)
+        for widget in (self.roleFilterCombo, self.whiteFilterCombo, self.onlineFilterCombo,
+                       self.namePrefixInput, userSearchBtn):
+            userFilterLayout.addWidget(widget)
+        userLayout.addWidget(userFilterWidget)
         self.table = QTableWidget(0, 12)
         self.table.setHorizontalHeaderLabels([
             "UID", "用户名", "昵称", "邮箱", "角色", "玩家名",
@@ -1210,9 +1239,6 @@ class AdminPage(BasePage):
         self.lastPageBtn = QPushButton("末页")
 
         self.pageInfoLabel = QLabel()
-        self.pageInput = QLineEdit()
-        self.pageInput.setFixedWidth(50)
-        self.jumpBtn = QPushButton("跳转")
 
         paginationLayout.addWidget(self.firstPageBtn)
         paginationLayout.addWidget(self.prevPageBtn)
@@ -1220,9 +1246,9 @@ class AdminPage(BasePage):
         paginationLayout.addWidget(self.nextPageBtn)
         paginationLayout.addWidget(self.lastPageBtn)
         paginationLayout.addStretch()
-        paginationLayout.addWidget(QLabel("跳转到:"))
-        paginationLayout.addWidget(self.pageInput)
-        paginationLayout.addWidget(self.jumpBtn)
+        self.exportUsersBtn = QPushButton("导出全部用户")
+        self.exportUsersBtn.clicked.connect(self._export_users)
+        paginationLayout.addWidget(self.exportUsersBtn)
 
         userLayout.addWidget(self.paginationWidget)
 
@@ -1231,7 +1257,6 @@ class AdminPage(BasePage):
         self.prevPageBtn.clicked.connect(self._prev_page)
         self.nextPageBtn.clicked.connect(self._next_page)
         self.lastPageBtn.clicked.connect(self._last_page)
-        self.jumpBtn.clicked.connect(self._jump_to_page)
 
         # 设置白名单审批标签页
         whitelistLayout = QVBoxLayout(self.whitelistApprovalTab)
@@ -1244,12 +1269,61 @@ class AdminPage(BasePage):
         self.whitelistTable.setColumnWidth(3, 80)  # 账号类型
         self.whitelistTable.setColumnWidth(4, 200)  # 申请理由
         self.whitelistTable.setColumnWidth(5, 200)  # 操作
-        whitelistLayout.addWidget(QLabel("待审批的白名单申请:"))
+        # 支持多选整行，用于批量审批
+        self.whitelistTable.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.whitelistTable.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        # 申请统计
+        self.whitelistSummaryLabel = QLabel("白名单申请统计加载中...")
+        whitelistLayout.addWidget(self.whitelistSummaryLabel)
+
+        # 筛选条件
+        filterWidget = QWidget()
+        filterLayout = QHBoxLayout(filterWidget)
+        filterLayout.setContentsMargins(0, 0, 0, 0)
+        self.wlStatusCombo = QComboBox()
+        self.wlStatusCombo.addItems(["待审核", "已通过", "未通过", "全部"])
+        self.wlGenuineCombo = QComboBox()
+        self.wlGenuineCombo.addItem("全部类型", None)
+        self.wlGenuineCombo.addItem("正版", 1)
+        self.wlGenuineCombo.addItem("离线", 0)
+        self.wlDateFromInput = QLineEdit()
+        self.wlDateFromInput.setPlaceholderText("起始日期 YYYY-MM-DD")
+        self.wlDateToInput = QLineEdit()
+        self.wlDateToInput.setPlaceholderText("结束日期 YYYY-MM-DD")
+        self.wlOrderCombo = QComboBox()
+        self.wlOrderCombo.addItem("最新在前", "desc")
+        self.wlOrderCombo.addItem("最早在前", "asc")
+        wlSearchBtn = QPushButton("查询")
+        wlSearchBtn.clicked.connect(self._search_whitelist_applications)
+        for widget in (QLabel("状态:"), self.wlStatusCombo, QLabel("账号类型:"), self.wlGenuineCombo,
+                       self.wlDateFromInput, self.wlDateToInput, self.wlOrderCombo, wlSearchBtn):
+            filterLayout.addWidget(widget)
+        whitelistLayout.addWidget(filterWidget)
+
         whitelistLayout.addWidget(self.whitelistTable)
 
+        # 审批队列分页
+        wlPaginationWidget = QWidget()
+        wlPaginationLayout = QHBoxLayout(wlPaginationWidget)
+        self.wlPrevPageBtn = QPushButton("上一页")
+        self.wlNextPageBtn = QPushButton("下一页")
+        self.wlPageInfoLabel = QLabel()
         refreshWhitelistBtn = QPushButton("刷新白名单申请")
         refreshWhitelistBtn.clicked.connect(self._load_whitelist_applications)
-        whitelistLayout.addWidget(refreshWhitelistBtn)
+        bulkApproveBtn = QPushButton("通过所选")
+        bulkApproveBtn.clicked.connect(partial(self._process_selected_applications, True))
+        bulkRejectBtn = QPushButton("拒绝所选")
+        bulkRejectBtn.clicked.connect(partial(self._process_selected_applications, False))
+        wlPaginationLayout.addWidget(self.wlPrevPageBtn)
+        wlPaginationLayout.addWidget(self.wlPageInfoLabel)
+        wlPaginationLayout.addWidget(self.wlNextPageBtn)
+        wlPaginationLayout.addStretch()
+        wlPaginationLayout.addWidget(bulkApproveBtn)
+        wlPaginationLayout.addWidget(bulkRejectBtn)
+        wlPaginationLayout.addWidget(refreshWhitelistBtn)
+        whitelistLayout.addWidget(wlPaginationWidget)
+        self.wlPrevPageBtn.clicked.connect(self._wl_prev_page)
+        self.wlNextPageBtn.clicked.connect(self._wl_next_page)
 
         # 主布局
         lay = QVBoxLayout(self)
@@ -1260,83 +1334,112 @@ class AdminPage(BasePage):
 
     def showEvent(self, event):
         # 页面显示时加载数据
-        self._load_page_count()
-
-    def _load_page_count(self):
-        """加载用户总数并计算分页信息"""
-        self.client.send({"type": "get_users_count"}, callback=self._on_page_count_received)
-
-    def _on_page_count_received(self, resp):
-        """收到用户总数后的回调"""
-        if resp.get("success"):
-            user_count = resp.get("count", 0)
-            self.total_pages = (user_count + self.page_size - 1) // self.page_size  # 向上取整
-            self.current_page = 1  # 重置到第一页
-            self._load_current_page()
-        else:
-            QMessageBox.warning(self, "失败", f"获取用户数量失败: {resp.get('message', '未知错误')}")
+        self._first_page()
+
+    def _user_filters(self):
+        """当前筛选条件"""
+        return {
+            "role": self.roleFilterCombo.currentData(),
+            "white_state": self.whiteFilterCombo.currentData(),
+            "online": self.onlineFilterCombo.currentData(),
+            "name_prefix": self.namePrefixInput.text().strip() or None,
+        }
 
     def _load_current_page(self):
-        """加载当前页数据"""
-        self.client.send({
-            "type": "get_users_by_page",
-            "page": self.current_page,
-            "page_size": self.page_size
-        }, callback=self._on_users_page_received)
+        """按当前翻页参数与筛选条件加载一页（也用于操作后的刷新）"""
+        req = {"type": "list_users", "user_id": self.main.user["UserID"], "page_size": self.page_size}
+        req.update(self._user_filters())
+        req.update(self.page_cursor)
+        self.client.send(req, callback=self._on_users_page_received)
 
     def _on_users_page_received(self, resp):
         """收到分页用户数据后的回调"""
         if resp.get("success"):
-            self._fill(resp["data"])
-            self._update_pagination_info()
+            users = resp["data"]
+            total = resp.get("total", 0)
+            self.total_pages = max(1, (total + self.page_size - 1) // self.page_size)  # 向上取整
+            # 总数为服务端缓存的近似值，页码只作提示
+            if self.page_cursor.get("last"):
+                self.current_page = self.total_pages
+            self.current_page = min(max(1, self.current_page), self.total_pages)
+            self.page_first_uid = users[0]["UserID"] if users else None
+            self.page_last_uid = users[-1]["UserID"] if users else None
+            self._fill(users)
+            self._update_pagination_info(total, resp.get("has_prev", False), resp.get("has_next", False))
         else:
             QMessageBox.warning(self, "失败", f"获取用户数据失败: {resp.get('message', '未知错误')}")
 
-    def _update_pagination_info(self):
+    def _update_pagination_info(self, total, has_prev, has_next):
         """更新分页信息显示"""
-        self.pageInfoLabel.setText(f"第 {self.current_page} 页，共 {self.total_pages} 页")
+        self.pageInfoLabel.setText(f"第 {self.current_page} 页，约 {self.total_pages} 页（约 {total} 人）")
 
         # 更新按钮状态
-        self.firstPageBtn.setEnabled(self.current_page > 1)
-        self.prevPageBtn.setEnabled(self.current_page > 1)
-        self.nextPageBtn.setEnabled(self.current_page < self.total_pages)
-        self.lastPageBtn.setEnabled(self.current_page < self.total_pages)
+        self.firstPageBtn.setEnabled(has_prev)
+        self.prevPageBtn.setEnabled(has_prev)
+        self.nextPageBtn.setEnabled(has_next)
+        self.lastPageBtn.setEnabled(has_next)
 
     def _first_page(self):
-        """首页"""
-        if self.current_page != 1:
-            self.current_page = 1
-            self._load_current_page()
+        """首页（筛选条件变化后也从首页开始）"""
+        self.current_page = 1
+        self.page_cursor = {}
+        self._load_current_page()
 
     def _prev_page(self):
         """上一页"""
-        if self.current_page > 1:
+        if self.page_first_uid is not None:
             self.current_page -= 1
+            self.page_cursor = {"before_id": self.page_first_uid}
             self._load_current_page()
 
     def _next_page(self):
         """下一页"""
-        if self.current_page < self.total_pages:
+        if self.page_last_uid is not None:
             self.current_page += 1
+            self.page_cursor = {"after_id": self.page_last_uid}
             self._load_current_page()
 
     def _last_page(self):
         """末页"""
-        if self.current_page != self.total_pages:
-            self.current_page = self.total_pages
-            self._load_current_page()
+        self.page_cursor = {"last": True}
+        self._load_current_page()
+
+    EXPORT_FIELDS = ["UserID", "Username", "Nickname", "Email", "Phone", "RoleID", "PlayerName", "Genuine",
+                     "WhiteState", "PassDate", "QQID", "Coins", "Stars", "CreatedAt", "online"]
 
-    def _jump_to_page(self):
-        """跳转到指定页"""
+    def _export_users(self):
+        """流式导出全部用户到 CSV：服务端分块发送，每收到一块立即写入文件"""
+        path, _ = QFileDialog.getSaveFileName(self, "导出全部用户", "users.csv", "CSV 文件 (*.csv)")
+        if not path:
+            return
         try:
-            page = int(self.pageInput.text())
-            if 1 <= page <= self.total_pages:
-                self.current_page = page
-                self._load_current_page()
-            else:
-                QMessageBox.warning(self, "无效页码", f"请输入1到{self.total_pages}之间的页码")
-        except ValueError:
-            QMessageBox.warning(self, "无效输入", "请输入有效的页码数字")
+            self._export_file = open(path, "w", encoding="utf-8-sig", newline="")
+        except OSError as e:
+            QMessageBox.warning(self, "失败", f"无法写入文件: {e}")
+            return
+        self._export_path = path
+        self._export_rows = 0
+        self._export_writer = csv.DictWriter(self._export_file, fieldnames=self.EXPORT_FIELDS, extrasaction="ignore")
+        self._export_writer.writeheader()
+        self.exportUsersBtn.setEnabled(False)
+        self.exportUsersBtn.setText("导出中...")
+        self.client.send({"type": "get_all_users", "stream": True, "user_id": self.main.user["UserID"]},
+                         callback=self._on_export_chunk)
+
+    def _on_export_chunk(self, resp):
+        if resp.get("success") and not resp.get("done"):
+            self._export_writer.writerows(resp.get("data", []))
+            self._export_rows += len(resp.get("data", []))
+            self.exportUsersBtn.setText(f"导出中...（{self._export_rows}）")
+            return
+        # 结束标记或出错
+        self._export_file.close()
+        self.exportUsersBtn.setEnabled(True)
+        self.exportUsersBtn.setText("导出全部用户")
+        if resp.get("success"):
+            QMessageBox.information(self, "成功", f"已导出 {self._export_rows} 名用户到 {self._export_path}")
+        else:
+            QMessageBox.warning(self, "失败", f"导出失败: {resp.get('message', '未知错误')}")
 
     def _fill(self, users):
         self.table.setRowCount(len(users))
@@ -1518,102 +1621,180 @@ class AdminPage(BasePage):
         if index == 1:  # 白名单审批标签页
             self._load_whitelist_applications()
 
+    def _search_whitelist_applications(self):
+        """筛选条件变化后从第一页重新查询"""
+        self.wl_page = 1
+        self._load_whitelist_applications()
+
+    def _wl_prev_page(self):
+        if self.wl_page > 1:
+            self.wl_page -= 1
+            self._load_whitelist_applications()
+
+    def _wl_next_page(self):
+        if self.wl_page < self.wl_total_pages:
+            self.wl_page += 1
+            self._load_whitelist_applications()
+
     def _load_whitelist_applications(self):
-        self.client.send({"type": "get_all_whitelist_applications"},
-                         callback=self._on_whitelist_applications_received)
+        """按当前筛选条件加载一页申请，并刷新统计"""
+        admin_id = self.main.user["UserID"]
+        self.client.send({
+            "type": "get_all_whitelist_applications",
+            "user_id": admin_id,
+            "status": self.wlStatusCombo.currentText(),
+            "genuine": self.wlGenuineCombo.currentData(),
+            "date_from": self.wlDateFromInput.text().strip() or None,
+            "date_to": self.wlDateToInput.text().strip() or None,
+            "order": self.wlOrderCombo.currentData(),
+            "page": self.wl_page,
+            "page_size": self.wl_page_size
+        }, callback=self._on_whitelist_applications_received)
+        self.client.send({"type": "get_whitelist_summary", "user_id": admin_id},
+                         callback=self._on_whitelist_summary_received)
+
+    def _on_whitelist_summary_received(self, resp):
+        if resp.get("success"):
+            summary = resp["summary"]
+            self.whitelistSummaryLabel.setText(
+                f"待审核 {summary['pending']} | 已通过 {summary['approved']} | "
+                f"未通过 {summary['rejected']} | 今日新增 {summary['today']}")
 
     def _on_whitelist_applications_received(self, resp):
         self.whitelistTable.setRowCount(0)  # 清空表格
-        if resp.get("success"):
-            applications = resp.get("applications", [])
-            self.whitelistTable.setRowCount(len(applications))
-            for i, app in enumerate(applications):
-                # 申请时间
-                date_item = QTableWidgetItem(app.get("date", "") or "")
-                date_item.setFlags(date_item.flags() & ~Qt.ItemIsEditable)
-                self.whitelistTable.setItem(i, 0, date_item)
-
-                # 用户ID
-                user_id_item = QTableWidgetItem(str(app.get("user_id", "") or ""))
-                user_id_item.setFlags(user_id_item.flags() & ~Qt.ItemIsEditable)
-                self.whitelistTable.setItem(i, 1, user_id_item)
-
-                # 玩家名
-                playername_item = QTableWidgetItem(app.get("playername", "") or "")
-                playername_item.setFlags(playername_item.flags() & ~Qt.ItemIsEditable)
-                self.whitelistTable.setItem(i, 2, playername_item)
-
-                # 账号类型 - 从内容中解析
-                content = app.get("content", "")
-                genuine_text = "未知"
-                if "正版" in content:
-                    genuine_text = "正版"
-                elif "离线" in content:
-                    genuine_text = "离线"
-                genuine_item = QTableWidgetItem(genuine_text)
-                genuine_item.setFlags(genuine_item.flags() & ~Qt.ItemIsEditable)
-                self.whitelistTable.setItem(i, 3, genuine_item)
-
-                # 申请理由 - 从内容中解析
-                reason_text = content
-                if reason_text.startswith("申请人ID:"):
-                    # 提取申请介绍部分
-                    lines = reason_text.split("\n")
-                    for line in lines:
-                        if line.startswith("申请介绍："):
-                            reason_text = line[6:]  # 去掉"申请介绍："前缀
-                            break
-                reason_item = QTableWidgetItem(reason_text)
-                reason_item.setFlags(reason_item.flags() & ~Qt.ItemIsEditable)
-                self.whitelistTable.setItem(i, 4, reason_item)
-
-                # 添加操作按钮
-                btnWidget = QWidget()
-                btnLayout = QHBoxLayout(btnWidget)
-                btnLayout.setSpacing(10)  # 增加按钮间距
-
-                # 只对状态为"待审核"的申请显示操作按钮
-                if app.get("status") == "待审核":
-                    approveBtn = QPushButton("同意")
-                    approveBtn.setFixedSize(60, 30)  # 增大按钮尺寸
-                    rejectBtn = QPushButton("拒绝")
-                    rejectBtn.setFixedSize(60, 30)  # 增大按钮尺寸
-
-                    # 修复：使用functools.partial避免lambda捕获问题
-                    # 修复：确保必要字段存在
-                    date = app.get("date")
-                    user_id = app.get("user_id")
-                    playername = app.get("playername")
-                    if date is not None and user_id is not None:
-                        approveBtn.clicked.connect(
-                            partial(self._process_whitelist_application, date, user_id, playername, True))
-                        rejectBtn.clicked.connect(
-                            partial(self._process_whitelist_application, date, user_id, playername, False))
-
-                        btnLayout.addWidget(approveBtn)
-                        btnLayout.addWidget(rejectBtn)
-                    else:
-                        # 如果缺少必要信息，显示错误信息
-                        errorLabel = QLabel("数据不完整")
-                        btnLayout.addWidget(errorLabel)
+        if not resp.get("success"):
+            QMessageBox.warning(self, "失败", f"获取白名单申请失败: {resp.get('message', '未知错误')}")
+            return
+        total = resp.get("total", 0)
+        self.wl_total_pages = max(1, (total + self.wl_page_size - 1) // self.wl_page_size)
+        self.wlPageInfoLabel.setText(f"第 {self.wl_page} 页，共 {self.wl_total_pages} 页（{total} 条）")
+        self.wlPrevPageBtn.setEnabled(self.wl_page > 1)
+        self.wlNextPageBtn.setEnabled(self.wl_page < self.wl_total_pages)
+        applications = resp.get("applications", [])
+        self.wl_applications = applications
+        self.whitelistTable.setRowCount(len(applications))
+        for i, app in enumerate(applications):
+            # 申请时间
+            date_item = QTableWidgetItem(app.get("date", "") or "")
+            date_item.setFlags(date_item.flags() & ~Qt.ItemIsEditable)
+            self.whitelistTable.setItem(i, 0, date_item)
+
+            # 用户ID
+            user_id_item = QTableWidgetItem(str(app.get("user_id", "") or ""))
+            user_id_item.setFlags(user_id_item.flags() & ~Qt.ItemIsEditable)
+            self.whitelistTable.setItem(i, 1, user_id_item)
+
+            # 玩家名
+            playername_item = QTableWidgetItem(app.get("playername", "") or "")
+            playername_item.setFlags(playername_item.flags() & ~Qt.ItemIsEditable)
+            self.whitelistTable.setItem(i, 2, playername_item)
+
+            # 账号类型 - 从内容中解析
+            content = app.get("content", "")
+            genuine_text = "未知"
+            if "正版" in content:
+                genuine_text = "正版"
+            elif "离线" in content:
+                genuine_text = "离线"
+            genuine_item = QTableWidgetItem(genuine_text)
+            genuine_item.setFlags(genuine_item.flags() & ~Qt.ItemIsEditable)
+            self.whitelistTable.setItem(i, 3, genuine_item)
+
+            # 申请理由 - 从内容中解析
+            reason_text = content
+            if reason_text.startswith("申请人ID:"):
+                # 提取申请介绍部分
+                lines = reason_text.split("\n")
+                for line in lines:
+                    if line.startswith("申请介绍："):
+                        reason_text = line[6:]  # 去掉"申请介绍："前缀
+                        break
+            reason_item = QTableWidgetItem(reason_text)
+            reason_item.setFlags(reason_item.flags() & ~Qt.ItemIsEditable)
+            self.whitelistTable.setItem(i, 4, reason_item)
+
+            # 添加操作按钮
+            btnWidget = QWidget()
+            btnLayout = QHBoxLayout(btnWidget)
+            btnLayout.setSpacing(10)  # 增加按钮间距
+
+            # 只对状态为"待审核"的申请显示操作按钮
+            if app.get("status") == "待审核":
+                approveBtn = QPushButton("同意")
+                approveBtn.setFixedSize(60, 30)  # 增大按钮尺寸
+                rejectBtn = QPushButton("拒绝")
+                rejectBtn.setFixedSize(60, 30)  # 增大按钮尺寸
+
+                # 修复：使用functools.partial避免lambda捕获问题
+                # 修复：确保必要字段存在
+                date = app.get("date")
+                user_id = app.get("user_id")
+                playername = app.get("playername")
+                if date is not None and user_id is not None:
+                    approveBtn.clicked.connect(
+                        partial(self._process_whitelist_application, date, user_id, playername, True,
+                                app.get("id"), app.get("genuine")))
+                    rejectBtn.clicked.connect(
+                        partial(self._process_whitelist_application, date, user_id, playername, False,
+                                app.get("id"), app.get("genuine")))
+
+                    btnLayout.addWidget(approveBtn)
+                    btnLayout.addWidget(rejectBtn)
                 else:
-                    # 显示已处理状态
-                    statusLabel = QLabel(app.get("status", "已处理"))
-                    btnLayout.addWidget(statusLabel)
+                    # 如果缺少必要信息，显示错误信息
+                    errorLabel = QLabel("数据不完整")
+                    btnLayout.addWidget(errorLabel)
+            else:
+                # 显示已处理状态
+                statusLabel = QLabel(app.get("status", "已处理"))
+                btnLayout.addWidget(statusLabel)
 
-                btnLayout.setContentsMargins(5, 5, 5, 5)
-                btnWidget.setLayout(btnLayout)
-                self.whitelistTable.setCellWidget(i, 5, btnWidget)
+            btnLayout.setContentsMargins(5, 5, 5, 5)
+            btnWidget.setLayout(btnLayout)
+            self.whitelistTable.setCellWidget(i, 5, btnWidget)
 
-    def _process_whitelist_application(self, date, user_id, playername, approved):
+    def _process_whitelist_application(self, date, user_id, playername, approved, application_id=None, genuine=None):
         self.client.send({
             "type": "process_whitelist_application",
+            "user_id": self.main.user["UserID"],
+            "id": application_id,
             "date": date,
-            "user_id": user_id,
+            "applicant_id": user_id,
             "playername": playername,
+            "genuine": genuine,
             "approved": approved
         }, callback=lambda r: self._on_application_processed(r, date, user_id, approved))
 
+    def _process_selected_applications(self, approved):
+        """批量通过/拒绝选中的待审核申请"""
+        rows = sorted({index.row() for index in self.whitelistTable.selectionModel().selectedRows()})
+        items = [self.wl_applications[row] for row in rows
+                 if row < len(self.wl_applications) and self.wl_applications[row].get("status") == "待审核"]
+        if not items:
+            QMessageBox.information(self, "提示", "请先选中待审核的申请")
+            return
+        action = "通过" if approved else "拒绝"
+        if QMessageBox.question(self, "确认", f"确定{action}选中的 {len(items)} 条申请吗？") != QMessageBox.Yes:
+            return
+        self.client.send({
+            "type": "process_whitelist_applications_bulk",
+            "user_id": self.main.user["UserID"],
+            "applications": [{"id": app.get("id"), "date": app.get("date"), "user_id": app.get("user_id"),
+                              "playername": app.get("playername"), "genuine": app.get("genuine"),
+                              "approved": approved} for app in items]
+        }, callback=self._on_bulk_processed)
+
+    def _on_bulk_processed(self, resp):
+        if resp.get("success"):
+            failed = [r for r in resp.get("results", []) if not r.get("success")]
+            text = resp.get("message", "批量处理完成")
+            if failed:
+                text += "\n\n失败：\n" + "\n".join(f"{r.get('playername')}：{r.get('message')}" for r in failed)
+            QMessageBox.information(self, "批量处理完成", text)
+            self._load_whitelist_applications()
+        else:
+            QMessageBox.warning(self, "失败", resp.get("message", "未知错误"))
+
     def _on_application_processed(self, resp, date, user_id, approved):
         if resp.get("success"):
             QMessageBox.information(self, "成功", "白名单申请已处理")
@@ -1624,13 +1805,23 @@ class AdminPage(BasePage):
 
 # ========================= 传声筒页面 =========================
 class MessagePage(BasePage):
+    MESSAGE_PAGE_SIZE = 50  # 每次加载的消息条数
+    SYNC_INTERVAL = 15000  # 增量同步间隔（毫秒），兜底实时推送丢失的情况
+
     def __init__(self, parent):
         super().__init__(parent)
         self.contacts = []  # 联系人列表
         self.current_contact = None  # 当前选中的联系人
+        self.loaded_messages = []  # 当前会话已加载的消息（时间正序）
+        self.history_cursor = None  # 继续加载更早消息用的 before_message_id，None 表示已无更早消息
+        self.loading_history = False  # 是否正在加载更早的消息
+        self.last_message_id = None  # 增量同步的高水位（已同步到的最大 MessageID）
+        self.syncing = False  # 是否有同步请求在途
+        self.sync_timer = QTimer(self)
+        self.sync_timer.timeout.connect(self._sync_messages)
         self.gift_info = {"coins_given_today": 0, "stars_given_today": 0, "coin_limit": 5, "star_limit": 1}  # 赠与信息
         self.gift_dialog = None  # 添加gift_dialog属性
-        self.online_users = set()  # 在线用户集合
+        self.online_users = set()  # 在线联系人集合（由联系人列表初始化，之后按 presence 推送增量更新）
         self.unread_counts = {}  # 未读消息计数 {contact_id: count}
         self._init_ui()
         self._bind_signal()  # 绑定信号
@@ -1669,6 +1860,8 @@ class MessagePage(BasePage):
         self.contact_info_label.setAlignment(Qt.AlignRight)
         self.message_display = QTextEdit()
         self.message_display.setReadOnly(True)
+        # 滚动到顶部时加载更早的消息
+        self.message_display.verticalScrollBar().valueChanged.connect(self._on_message_scroll)
         # 移除气泡样式，使用默认样式
         self.message_display.setStyleSheet("""
             QTextEdit {
@@ -1785,10 +1978,10 @@ class MessagePage(BasePage):
     def _on_contacts_received(self, resp):
         if resp.get("success"):
             self.contacts = resp["contacts"]
-            # 更新在线用户列表
-            if "online_users" in resp:
-                self.online_users = set(resp["online_users"])
+            # 用联系人自带的在线标记初始化在线集合
+            self.online_users = {c["UserID"] for c in self.contacts if c.get("online")}
             self._refresh_contact_list()
+            self._update_online_status()
             # 加载服务器保存的联系人备注
             self._load_server_remarks()
         else:
@@ -1799,6 +1992,23 @@ class MessagePage(BasePage):
         # 实际上备注已经在 get_contacts 中返回，这里不需要额外处理
         pass
 
+    def _on_read_receipt(self, event):
+        """本账号在其他客户端标记已读，同步未读数"""
+        self.unread_counts = event.get("unread_details", {})
+        self.main.unread_count = event.get("unread_count", 0)
+        self.main._update_unread_count(0)
+        self._refresh_contact_list()
+
+    def _on_presence(self, event):
+        """联系人上线/下线推送"""
+        user_id = event.get("user_id")
+        if event.get("online"):
+            self.online_users.add(user_id)
+        else:
+            self.online_users.discard(user_id)
+        self._refresh_contact_list()
+        self._update_online_status()
+
     def _update_online_status(self):
         """更新在线状态显示"""
         if self.current_contact and self.current_contact["UserID"] in self.online_users:
@@ -1808,17 +2018,23 @@ class MessagePage(BasePage):
             self.online_status_label.hide()
 
     def _load_messages(self):
+        """加载当前会话最新的一页消息"""
         if not self.main.user or not self.current_contact:
             return
         self.client.send({
             "type": "get_messages",
             "user_id": self.main.user["UserID"],
-            "contact_id": self.current_contact["UserID"]
+            "contact_id": self.current_contact["UserID"],
+            "limit": self.MESSAGE_PAGE_SIZE
         }, callback=self._on_messages_received)
 
     def _on_messages_received(self, resp):
         if resp.get("success"):
             messages = resp["messages"]
+            self.loaded_messages = list(messages)
+            # 清空重绘时滚动条会回到顶部，渲染完成前先不设置游标，避免误触发加载更早消息
+            self.history_cursor = None
+            self.loading_history = False
             self.message_display.clear()
 
             # 格式化显示消息
@@ -1826,9 +2042,94 @@ class MessagePage(BasePage):
 
             # 滚动到底部
             self.message_display.moveCursor(QTextCursor.End)
+            self.history_cursor = resp.get("before_message_id")
         else:
             QMessageBox.warning(self, "获取消息失败", resp.get("message"))
 
+    def start_sync(self):
+        """登录后建立同步起点并开始定时增量同步"""
+        self.last_message_id = None
+        self.syncing = False
+        self._sync_messages()
+        self.sync_timer.start(self.SYNC_INTERVAL)
+
+    def stop_sync(self):
+        self.sync_timer.stop()
+        self.last_message_id = None
+
+    def _sync_messages(self):
+        """拉取高水位之后的新消息及最新未读数"""
+        if not self.main.user or self.syncing:
+            return
+        self.syncing = True
+        self.client.send({
+            "type": "sync_messages",
+            "user_id": self.main.user["UserID"],
+            "since_message_id": self.last_message_id
+        }, callback=self._on_messages_synced)
+
+    def _on_messages_synced(self, resp):
+        self.syncing = False
+        if not resp.get("success"):
+            return
+        self.last_message_id = resp.get("last_message_id", self.last_message_id)
+
+        # 只显示当前会话中尚未显示过的消息（可能已通过实时推送或上次同步的重读窗口显示）
+        if self.current_contact:
+            contact_id = str(self.current_contact["UserID"])
+            shown_ids = {m.get("MessageID") for m in self.loaded_messages}
+            for msg in resp.get("messages", []):
+                if msg["MessageID"] in shown_ids:
+                    continue
+                if contact_id in (str(msg["sender_id"]), str(msg["receiver_id"])):
+                    self._display_new_message(msg)
+
+        # 未读数以服务端为准
+        self.unread_counts = resp.get("unread_details", {})
+        self.main.unread_count = resp.get("unread_count", 0)
+        self.main._update_unread_count(0)
+        self._refresh_contact_list()
+
+        if resp.get("has_more"):
+            self._sync_messages()
+
+    def _on_message_scroll(self, value):
+        """滚动到顶部且还有更早的消息时，加载上一页"""
+        if value == 0 and self.history_cursor and not self.loading_history:
+            self._load_older_messages()
+
+    def _load_older_messages(self):
+        if not self.main.user or not self.current_contact:
+            return
+        self.loading_history = True
+        contact_id = self.current_contact["UserID"]
+        self.client.send({
+            "type": "get_messages",
+            "user_id": self.main.user["UserID"],
+            "contact_id": contact_id,
+            "limit": self.MESSAGE_PAGE_SIZE,
+            "before_message_id": self.history_cursor
+        }, callback=partial(self._on_older_messages_received, contact_id=contact_id))
+
+    def _on_older_messages_received(self, resp, contact_id):
+        # 期间已切换联系人，丢弃结果
+        if not self.current_contact or self.current_contact["UserID"] != contact_id:
+            return
+        if not resp.get("success"):
+            self.loading_history = False
+            return
+        older = resp["messages"]
+        self.history_cursor = resp.get("before_message_id")
+        if older:
+            self.loaded_messages = older + self.loaded_messages
+
+            # 重新渲染后保持当前可见内容不跳动（渲染期间 loading_history 仍为 True，不会重复触发）
+            scrollbar = self.message_display.verticalScrollBar()
+            distance_to_bottom = scrollbar.maximum() - scrollbar.value()
+            self._display_messages(self.loaded_messages)
+            scrollbar.setValue(scrollbar.maximum() - distance_to_bottom)
+        self.loading_history = False
+
     def _display_messages(self, messages):
         """格式化显示消息，移除气泡样式"""
         if not messages:
@@ -2118,7 +2419,7 @@ class MessagePage(BasePage):
     def _on_message_sent(self, resp):
         if resp.get("success"):
             self.message_input.clear()
-            self._load_messages()  # 重新加载消息
+            self._sync_messages()  # 增量拉取刚发送的消息
         else:
             QMessageBox.warning(self, "发送失败", resp.get("message"))
 
@@ -2127,6 +2428,8 @@ class MessagePage(BasePage):
         self._refresh_contacts()
         # 重置聊天界面
         self.current_contact = None
+        self.loaded_messages = []
+        self.history_cursor = None
         self.message_display.clear()
         self.contact_info_label.setText("")
         self.online_status_label.hide()
@@ -2137,6 +2440,12 @@ class MessagePage(BasePage):
             message = resp.get("message", {})
             sender_id = message.get("sender_id")
 
+            # 自己在其他客户端发出的消息：正在与接收方聊天时直接显示
+            if self.main.user and str(sender_id) == str(self.main.user["UserID"]):
+                if self.current_contact and str(self.current_contact["UserID"]) == str(message.get("receiver_id")):
+                    self._display_new_message(message)
+                return
+
             # 如果正在与发送方聊天，直接显示消息
             if self.current_contact and str(self.current_contact["UserID"]) == str(sender_id):
                 self._display_new_message(message)
@@ -2149,6 +2458,11 @@ class MessagePage(BasePage):
 
     def _display_new_message(self, message):
         """显示新收到的消息"""
+        # 同一条消息可能经由多端推送与增量同步各到达一次
+        message_id = message.get("MessageID")
+        if message_id is not None and any(m.get("MessageID") == message_id for m in self.loaded_messages):
+            return
+        self.loaded_messages.append(message)
         # 格式化显示消息
         self._display_messages_append([message])
         # 滚动到底部
@@ -2520,8 +2834,8 @@ class MessagePage(BasePage):
                 self.gift_dialog.close()
                 self.gift_dialog = None
 
-            # 刷新消息显示
-            self._load_messages()
+            # 增量拉取赠与消息
+            self._sync_messages()
 
             # 显示赠与消息
             QMessageBox.information(self, "成功", "赠与成功")
@@ -2598,6 +2912,8 @@ class MessagePage(BasePage):
         """绑定信号"""
         # 绑定客户端的实时消息信号到处理方法
         self.client.real_time_message.connect(self._handle_real_time_message)
+        self.client.presence.connect(self._on_presence)
+        self.client.read_receipt.connect(self._on_read_receipt)
 
 
 # ========================= 添加联系人对话框 =========================
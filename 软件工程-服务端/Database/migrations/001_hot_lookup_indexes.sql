@@ -0,0 +1,25 @@
+-- 001 热点查询索引
+-- InnoDB 二级索引隐含主键列，(receiver_id, ...) 等索引末尾自带 MessageID
+
+-- messages
+--   idx_msg_receiver : get_unread_messages_count / get_unread_messages_by_contact（覆盖索引，含 GROUP BY sender_id）
+--                      get_user_contacts 中 receiver_id = ? AND visible_to_receiver 分支（覆盖索引）
+--   idx_msg_sender   : get_user_contacts 中 sender_id = ? AND visible_to_sender 分支（覆盖索引）
+--   idx_msg_pair_time: get_messages_between_users / mark_messages_as_read / add_contact 的会话双方等值查询，按时间排序
+ALTER TABLE messages
+    ADD INDEX idx_msg_receiver (receiver_id, visible_to_receiver, is_read, sender_id),
+    ADD INDEX idx_msg_sender (sender_id, visible_to_sender, receiver_id),
+    ADD INDEX idx_msg_pair_time (sender_id, receiver_id, timestamp),
+    ALGORITHM=INPLACE, LOCK=NONE;
+
+-- PlayerData：get_user_id_by_player_name / get_user_by_player_name（覆盖索引）
+ALTER TABLE PlayerData
+    ADD INDEX idx_pd_playername (PlayerName, UserID),
+    ALGORITHM=INPLACE, LOCK=NONE;
+
+-- Users：check_login 按用户名查找，register_user 按用户名/邮箱/手机号查重
+ALTER TABLE Users
+    ADD INDEX idx_users_username (Username),
+    ADD INDEX idx_users_email (Email),
+    ADD INDEX idx_users_phone (Phone),
+    ALGORITHM=INPLACE, LOCK=NONE;
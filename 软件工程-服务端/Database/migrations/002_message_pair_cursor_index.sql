@@ -0,0 +1,8 @@
+-- 002 会话消息游标分页索引
+-- 会话历史改为按 MessageID 游标分页（get_messages_page），需要 (sender_id, receiver_id) 等值后按 MessageID 有序；
+-- InnoDB 二级索引末尾隐含主键，(sender_id, receiver_id) 即等价于 (sender_id, receiver_id, MessageID)。
+-- 001 中的 idx_msg_pair_time 在主键之前多了 timestamp 列，无法提供该顺序，一并替换。
+ALTER TABLE messages
+    DROP INDEX idx_msg_pair_time,
+    ADD INDEX idx_msg_pair (sender_id, receiver_id),
+    ALGORITHM=INPLACE, LOCK=NONE;
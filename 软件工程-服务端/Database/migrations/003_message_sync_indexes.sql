@@ -0,0 +1,8 @@
+-- 003 增量消息同步索引
+-- sync_messages 按 MessageID > ? 拉取某用户收发的新消息，需要 receiver_id / sender_id 等值后按 MessageID 有序。
+-- 001 新增的复合索引以 receiver_id / sender_id 开头，MySQL 会用它们替换外键自动创建的单列索引，
+-- 而这些复合索引中主键之前还有其它列，无法按 MessageID 做范围扫描，这里显式补上。
+ALTER TABLE messages
+    ADD INDEX idx_msg_receiver_id (receiver_id, MessageID),
+    ADD INDEX idx_msg_sender_id (sender_id, MessageID),
+    ALGORITHM=INPLACE, LOCK=NONE;
@@ -0,0 +1,16 @@
+-- 004 赠与流水表
+-- 取代 gift_records/{日期}.json：每次赠与追加一行，与余额变更在同一事务内写入。
+-- 启动时按 (SenderID, GiftDate) 汇总当天各类型的赠与数量，重建内存中的每日计数器。
+CREATE TABLE IF NOT EXISTS GiftRecords (
+    GiftID BIGINT AUTO_INCREMENT PRIMARY KEY,
+    SenderID INT NOT NULL,
+    ReceiverID INT NOT NULL,
+    GiftType VARCHAR(10) NOT NULL,
+    Amount INT NOT NULL,
+    GiftDate DATE NOT NULL,
+    CreatedAt DATETIME NOT NULL,
+    INDEX idx_gift_date_sender (GiftDate, SenderID, GiftType),
+    INDEX idx_gift_receiver (ReceiverID, GiftDate),
+    FOREIGN KEY (SenderID) REFERENCES Users(UserID),
+    FOREIGN KEY (ReceiverID) REFERENCES Users(UserID)
+);
@@ -0,0 +1,19 @@
+-- 005 白名单申请表
+-- 取代 白名单相关/白名单申请/{日期}/ 与 白名单相关/已审核白名单/ 目录下的申请文件。
+-- Status：0 待审核，1 已通过，2 未通过
+-- (UserID, ApplyDate, Status) 支撑用户申请列表、待审核检查与每日申请次数；
+-- (Status, ApplyDate) 支撑管理员按状态、日期浏览审批队列。
+CREATE TABLE IF NOT EXISTS WhitelistApplications (
+    ApplicationID INT AUTO_INCREMENT PRIMARY KEY,
+    UserID INT NOT NULL,
+    PlayerName VARCHAR(32) NOT NULL,
+    Genuine TINYINT NOT NULL DEFAULT 0,
+    Reason TEXT,
+    ApplyDate DATE NOT NULL,
+    Status TINYINT NOT NULL DEFAULT 0,
+    CreatedAt DATETIME NOT NULL,
+    ReviewedAt DATETIME NULL,
+    INDEX idx_wl_user_date_status (UserID, ApplyDate, Status),
+    INDEX idx_wl_status_date (Status, ApplyDate),
+    FOREIGN KEY (UserID) REFERENCES Users(UserID)
+);
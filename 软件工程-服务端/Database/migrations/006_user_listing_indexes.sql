@@ -0,0 +1,13 @@
+-- 006 管理员用户列表索引
+-- list_users 按 UserID 键集分页；InnoDB 二级索引末尾自带主键，
+-- 因此 (WhiteState) 上的索引天然按 (WhiteState, PlayerID) 有序，这里显式带上 UserID 以便按用户键集取数。
+-- 按角色筛选可直接使用 UserRoles_Con 外键 RoleID 上的索引（隐含主键 UserID），无需新增。
+--   idx_pd_white_user : 按白名单状态筛选
+--   idx_users_nickname: 按昵称前缀筛选（用户名、玩家名前缀已由 001 中的索引覆盖）
+ALTER TABLE PlayerData
+    ADD INDEX idx_pd_white_user (WhiteState, UserID),
+    ALGORITHM=INPLACE, LOCK=NONE;
+
+ALTER TABLE Users
+    ADD INDEX idx_users_nickname (Nickname),
+    ALGORITHM=INPLACE, LOCK=NONE;
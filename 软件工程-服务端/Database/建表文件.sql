@@ -82,3 +82,5 @@ CREATE TABLE UserLoginRecords (
     Address VARCHAR(100),
     FOREIGN KEY (UserID) REFERENCES Users(UserID)
 );
+
+-- 索引等后续结构变更见 migrations/ 目录，按版本号顺序执行；服务端启动时会自动应用尚未执行的版本
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+热点查询索引基准测试
+在独立的临时库中按 建表文件.sql 建表，灌入大量用户与消息后，
+分别在执行迁移前后对热点查询做 EXPLAIN 并统计耗时，对比索引效果。
+
+运行方式：
+    python bench_indexes.py                              # 默认 1000 用户、100 万条消息
+    python bench_indexes.py --messages 200000 --runs 20  # 缩小数据量、调整重复次数
+    python bench_indexes.py --keep                       # 结束后保留临时库
+"""
+
+import argparse
+import os
+import random
+import statistics
+import time
+
+import mysql.connector
+
+from tools import DB_CONFIG, DatabaseManager, _split_sql
+
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Database', '建表文件.sql')
+
+
+def hot_queries(uid, contact_id, player_name, username):
+    """与 DatabaseManager 中对应方法一致的热点查询 [(名称, SQL, 参数)]"""
+    return [
+        ("get_unread_messages_count", """
+            SELECT COUNT(*) as unread_count FROM messages
+            WHERE receiver_id = %s AND visible_to_receiver = TRUE AND is_read = FALSE
+        """, (uid,)),
+        ("get_unread_messages_by_contact", """
+            SELECT sender_id, COUNT(*) as unread_count FROM messages
+            WHERE receiver_id = %s AND visible_to_receiver = TRUE AND is_read = FALSE
+            GROUP BY sender_id
+        """, (uid,)),
+        ("get_user_contacts", """
+            SELECT DISTINCT u.UserID, u.Username, u.Nickname FROM Users u
+            WHERE u.UserID IN (
+                SELECT DISTINCT sender_id FROM messages WHERE receiver_id = %s AND visible_to_receiver = TRUE
+                UNION
+                SELECT DISTINCT receiver_id FROM messages WHERE sender_id = %s AND visible_to_sender = TRUE
+            ) AND u.UserID != %s
+        """, (uid, uid, uid)),
+        ("get_messages_between_users", """
+            SELECT m.*, u1.Username as sender_name, u2.Username as receiver_name
+            FROM messages m
+            JOIN Users u1 ON m.sender_id = u1.UserID
+            JOIN Users u2 ON m.receiver_id = u2.UserID
+            WHERE ((m.sender_id = %s AND m.receiver_id = %s AND m.visible_to_sender = TRUE)
+               OR (m.sender_id = %s AND m.receiver_id = %s AND m.visible_to_receiver = TRUE))
+            ORDER BY m.timestamp ASC
+        """, (uid, contact_id, contact_id, uid)),
+        ("mark_messages_as_read(select)", """
+            SELECT COUNT(*) FROM messages WHERE receiver_id = %s AND sender_id = %s AND is_read = FALSE
+        """, (uid, contact_id)),
+        ("get_user_id_by_player_name", """
+            SELECT u.UserID FROM Users u JOIN PlayerData pd ON u.UserID = pd.UserID WHERE pd.PlayerName = %s
+        """, (player_name,)),
+        ("check_login(username)", "SELECT * FROM Users WHERE Username=%s", (username,)),
+    ]
+
+
+def seed(db, users, messages, batch=5000):
+    """灌入测试数据"""
+    print(f"[*] 写入 {users} 个用户 ...")
+    with db._conn() as c:
+        with c.cursor() as cur:
+            cur.execute("INSERT INTO UserRoles (RoleID, RoleName) VALUES (1, 'Owner'), (2, 'VIP'), (3, 'User')")
+            rows = [(f"bench_user_{i}", "x", f"nick_{i}", f"bench_{i}@test.com", f"138{i:08d}")
+                    for i in range(users)]
+            cur.executemany("INSERT INTO Users (Username, Password, Nickname, Email, Phone) VALUES (%s,%s,%s,%s,%s)",
+                            rows)
+            cur.executemany("INSERT INTO PlayerData (UserID, PlayerName, WhiteState) VALUES (%s, %s, 1)",
+                            [(i + 1, f"Player_{i}") for i in range(users)])
+        c.commit()
+
+    print(f"[*] 写入 {messages} 条消息 ...")
+    start = time.time()
+    base = time.time() - messages
+    with db._conn() as c:
+        with c.cursor() as cur:
+            for offset in range(0, messages, batch):
+                rows = []
+                for i in range(offset, min(offset + batch, messages)):
+                    sender = random.randint(1, users)
+                    receiver = random.randint(1, users)
+                    ts = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(base + i))
+                    rows.append((sender, receiver, "bench message", ts, random.random() < 0.1))
+                cur.executemany("""
+                    INSERT INTO messages (sender_id, receiver_id, content, timestamp, is_read)
+                    VALUES (%s, %s, %s, %s, %s)
+                """, rows)
+                c.commit()
+    print(f"[*] 消息写入完成，用时 {time.time() - start:.1f}s")
+
+
+def measure(db, queries, runs):
+    """对每条查询执行 EXPLAIN 并统计耗时中位数（毫秒）"""
+    results = {}
+    for name, sql, params in queries:
+        plan = db._fetchall("EXPLAIN " + sql, params)
+        durations = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            db._fetchall(sql, params)
+            durations.append((time.perf_counter() - start) * 1000)
+        results[name] = {"plan": plan, "median_ms": statistics.median(durations)}
+    return results
+
+
+def print_plan(name, plan):
+    print(f"  {name}")
+    for row in plan:
+        print(f"    table={row.get('table')} type={row.get('type')} key={row.get('key')} "
+              f"rows={row.get('rows')} extra={row.get('Extra')}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="热点查询索引基准测试")
+    parser.add_argument("--database", default="bench_beeanexus", help="临时库名（会被重建）")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--messages", type=int, default=1000000)
+    parser.add_argument("--runs", type=int, default=10, help="每条查询重复次数")
+    parser.add_argument("--keep", action="store_true", help="结束后保留临时库")
+    args = parser.parse_args()
+
+    server_cfg = {k: v for k, v in DB_CONFIG.items() if k != 'database'}
+    admin = mysql.connector.connect(**server_cfg)
+    admin_cur = admin.cursor()
+    admin_cur.execute(f"DROP DATABASE IF EXISTS `{args.database}`")
+    admin_cur.execute(f"CREATE DATABASE `{args.database}` DEFAULT CHARACTER SET utf8mb4")
+
+    db = DatabaseManager(dict(server_cfg, database=args.database))
+    try:
+        with open(SCHEMA_FILE, 'r', encoding='utf-8') as f:
+            for stmt in _split_sql(f.read()):
+                db._execute(stmt)
+        seed(db, args.users, args.messages)
+        db._execute("ANALYZE TABLE messages, Users, PlayerData")
+
+        uid, contact_id = 1, 2
+        queries = hot_queries(uid, contact_id, f"Player_{args.users // 2}", f"bench_user_{args.users // 2}")
+
+        print("\n[*] 迁移前")
+        before = measure(db, queries, args.runs)
+        for name, _, _ in queries:
+            print_plan(name, before[name]["plan"])
+
+        start = time.time()
+        applied = db.migrate()
+        print(f"\n[*] 已应用迁移 {applied}，用时 {time.time() - start:.1f}s")
+        db._execute("ANALYZE TABLE messages, Users, PlayerData")
+
+        print("\n[*] 迁移后")
+        after = measure(db, queries, args.runs)
+        for name, _, _ in queries:
+            print_plan(name, after[name]["plan"])
+
+        print(f"\n{'查询':<34}{'迁移前(ms)':>12}{'迁移后(ms)':>12}{'加速比':>10}")
+        for name, _, _ in queries:
+            b, a = before[name]["median_ms"], after[name]["median_ms"]
+            print(f"{name:<34}{b:>12.2f}{a:>12.2f}{(b / a if a else 0):>9.1f}x")
+    finally:
+        db.pool.close_all()
+        if not args.keep:
+            admin_cur.execute(f"DROP DATABASE IF EXISTS `{args.database}`")
+        admin_cur.close()
+        admin.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+余额转账并发基准测试
+在独立的临时库中建表并灌入用户，用大量线程对少量用户做随机互转，
+结束后校验：总额守恒、无负余额、流水条数与成功次数一致，并统计吞吐。
+
+运行方式：
+    python bench_transfer.py                          # 默认 20 用户、200 线程、每线程 50 笔
+    python bench_transfer.py --threads 500 --pool 32  # 加大并发
+    python bench_transfer.py --legacy                 # 旧的"先读余额再更新"写法，用于对比超扣
+"""
+
+import argparse
+import os
+import random
+import threading
+import time
+
+import mysql.connector
+
+from tools import (DB_CONFIG, POOL_CONFIG, DatabaseManager, InsufficientBalanceError,
+                   _split_sql, _get_now)
+
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Database', '建表文件.sql')
+
+LEDGER_SQL = """
+    INSERT INTO GiftRecords (SenderID, ReceiverID, GiftType, Amount, GiftDate, CreatedAt)
+    VALUES (%s, %s, 'coin', %s, CURDATE(), %s)
+"""
+
+
+def seed(db, users, balance):
+    print(f"[*] 写入 {users} 个用户，每人 {balance} 金币 ...")
+    with db._conn() as c:
+        with c.cursor() as cur:
+            cur.execute("INSERT INTO UserRoles (RoleID, RoleName) VALUES (1, 'Owner'), (2, 'VIP'), (3, 'User')")
+            rows = [(f"bench_user_{i}", "x", f"nick_{i}", f"bench_{i}@test.com", f"138{i:08d}", balance)
+                    for i in range(users)]
+            cur.executemany("INSERT INTO Users (Username, Password, Nickname, Email, Phone, Coins) "
+                            "VALUES (%s,%s,%s,%s,%s,%s)", rows)
+        c.commit()
+
+
+def legacy_transfer(db, sender_id, receiver_id, amount):
+    """改造前 give_gift 的写法：先读余额再无条件扣减，并发时会超扣"""
+    row = db._fetchone("SELECT Coins FROM Users WHERE UserID = %s", (sender_id,))
+    if row['Coins'] < amount:
+        raise InsufficientBalanceError('Coins')
+    with db.transaction():
+        db._execute("UPDATE Users SET Coins = Coins - %s WHERE UserID = %s", (amount, sender_id))
+        db._execute("UPDATE Users SET Coins = Coins + %s WHERE UserID = %s", (amount, receiver_id))
+        db._execute(LEDGER_SQL, (sender_id, receiver_id, amount, _get_now()))
+
+
+def worker(db, args, counters, lock, barrier):
+    ok = rejected = errors = 0
+    barrier.wait()
+    for _ in range(args.transfers):
+        sender_id, receiver_id = random.sample(range(1, args.users + 1), 2)
+        amount = random.randint(1, args.max_amount)
+        try:
+            if args.legacy:
+                legacy_transfer(db, sender_id, receiver_id, amount)
+            else:
+                db.transfer(sender_id, receiver_id, 'Coins', amount,
+                            (LEDGER_SQL, (sender_id, receiver_id, amount, _get_now())))
+            ok += 1
+        except InsufficientBalanceError:
+            rejected += 1
+        except Exception as e:
+            errors += 1
+            if errors == 1:
+                print(f"[E] 转账失败: {e}")
+    with lock:
+        counters["ok"] += ok
+        counters["rejected"] += rejected
+        counters["errors"] += errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="余额转账并发基准测试")
+    parser.add_argument("--database", default="bench_beeanexus_transfer", help="临时库名（会被重建）")
+    parser.add_argument("--users", type=int, default=20, help="用户数（越少竞争越激烈）")
+    parser.add_argument("--balance", type=int, default=20, help="每个用户的初始金币")
+    parser.add_argument("--threads", type=int, default=200)
+    parser.add_argument("--transfers", type=int, default=50, help="每个线程的转账笔数")
+    parser.add_argument("--max-amount", type=int, default=5)
+    parser.add_argument("--pool", type=int, default=20, help="连接池大小")
+    parser.add_argument("--legacy", action="store_true", help="使用改造前的先读后写实现")
+    parser.add_argument("--keep", action="store_true", help="结束后保留临时库")
+    args = parser.parse_args()
+
+    server_cfg = {k: v for k, v in DB_CONFIG.items() if k != 'database'}
+    admin = mysql.connector.connect(**server_cfg)
+    admin_cur = admin.cursor()
+    admin_cur.execute(f"DROP DATABASE IF EXISTS `{args.database}`")
+    admin_cur.execute(f"CREATE DATABASE `{args.database}` DEFAULT CHARACTER SET utf8mb4")
+
+    db = DatabaseManager(dict(server_cfg, database=args.database),
+                         pool_cfg=dict(POOL_CONFIG, size=args.pool, wait_timeout=60))
+    try:
+        with open(SCHEMA_FILE, 'r', encoding='utf-8') as f:
+            for stmt in _split_sql(f.read()):
+                db._execute(stmt)
+        db.migrate()
+        seed(db, args.users, args.balance)
+        expected_total = args.users * args.balance
+
+        counters = {"ok": 0, "rejected": 0, "errors": 0}
+        lock = threading.Lock()
+        barrier = threading.Barrier(args.threads)
+        threads = [threading.Thread(target=worker, args=(db, args, counters, lock, barrier))
+                   for _ in range(args.threads)]
+        mode = "legacy" if args.legacy else "transfer"
+        print(f"[*] {mode}: {args.threads} 线程 × {args.transfers} 笔，连接池 {args.pool}")
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+
+        total = db._fetchone("SELECT SUM(Coins) AS total FROM Users")['total']
+        negatives = db._fetchone("SELECT COUNT(*) AS n FROM Users WHERE Coins < 0")['n']
+        ledger = db._fetchone("SELECT COUNT(*) AS n FROM GiftRecords")['n']
+        attempts = args.threads * args.transfers
+
+        print(f"\n成功 {counters['ok']}  余额不足 {counters['rejected']}  异常 {counters['errors']}  "
+              f"共 {attempts} 笔，用时 {elapsed:.2f}s，{attempts / elapsed:.0f} 笔/s")
+        checks = [
+            ("总额守恒", total == expected_total, f"{total} / {expected_total}"),
+            ("无负余额", negatives == 0, f"{negatives} 个负余额用户"),
+            ("流水与成功次数一致", ledger == counters["ok"], f"{ledger} / {counters['ok']}"),
+        ]
+        for name, passed, detail in checks:
+            print(f"  [{'+' if passed else '!'}] {name}: {detail}")
+    finally:
+        db.pool.close_all()
+        if not args.keep:
+            admin_cur.execute(f"DROP DATABASE IF EXISTS `{args.database}`")
+        admin_cur.close()
+        admin.close()
+
+
+if __name__ == "__main__":
+    main()
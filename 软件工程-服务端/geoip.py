@@ -0,0 +1,160 @@
+"""
+IP 地理位置解析
+- OnlineResolver ：调用 ip-api.com 在线接口
+- OfflineResolver：读取本地 CIDR 段文件，二分查找，不依赖网络
+- GeoLocator     ：按配置依次尝试各解析器，结果按网段前缀缓存（LRU + TTL）
+"""
+import bisect
+import ipaddress
+import os
+
+from tools import TTLCache, _MISSING
+
+GEOIP_CONFIG = {
+    'resolvers': ['offline', 'online'],  # 按顺序尝试，前一个无结果时使用下一个
+    # 离线网段文件：每行 "CIDR 地址"，如 "1.0.1.0/24 福建省 福州市"，# 开头为注释
+    'range_file': os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Database', 'ip_ranges.txt'),
+    'online_timeout': 5,      # 在线接口超时（秒）
+    'cache_maxsize': 10000,   # 缓存的网段数
+    'cache_ttl': 24 * 3600,   # 缓存有效期（秒）
+    'ipv4_prefix': 24,        # 同一 /24 网段视为同一地址
+    'ipv6_prefix': 48,
+}
+
+UNKNOWN_ADDRESS = "未知地址"
+LOCAL_ADDRESS = "本地地址"
+
+
+class OnlineResolver:
+    """ip-api.com 在线解析；网络异常时抛出，由调用方决定是否缓存"""
+
+    def __init__(self, timeout=5):
+        self.timeout = timeout
+
+    def resolve(self, ip):
+        import requests
+        response = requests.get(f"http://ip-api.com/json/{ip}?lang=zh-CN", timeout=self.timeout)
+        if response.status_code == 200:
+            data = response.json()
+            if data.get("status") == "success":
+                return f"{data.get('regionName', '')} {data.get('city', '')}"
+        return None
+
+
+class OfflineResolver:
+    """基于本地 CIDR 段文件的离线解析，网段按起始地址排序后二分查找"""
+
+    def __init__(self, range_file):
+        # 按 IP 版本分别保存：起始地址列表（用于二分）与 (起始, 结束, 地址) 列表
+        self._starts = {4: [], 6: []}
+        self._ranges = {4: [], 6: []}
+        if range_file and os.path.exists(range_file):
+            self.load(range_file)
+
+    def load(self, range_file):
+        ranges = {4: [], 6: []}
+        with open(range_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                parts = line.split(None, 1)
+                if len(parts) < 2:
+                    continue
+                try:
+                    network = ipaddress.ip_network(parts[0], strict=False)
+                except ValueError:
+                    continue
+                ranges[network.version].append((int(network.network_address),
+                                                int(network.broadcast_address), parts[1].strip()))
+        for version in (4, 6):
+            ranges[version].sort()
+            self._ranges[version] = ranges[version]
+            self._starts[version] = [r[0] for r in ranges[version]]
+
+    def __len__(self):
+        return len(self._ranges[4]) + len(self._ranges[6])
+
+    def resolve(self, ip):
+        addr = ipaddress.ip_address(ip)
+        value = int(addr)
+        index = bisect.bisect_right(self._starts[addr.version], value) - 1
+        if index >= 0:
+            start, end, address = self._ranges[addr.version][index]
+            if start <= value <= end:
+                return address
+        return None
+
+
+class GeoLocator:
+    """依次尝试各解析器，并按网段缓存解析结果"""
+
+    def __init__(self, resolvers, cache_maxsize=10000, cache_ttl=86400, ipv4_prefix=24, ipv6_prefix=48):
+        self.resolvers = resolvers
+        self.cache = TTLCache(cache_maxsize, cache_ttl)
+        self.prefixes = {4: ipv4_prefix, 6: ipv6_prefix}
+
+    @classmethod
+    def from_config(cls, cfg=None):
+        cfg = cfg or GEOIP_CONFIG
+        resolvers = []
+        for name in cfg['resolvers']:
+            if name == 'offline':
+                resolvers.append(OfflineResolver(cfg['range_file']))
+            elif name == 'online':
+                resolvers.append(OnlineResolver(cfg['online_timeout']))
+        return cls(resolvers, cfg['cache_maxsize'], cfg['cache_ttl'], cfg['ipv4_prefix'], cfg['ipv6_prefix'])
+
+    def _cache_key(self, addr):
+        return str(ipaddress.ip_network(f"{addr}/{self.prefixes[addr.version]}", strict=False))
+
+    def _local_or_invalid(self, ip):
+        """本地/内网地址与非法地址直接给出结果，无需解析"""
+        if not ip:
+            return LOCAL_ADDRESS, None
+        try:
+            addr = ipaddress.ip_address(ip)
+        except ValueError:
+            return UNKNOWN_ADDRESS, None
+        if addr.is_loopback or addr.is_private:
+            return LOCAL_ADDRESS, None
+        return None, addr
+
+    def cached(self, ip):
+        """只查缓存，不发起解析；无缓存时返回 None"""
+        result, addr = self._local_or_invalid(ip)
+        if result:
+            return result
+        value = self.cache.get(self._cache_key(addr))
+        return None if value is _MISSING else value
+
+    def resolve(self, ip):
+        """解析地址（可能访问网络，应在后台线程调用）"""
+        result, addr = self._local_or_invalid(ip)
+        if result:
+            return result
+        key = self._cache_key(addr)
+        value = self.cache.get(key)
+        if value is not _MISSING:
+            return value
+
+        failed = False
+        for resolver in self.resolvers:
+            try:
+                address = resolver.resolve(ip)
+            except Exception as e:
+                print(f"获取IP地理位置失败: {e}")
+                failed = True
+                continue
+            if address:
+                self.cache.set(key, address)
+                return address
+        # 网络异常导致的失败不缓存，下次登录再试
+        if not failed:
+            self.cache.set(key, UNKNOWN_ADDRESS)
+        return UNKNOWN_ADDRESS
+
+    def stats(self):
+        stats = self.cache.stats()
+        stats["offline_ranges"] = sum(len(r) for r in self.resolvers if isinstance(r, OfflineResolver))
+        return stats
@@ -7,62 +7,130 @@ Desktop 后端服务
 即可收到对应 JSON 响应。
 """
 import struct
-import socketserver, json, threading, traceback
-from tools import DatabaseManager, RCON_CONFIG, _rcon
+import asyncio
+import json, threading, traceback
+import collections
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from tools import (DatabaseManager, RCON_CONFIG, USER_LIST_CONFIG, WHITELIST_CONFIG, WHITELIST_STATUS,
+                   ServerBusyError, _rcon, _rcon_batch, rcon_pool)
+from geoip import GeoLocator, UNKNOWN_ADDRESS
 import datetime, decimal
-import os
-import shutil
 import uuid
 import socket
 import time
 
 db = DatabaseManager()
 
+# 服务端配置
+SERVER_CONFIG = {
+    'host': '0.0.0.0',
+    'port': 8000,
+    'backlog': 1024,
+    'db_workers': 16,               # 执行普通路由（数据库等阻塞操作）的线程数
+    'rcon_workers': 4,              # 执行 RCON 相关路由的线程数，避免慢 RCON 占满数据库线程
+    'max_frame': 16 * 1024 * 1024,  # 单个请求帧的最大字节数
+    'max_inflight_per_conn': 8,     # 单个连接同时处理的请求数上限，达到后暂停读取该连接
+    'geo_workers': 2,               # 后台解析登录IP地理位置的线程数
+    'status_refresh_interval': 10,  # MC 服务器状态快照的后台刷新间隔（秒）
+    'status_max_age': 30,           # 快照超过该秒数视为过期，请求时触发一次合并刷新
+    'outbound_high_water': 256,     # 单个连接出站队列的帧数上限（高水位）
+    'outbound_policy': 'drop',      # 队列满时推送的处理方式：drop 丢弃该推送 / disconnect 断开连接
+    'outbound_stall_timeout': 30,   # 对端超过该秒数不读取数据时视为卡死并断开
+    'stream_chunk_rows': 500,       # 流式响应每帧携带的行数
+    'stream_low_water': 1,          # 流式响应在出站积压降到该帧数以下后才发送下一块
+    'max_streams': 2,               # 全局同时进行的流式响应数（每个连接最多一个）
+}
+
+# 会调用 RCON 的路由，交给独立的执行器
+RCON_ROUTES = {
+    "add_to_whitelist", "process_whitelist_application", "process_whitelist_applications_bulk",
+    "get_server_status", "execute_mc_command", "kick_player", "refresh_game_online_status",
+}
+
+# 流式响应的全局名额与每连接互斥
+_stream_slots = threading.BoundedSemaphore(SERVER_CONFIG['max_streams'])
+_stream_lock = threading.Lock()
+
+# 阻塞操作执行器：事件循环只负责网络收发
+db_executor = ThreadPoolExecutor(max_workers=SERVER_CONFIG['db_workers'], thread_name_prefix="db")
+rcon_executor = ThreadPoolExecutor(max_workers=SERVER_CONFIG['rcon_workers'], thread_name_prefix="rcon")
+# 登录IP地理位置在后台解析，结果按网段缓存
+geo_executor = ThreadPoolExecutor(max_workers=SERVER_CONFIG['geo_workers'], thread_name_prefix="geo")
+geo_locator = GeoLocator.from_config()
+
+# 单页消息条数上限
+MESSAGE_PAGE_MAX = 200
+# 单次增量同步返回的消息条数上限
+SYNC_BATCH_MAX = 500
+# 增量同步时在高水位之下重读的 MessageID 窗口：
+# 自增 ID 在插入时分配、提交顺序却可能不同，较小 ID 的消息可能晚于高水位才可见，
+# 重读这一小段避免漏掉；重复的消息由客户端按 MessageID 去重
+SYNC_OVERLAP_IDS = 50
+
 
 # 添加客户端连接管理
 class ClientConnectionManager:
+    """用户ID → 会话集合；同一用户可在多个客户端同时登录"""
+
     def __init__(self):
-        # 存储用户ID与连接的映射关系
+        # 存储用户ID与连接集合的映射关系
         self.connections = {}
         self.lock = threading.Lock()
 
     def add_connection(self, user_id, connection):
         """添加用户连接"""
         with self.lock:
-            self.connections[int(user_id)] = connection
-            print(
-                f"[S] 用户 {user_id} 连接已添加，当前连接数: {len(self.connections)} \n**当前链接映射：{self.connections}")
+            sessions = self.connections.setdefault(int(user_id), set())
+            sessions.add(connection)
+            count = len(sessions)
+        print(f"[S] 用户 {user_id} 连接已添加，该用户当前会话数: {count}")
 
-    def remove_connection(self, user_id):
-        """移除用户连接"""
+    def remove_connection(self, user_id, connection=None):
+        """移除用户的一个连接（connection 为 None 时移除全部），返回该用户剩余的会话数"""
         with self.lock:
-            if int(user_id) in self.connections:
+            sessions = self.connections.get(int(user_id))
+            if sessions is None:
+                return 0
+            if connection is None:
+                sessions.clear()
+            else:
+                sessions.discard(connection)
+            remaining = len(sessions)
+            if not remaining:
                 del self.connections[int(user_id)]
-                print(f"[S] 用户 {user_id} 连接已移除，当前连接数: {len(self.connections)}")
+        print(f"[S] 用户 {user_id} 连接已移除，该用户剩余会话数: {remaining}")
+        return remaining
+
+    def get_connections(self, user_id):
+        """获取用户所有连接的快照"""
+        with self.lock:
+            return list(self.connections.get(int(user_id), ()))
 
-    def get_connection(self, user_id):
-        """获取用户连接"""
+    def session_count(self, user_id):
         with self.lock:
-            return self.connections.get(int(user_id))
+            return len(self.connections.get(int(user_id), ()))
 
     def send_to_user(self, user_id, message):
-        """向指定用户发送消息"""
-        connection = self.get_connection(user_id)
-        if connection:
+        """向指定用户的所有会话发送消息；只在锁内取快照，发送在锁外进行"""
+        sessions = self.get_connections(user_id)
+        if not sessions:
+            print(f"[W] 用户 {user_id} 不在线，无法发送实时消息")
+            return False
+        # 发送实时消息给客户端
+        packed_message = _pack(message)
+        delivered = 0
+        for connection in sessions:
             try:
-                # 发送实时消息给客户端
-                packed_message = TCPHandler._pack(message)
                 connection.sendall(packed_message)
-                print(f"[S] 实时消息已发送给用户 {user_id}")
-                return True
+                delivered += 1
             except Exception as e:
                 print(f"[E] 发送消息给用户 {user_id} 失败: {e}")
                 # 移除失效连接
-                self.remove_connection(user_id)
-                return False
-        else:
-            print(f"[W] 用户 {user_id} 不在线，无法发送实时消息")
-            return False
+                self.remove_connection(user_id, connection)
+        if delivered:
+            print(f"[S] 实时消息已发送给用户 {user_id}（{delivered} 个会话）")
+        return delivered > 0
 
     def get_online_users(self):
         """获取在线用户列表"""
@@ -74,6 +142,40 @@ class ClientConnectionManager:
 connection_manager = ClientConnectionManager()
 
 
+# ---------- 在线状态推送 ----------
+def publish_presence(user_id):
+    """把用户的在线状态变化推送给把他当作联系人的在线用户"""
+    user_id = int(user_id)
+    connected = set(connection_manager.get_online_users())
+    connected.discard(user_id)
+    if not connected:
+        return
+    watchers = [uid for uid in db.get_contact_watchers(user_id) if uid in connected]
+    if not watchers:
+        return
+    event = {
+        "type": "presence",
+        "user_id": user_id,
+        "online": db.is_user_online(user_id),
+        "game_online": game_online_manager.is_user_game_online(user_id),
+    }
+    for uid in watchers:
+        connection_manager.send_to_user(uid, event)
+
+
+def _set_presence(user_id, online):
+    """更新在线状态，状态确有变化时在后台推送给联系人（比较与修改在 db 内原子完成）"""
+    changed = db.user_online(user_id) if online else db.user_offline(user_id)
+    if changed:
+        db_executor.submit(publish_presence, user_id)
+
+
+def _on_game_presence(joined, left):
+    """游戏内上线/下线同样推送给联系人"""
+    for user_id in joined | left:
+        publish_presence(user_id)
+
+
 # --------------------------------------------------
 # 业务路由表
 # --------------------------------------------------
@@ -94,25 +196,23 @@ def route_login(data):
     if not user:
         return {"success": False, "message": "用户名或密码错误"}
 
-    # 检查用户是否已经在线（防止重复登录）
-    if db.is_user_online(user["UserID"]):
-        return {"success": False, "message": "该用户已在其他地方登录，无法重复登录"}
-
     user['RoleID'] = db.get_role_by_uid(user['UserID'])  # 添加角色ID信息
     # 获取客户端IP地址
     client_ip = data.get("client_ip", "")
 
-    # 根据IP地址获取地理位置
-    address = get_location_by_ip(client_ip)
-
-    db.log_login(user["UserID"], client_ip, address)
+    # 缓存命中时直接写入地址，否则先写占位地址，由后台线程解析后补写，不阻塞登录
+    address = geo_locator.cached(client_ip)
+    record_id = db.log_login(user["UserID"], client_ip, address or UNKNOWN_ADDRESS)
+    if address is None:
+        geo_executor.submit(_fill_login_address, record_id, client_ip)
     # 用户登录时标记为在线，并更新最后在线时间
-    db.user_online(user["UserID"])
+    _set_presence(user["UserID"], True)
     # 更新用户的最后在线时间
     # 修复：使用datetime模块获取当前时间，而不是调用不存在的_get_now函数
     import datetime
     now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     db._execute("UPDATE Users SET last_online = %s WHERE UserID = %s", (now, user["UserID"]))
+    db.invalidate_profile(user["UserID"])
 
     # 打印当前在线用户
     online_users = db.get_online_users()
@@ -123,35 +223,18 @@ def route_login(data):
     unread_details = {str(item['sender_id']): item['unread_count']
                       for item in db.get_unread_messages_by_contact(user["UserID"])}
 
-    return {"success": True, "user": user, "online_users": online_users,
+    return {"success": True, "user": user,
             "unread_count": unread_count, "unread_details": unread_details}
 
 
-def get_location_by_ip(ip):
-    """
-    根据IP地址获取地理位置信息
-    """
-    if not ip or ip == "127.0.0.1":
-        return "本地地址"
-
+def _fill_login_address(record_id, ip):
+    """后台解析登录IP的地理位置并补写到登录记录"""
     try:
-        import requests
-        # 使用ip-api.com免费接口获取地理位置
-        print(f"正在解析IP地址：{ip}", end=' ')
-        response = requests.get(f"http://ip-api.com/json/{ip}?lang=zh-CN", timeout=5)
-        if response.status_code == 200:
-            data = response.json()
-            if data.get("status") == "success":
-                region = data.get("regionName", "")
-                city = data.get("city", "")
-                address = f"{region} {city}"
-                print(f" ———— 获取位置成功: {address}")
-                # 限制地址长度不超过255字符，防止数据库插入错误
-                return address
-        return "未知地址"
+        address = geo_locator.resolve(ip)
+        db.update_login_address(record_id, address)
+        print(f"[S] 登录记录 {record_id} 地址解析完成：{ip} -> {address}")
     except Exception as e:
-        print(f"获取IP地理位置失败: {e}")
-        return "未知地址"
+        print(f"[E] 补写登录地址失败：{e}")
 
 
 def route_update_role(data):
@@ -176,9 +259,9 @@ def route_sign(data):
     uid = data.get("user_id")
     if not uid:
         return {"success": False, "message": "缺少 user_id"}
-    if db.has_sign_today(uid):
-        return {"success": False, "message": "今日已签到"}
     ret = db.do_sign(uid)
+    if ret is None:
+        return {"success": False, "message": "今日已签到"}
     return {"success": True, "reward": ret}
 
 
@@ -192,16 +275,9 @@ def route_profile(data):
     uid = data.get("user_id")
     if not uid:
         return {"success": False, "message": "缺少 user_id"}
-    user = db.get_user_by_id(uid)
+    user = db.get_full_profile(uid)
     if not user:
         return {"success": False, "message": "用户不存在"}
-    user["RoleID"] = db.get_role_by_uid(uid)
-    user["WhiteState"] = db.get_whitelist_state(uid) or 0  # 修复：处理None值
-    # 修改QQID获取方式，避免数据库连接问题
-    try:
-        user["QQID"] = db.get_qq_by_uid(uid)
-    except:
-        user["QQID"] = None
     return {"success": True, "user": user}
 
 
@@ -258,11 +334,53 @@ def route_get_all_users(data):
         # 添加在线状态信息到每个用户
         for user in users:
             user["online"] = db.is_user_online(user["UserID"])
-        return {"success": True, "data": users, "online_users": db.get_online_users()}
+        return {"success": True, "data": users}
     except Exception as e:
         return {"success": False, "message": f"获取用户信息失败: {str(e)}"}
 
 
+def route_stream_all_users(session, req):
+    """
+    流式获取所有用户（管理员）：按 UserID 键集逐块查询，每块单独成帧（带请求 seq，done=False），
+    最后由普通响应返回结束标记（done=True）；上一块写出后才查询并发送下一块，两端内存占用恒定
+    """
+    user_id = req.get("user_id")
+
+    if not user_id:
+        return {"success": False, "message": "缺少 user_id", "stream": True, "done": True}
+
+    if db.get_role_by_uid(user_id) != 1:
+        return {"success": False, "message": "权限不足", "stream": True, "done": True}
+
+    with _stream_lock:
+        if session.streaming:
+            return {"success": False, "message": "当前连接已有进行中的导出", "stream": True, "done": True}
+        if not _stream_slots.acquire(blocking=False):
+            return {"success": False, "message": "导出任务过多，请稍后再试", "busy": True,
+                    "stream": True, "done": True}
+        session.streaming = True
+
+    chunks = total = 0
+    try:
+        for rows in db.iter_all_users(SERVER_CONFIG['stream_chunk_rows']):
+            for user in rows:
+                user.pop("Password", None)
+                user["online"] = db.is_user_online(user["UserID"])
+            frame = _pack({"type": req.get("type"), "seq": req.get("seq"), "success": True,
+                           "stream": True, "done": False, "chunk": chunks, "data": rows})
+            if not session.send_blocking(frame, SERVER_CONFIG['stream_low_water']):
+                return {"success": False, "message": "客户端已断开", "stream": True, "done": True}
+            chunks += 1
+            total += len(rows)
+    except Exception as e:
+        return {"success": False, "message": f"获取用户信息失败: {str(e)}", "stream": True, "done": True}
+    finally:
+        with _stream_lock:
+            session.streaming = False
+        _stream_slots.release()
+    return {"success": True, "stream": True, "done": True, "chunks": chunks, "total": total}
+
+
 def route_whitelist_apply(data):
     """提交白名单申请"""
     uid = data.get("user_id")
@@ -282,55 +400,11 @@ def route_whitelist_apply(data):
         if whitelist_state == 1:
             return {"success": False, "message": "您已通过白名单审核，无需再次申请"}
 
-        # 检查是否已有未审核的申请 (修复：使用正确的函数)
-        user_applications = db.get_whitelist_applications(uid)
-        # 检查是否有待审核的申请
-        pending_application = any(app.get("status") == "待审核" for app in user_applications)
-        if pending_application:
-            return {"success": False, "message": "您有未审核的申请，请等待审核完成后再申请"}
-
-        # 检查今天申请次数是否超过限制（一天最多3次）
-        import os
-        from datetime import datetime
-        today_date = datetime.now().strftime("%Y-%m-%d")
-        today_count = 0
-
-        base_path = "白名单相关/白名单申请"
-        if os.path.exists(base_path):
-            date_path = os.path.join(base_path, today_date)
-            if os.path.exists(date_path):
-                for filename in os.listdir(date_path):
-                    if filename.startswith(f"{uid}-") and filename.endswith(".txt"):
-                        today_count += 1
-
-        # 同时检查已审核的申请
-        approved_path = "白名单相关/已审核白名单"
-        if os.path.exists(approved_path):
-            for filename in os.listdir(approved_path):
-                if filename.endswith(".txt"):
-                    parts = filename.split("#")
-                    if len(parts) >= 3:
-                        file_uid = parts[1].split("-")[0]
-                        file_date = parts[0]
-                        if file_uid == str(uid) and file_date == today_date:
-                            today_count += 1
-
-        if today_count >= 3:
-            return {"success": False, "message": "您今天已达到申请次数上限（3次）"}
-
-        # 创建申请记录目录
-        os.makedirs(f"白名单相关/白名单申请/{today_date}", exist_ok=True)
-
-        # 生成申请记录
-        genuine_text = "正版" if genuine == 1 else "离线"
-        application_content = f"申请人ID: {uid}:{playername}\n游玩方式：{genuine_text}\n申请介绍：{reason}\n"
-
-        # 保存申请记录到文件
-        filename = f"白名单相关/白名单申请/{today_date}/{uid}-{playername}.txt"
-        with open(filename, "w", encoding="utf-8") as f:
-            f.write(application_content)
-
-        return {"success": True, "message": "申请已提交"}
+        # 待审核检查、每日次数检查与写入在同一事务内完成
+        res = db.submit_whitelist_application(uid, playername, genuine, reason)
+        if res is True:
+            return {"success": True, "message": "申请已提交"}
+        return {"success": False, "message": res}
     except Exception as e:
         return {"success": False, "message": f"提交失败: {str(e)}"}
 
@@ -343,175 +417,214 @@ def route_get_user_whitelist_applications(data):
         return {"success": False, "message": "缺少 user_id"}
 
     try:
-        import os
-        from datetime import datetime
-
-        applications = []
-
-        # 检查申请记录目录是否存在
-        base_path = "白名单相关/白名单申请"
-        if os.path.exists(base_path):
-            # 遍历所有日期目录
-            for date_dir in os.listdir(base_path):
-                date_path = os.path.join(base_path, date_dir)
-                if os.path.isdir(date_path):
-                    # 遍历该日期下的所有申请文件
-                    for filename in os.listdir(date_path):
-                        if filename.startswith(f"{uid}-") and filename.endswith(".txt"):
-                            filepath = os.path.join(date_path, filename)
-                            try:
-                                with open(filepath, "r", encoding="utf-8") as f:
-                                    content = f.read()
-                                    # 从文件名解析玩家名
-                                    playername = filename[len(f"{uid}-"):-4]  # 去掉uid-前缀和.txt后缀
-                                    applications.append({
-                                        "date": date_dir,
-                                        "playername": playername,
-                                        "status": "待审核",
-                                        "content": content
-                                    })
-                            except Exception:
-                                continue
-
-        # 同样检查已审核的申请
-        approved_path = "白名单相关/已审核白名单"
-        if os.path.exists(approved_path):
-            for filename in os.listdir(approved_path):
-                if filename.endswith(".txt"):
-                    # 解析文件名获取用户ID
-                    parts = filename.split("#")
-                    if len(parts) >= 3:
-                        file_uid = parts[1].split("-")[0]  # 从"用户ID-玩家名"中提取用户ID
-                        if file_uid == str(uid):
-                            try:
-                                # 从文件名解析信息
-                                date = parts[0]
-                                user_player = parts[1].split("-")
-                                user_id = user_player[0]
-                                playername = user_player[1] if len(user_player) > 1 else ""
-                                state = parts[2][:-4]  # 去掉.txt后缀
-
-                                applications.append({
-                                    "date": date,
-                                    "playername": playername,
-                                    "status": state,
-                                    "content": f"申请已{state}"
-                                })
-                            except Exception:
-                                continue
-
-        # 按申请时间排序（最新的在前）
-        applications.sort(key=lambda x: x["date"], reverse=True)
-
-        return {"success": True, "applications": applications}
+        return {"success": True, "applications": db.get_whitelist_applications(uid)}
     except Exception as e:
         return {"success": False, "message": f"获取申请记录失败: {str(e)}"}
 
 
 def route_get_all_whitelist_applications(data):
-    """获取所有白名单申请"""
+    """分页获取白名单申请（审批队列），可按状态、日期范围、账号类型筛选"""
+    user_id = data.get("user_id")
+
+    if not user_id:
+        return {"success": False, "message": "缺少 user_id"}
+
+    if db.get_role_by_uid(user_id) != 1:
+        return {"success": False, "message": "权限不足"}
+
+    # 状态：待审核（默认）/ 已通过 / 未通过 / 全部
+    status_name = data.get("status") or "待审核"
+    status_codes = {name: code for code, name in WHITELIST_STATUS.items()}
+    if status_name != "全部" and status_name not in status_codes:
+        return {"success": False, "message": "无效的申请状态"}
+    status = None if status_name == "全部" else status_codes[status_name]
+
+    genuine = data.get("genuine")
+    if genuine not in (None, 0, 1):
+        return {"success": False, "message": "无效的账号类型"}
+
+    date_from, date_to = data.get("date_from"), data.get("date_to")
+    try:
+        for value in (date_from, date_to):
+            if value:
+                datetime.datetime.strptime(value, '%Y-%m-%d')
+        page = max(1, int(data.get("page", 1)))
+        page_size = min(max(1, int(data.get("page_size", WHITELIST_CONFIG['page_size']))),
+                        WHITELIST_CONFIG['max_page_size'])
+    except (TypeError, ValueError):
+        return {"success": False, "message": "参数格式错误"}
+
     try:
-        import os
-
-        applications = []
-
-        # 检查申请记录目录是否存在
-        base_path = "白名单相关/白名单申请"
-        if os.path.exists(base_path):
-            # 遍历所有日期目录
-            for date_dir in os.listdir(base_path):
-                date_path = os.path.join(base_path, date_dir)
-                if os.path.isdir(date_path):
-                    # 遍历该日期下的所有申请文件
-                    for filename in os.listdir(date_path):
-                        if filename.endswith(".txt"):
-                            filepath = os.path.join(date_path, filename)
-                            try:
-                                with open(filepath, "r", encoding="utf-8") as f:
-                                    content = f.read()
-                                    # 从文件名解析用户ID和玩家名
-                                    uid_and_player = filename[:-4]  # 去掉.txt后缀
-                                    uid, playername = uid_and_player.split("-", 1)
-
-                                    applications.append({
-                                        "date": date_dir,
-                                        "user_id": uid,
-                                        "playername": playername,
-                                        "status": "待审核",
-                                        "content": content
-                                    })
-                            except Exception:
-                                continue
-
-        # 按申请时间排序（最新的在前）
-        applications.sort(key=lambda x: x["date"], reverse=True)
-
-        return {"success": True, "applications": applications}
+        applications, total = db.query_whitelist_applications(
+            status=status, date_from=date_from, date_to=date_to, genuine=genuine,
+            descending=data.get("order", "desc") != "asc", page=page, page_size=page_size)
+        return {"success": True, "applications": applications, "total": total,
+                "page": page, "page_size": page_size}
     except Exception as e:
         return {"success": False, "message": f"获取申请列表失败: {str(e)}"}
 
 
+def route_get_whitelist_summary(data):
+    """白名单申请统计：各状态数量与今日新增"""
+    user_id = data.get("user_id")
+
+    if not user_id:
+        return {"success": False, "message": "缺少 user_id"}
+
+    if db.get_role_by_uid(user_id) != 1:
+        return {"success": False, "message": "权限不足"}
+
+    try:
+        return {"success": True, "summary": db.get_whitelist_summary()}
+    except Exception as e:
+        return {"success": False, "message": f"获取申请统计失败: {str(e)}"}
+
+
+def _whitelist_announcement(playernames):
+    """白名单通过公告（tellraw），多个玩家合并为一条"""
+    plain = {"bold": False, "italic": False, "underlined": False, "strikethrough": False, "obfuscated": False}
+    parts = [dict(plain, text="[RCON] ", color="yellow", bold=True), dict(plain, text="恭喜玩家<", color="green")]
+    for i, name in enumerate(playernames):
+        if i:
+            parts.append(dict(plain, text=">、<", color="green"))
+        parts.append(dict(plain, text=name, color="yellow"))
+    parts.append(dict(plain, text=">通过了白名单审核！", color="green"))
+    return "tellraw @a " + json.dumps(parts, ensure_ascii=False, separators=(',', ':'))
+
+
 def route_process_whitelist_application(data):
-    """处理白名单申请"""
+    """处理白名单申请（user_id 为审核的管理员；申请人与玩家名以申请记录为准）"""
+    admin_id = data.get("user_id")
+    application_id = data.get("id")
     date = data.get("date")
-    user_id = data.get("user_id")
+    applicant_id = data.get("applicant_id")
     approved = data.get("approved")
     playername = data.get("playername")
     genuine = data.get("genuine")
 
-    print(f"[S] 收到白名单审核请求 -- {date}: UID:{user_id} 申请ID:{playername} 审核结果：{approved}")
+    print(f"[S] 收到白名单审核请求 -- {date}: 申请:{application_id or f'UID:{applicant_id} {playername}'} 审核结果：{approved}")
 
-    if not date or not user_id or approved is None:
+    if not admin_id or approved is None or not (application_id or (date and applicant_id and playername)):
         return {"success": False, "message": "缺少必要参数"}
 
+    if db.get_role_by_uid(admin_id) != 1:
+        return {"success": False, "message": "权限不足"}
+
     try:
-        import os
-        import shutil
         from datetime import datetime
 
-        # 构建原始文件路径和目标文件路径
-        original_path = f"白名单相关/白名单申请/{date}/{user_id}-{playername}.txt"
-        state_str = "已通过" if approved else "未通过"
-        target_path = f"白名单相关/已审核白名单/{date}#{user_id}-{playername}#{state_str}.txt"
-        # 确保目标目录存在
-        os.makedirs(os.path.dirname(target_path), exist_ok=True)
-
-        # 检查原始文件是否存在
-        file_exists = os.path.exists(original_path)
-
-        # 移动文件（如果存在）
-        if file_exists:
-            shutil.move(original_path, target_path)
+        # 申请状态与玩家白名单状态在同一事务内更新
+        with db.transaction():
+            application = db.review_whitelist_application(approved, application_id, applicant_id, playername, date)
+            if not application:
+                return {"success": False, "message": "申请不存在或已处理"}
+            user_id, playername = application['UserID'], application['PlayerName']
+            if approved:
+                db._execute("UPDATE PlayerData SET WhiteState=1, PassDate=%s, Genuine=%s, PlayerName=%s WHERE UserID=%s",
+                            (datetime.now().strftime('%Y-%m-%d'),
+                             application['Genuine'] if genuine is None else genuine, playername, user_id))
+            else:
+                # 如果申请被拒绝，确保白名单状态为0
+                db._execute("UPDATE PlayerData SET WhiteState=0 WHERE UserID=%s", (user_id,))
+        db.invalidate_profile(user_id)
 
-        # 根据审核结果更新数据库
         if approved:
+            db.player_index.assign(user_id, playername)
             try:
-                # 使用RCON命令添加白名单
-                result = _rcon(f"wid add {playername}")
+                # 使用RCON命令添加白名单，并发送服务器公告（同一会话内连续执行）
+                result, _ = _rcon_batch([f"wid add {playername}", _whitelist_announcement([playername])])
                 print(f"[RCON] {result}")
-                # 发送服务器公告
-                _rcon('''tellraw @a [{"text":"[RCON] ","color":"yellow","bold":true,"italic":false,"underlined":false,"strikethrough":false,"obfuscated":false},{"text":"恭喜玩家<","color":"green","bold":false,"italic":false,"underlined":false,"strikethrough":false,"obfuscated":false},{"text":"%s","color":"yellow","bold":false,"italic":false,"underlined":false,"strikethrough":false,"obfuscated":false},{"text":">通过了白名单审核！","color":"green","bold":false,"italic":false,"underlined":false,"strikethrough":false,"obfuscated":false}]''' % playername)
                 print(f"已通过RCON添加玩家 {playername} 到白名单")
             except Exception as e:
                 print(f"添加白名单失败: {e}")
 
-            # 更新数据库中的白名单状态
-            db._execute("UPDATE PlayerData SET WhiteState=1, PassDate=%s, Genuine=%s, PlayerName=%s WHERE UserID=%s",
-                        (datetime.now().strftime('%Y-%m-%d'), genuine, playername, user_id))
-        else:
-            # 如果申请被拒绝，确保白名单状态为0
-            db._execute("UPDATE PlayerData SET WhiteState=0 WHERE UserID=%s", (user_id,))
-
         action = "通过" if approved else "拒绝"
         return {"success": True, "message": f"申请已{action}"}
     except Exception as e:
         return {"success": False, "message": f"处理失败: {str(e)}"}
 
 
+def route_process_whitelist_applications_bulk(data):
+    """
+    批量处理白名单申请
+    所有申请的状态与 PlayerData 变更在一个事务内提交；通过的玩家在同一 RCON 会话内依次加白，
+    最后发送一条合并公告。返回每条申请的处理结果
+    """
+    admin_id = data.get("user_id")
+    items = data.get("applications")
+
+    if not admin_id or not isinstance(items, list) or not items:
+        return {"success": False, "message": "缺少必要参数"}
+
+    if db.get_role_by_uid(admin_id) != 1:
+        return {"success": False, "message": "权限不足"}
+
+    if len(items) > WHITELIST_CONFIG['bulk_max']:
+        return {"success": False, "message": f"单次最多处理 {WHITELIST_CONFIG['bulk_max']} 条申请"}
+
+    print(f"[S] 收到批量白名单审核请求 -- {len(items)} 条")
+
+    results = []
+    passed = []  # 审核通过的结果项，提交后统一加白
+    today = datetime.date.today().strftime('%Y-%m-%d')
+    try:
+        with db.transaction():
+            for item in items:
+                approved = item.get("approved")
+                result = {"id": item.get("id"), "user_id": item.get("user_id"),
+                          "playername": item.get("playername"), "approved": approved}
+                results.append(result)
+                # 有申请ID时按ID定位，否则需要 (日期, 申请人, 玩家名)
+                if approved is None or not (item.get("id") or
+                                            (item.get("date") and item.get("user_id") and item.get("playername"))):
+                    result.update(success=False, message="缺少必要参数")
+                    continue
+                application = db.review_whitelist_application(approved, item.get("id"), item.get("user_id"),
+                                                              item.get("playername"), item.get("date"))
+                if not application:
+                    result.update(success=False, message="申请不存在或已处理")
+                    continue
+                # 申请人与玩家名以申请记录为准
+                result.update(user_id=application['UserID'], playername=application['PlayerName'])
+                if approved:
+                    # 未提供账号类型时保留原值
+                    db._execute("""
+                        UPDATE PlayerData SET WhiteState=1, PassDate=%s, Genuine=COALESCE(%s, Genuine), PlayerName=%s
+                        WHERE UserID=%s
+                    """, (today, item.get("genuine"), result["playername"], result["user_id"]))
+                    passed.append(result)
+                else:
+                    db._execute("UPDATE PlayerData SET WhiteState=0 WHERE UserID=%s", (result["user_id"],))
+                result.update(success=True, message="申请已通过" if approved else "申请已拒绝")
+    except Exception as e:
+        return {"success": False, "message": f"处理失败: {str(e)}"}
+
+    for result in results:
+        if result.get("success"):
+            db.invalidate_profile(result["user_id"])
+    for result in passed:
+        db.player_index.assign(result["user_id"], result["playername"])
+
+    if passed:
+        names = [r["playername"] for r in passed]
+        try:
+            outputs = _rcon_batch([f"wid add {name}" for name in names] + [_whitelist_announcement(names)])
+            for result, output in zip(passed, outputs):
+                result["rcon"] = output
+            print(f"已通过RCON批量添加 {len(names)} 名玩家到白名单")
+        except Exception as e:
+            print(f"批量添加白名单失败: {e}")
+            for result in passed:
+                result["rcon_error"] = str(e)
+
+    succeeded = sum(1 for r in results if r.get("success"))
+    return {"success": True, "message": f"已处理 {succeeded}/{len(results)} 条申请", "results": results}
+
+
 def route_get_users_count(data):
-    """获取用户总数"""
+    """获取用户总数（短期缓存的近似值）"""
     try:
-        count = db.get_users_count()
+        count = db.count_users()
         return {"success": True, "count": count}
     except Exception as e:
         return {"success": False, "message": f"获取用户数量失败: {str(e)}"}
@@ -526,7 +639,49 @@ def route_get_users_by_page(data):
         # 添加在线状态信息到每个用户
         for user in users:
             user["online"] = db.is_user_online(user["UserID"])
-        return {"success": True, "data": users, "online_users": db.get_online_users()}
+        return {"success": True, "data": users}
+    except Exception as e:
+        return {"success": False, "message": f"获取用户数据失败: {str(e)}"}
+
+
+def route_list_users(data):
+    """
+    管理员用户列表：按 UserID 键集分页，支持按角色、白名单状态、在线状态、名称前缀筛选
+    翻页参数 after_id（下一页）/ before_id（上一页）/ last（末页），都不传时返回首页
+    """
+    user_id = data.get("user_id")
+
+    if not user_id:
+        return {"success": False, "message": "缺少 user_id"}
+
+    if db.get_role_by_uid(user_id) != 1:
+        return {"success": False, "message": "权限不足"}
+
+    try:
+        after_id = data.get("after_id")
+        before_id = data.get("before_id")
+        after_id = int(after_id) if after_id is not None else None
+        before_id = int(before_id) if before_id is not None else None
+        page_size = min(max(1, int(data.get("page_size", USER_LIST_CONFIG['page_size']))),
+                        USER_LIST_CONFIG['max_page_size'])
+        role = data.get("role")
+        role = int(role) if role is not None else None
+        white_state = data.get("white_state")
+        white_state = int(white_state) if white_state is not None else None
+    except (TypeError, ValueError):
+        return {"success": False, "message": "参数格式错误"}
+    online = data.get("online")
+    online = bool(online) if online is not None else None
+    name_prefix = (data.get("name_prefix") or "").strip() or None
+
+    try:
+        filters = dict(role=role, white_state=white_state, online=online, name_prefix=name_prefix)
+        page = db.list_users(after_id=after_id, before_id=before_id, last=bool(data.get("last")),
+                             page_size=page_size, **filters)
+        for user in page["users"]:
+            user["online"] = db.is_user_online(user["UserID"])
+        return {"success": True, "data": page["users"], "has_prev": page["has_prev"],
+                "has_next": page["has_next"], "total": db.count_users(**filters), "page_size": page_size}
     except Exception as e:
         return {"success": False, "message": f"获取用户数据失败: {str(e)}"}
 
@@ -551,13 +706,17 @@ def route_get_contacts(data):
             # 添加在线状态信息
             contact["online"] = db.is_user_online(contact_id)
 
-        return {"success": True, "contacts": contacts, "online_users": db.get_online_users()}
+        return {"success": True, "contacts": contacts}
     except Exception as e:
         return {"success": False, "message": f"获取联系人失败: {str(e)}"}
 
 
 def route_get_messages(data):
-    """获取两个用户之间的消息"""
+    """获取两个用户之间的消息
+
+    携带 limit 时按游标分页：返回最新 limit 条及继续向前翻页用的 before_message_id；
+    不携带 limit 时保持旧行为，返回全部消息。
+    """
     user_id = data.get("user_id")
     contact_id = data.get("contact_id")
 
@@ -565,12 +724,48 @@ def route_get_messages(data):
         return {"success": False, "message": "缺少必要参数"}
 
     try:
+        if data.get("limit"):
+            limit = max(1, min(int(data["limit"]), MESSAGE_PAGE_MAX))
+            messages, next_cursor = db.get_messages_page(user_id, contact_id, limit, data.get("before_message_id"))
+            return {"success": True, "messages": messages,
+                    "before_message_id": next_cursor, "has_more": next_cursor is not None}
         messages = db.get_messages_between_users(user_id, contact_id)
         return {"success": True, "messages": messages}
     except Exception as e:
         return {"success": False, "message": f"获取消息失败: {str(e)}"}
 
 
+def route_sync_messages(data):
+    """增量同步：返回 since_message_id 之后该用户所有会话中的新消息，以及最新的未读消息数
+
+    since_message_id 为空时只返回当前的最新 MessageID，供客户端建立同步起点。
+    每次会多返回高水位之下 SYNC_OVERLAP_IDS 范围内的消息，以补上乱序提交的消息。
+    """
+    user_id = data.get("user_id")
+    if not user_id:
+        return {"success": False, "message": "缺少 user_id"}
+
+    since_message_id = data.get("since_message_id")
+    try:
+        if since_message_id is None:
+            messages, has_more = [], False
+            last_message_id = db.get_last_message_id(user_id)
+        else:
+            since_message_id = int(since_message_id)
+            messages, has_more = db.get_messages_since(
+                user_id, max(since_message_id - SYNC_OVERLAP_IDS, 0), SYNC_BATCH_MAX)
+            # 高水位只前进不后退（本批可能全部落在重读窗口内）
+            last_message_id = max(since_message_id, messages[-1]["MessageID"]) if messages else since_message_id
+
+        unread_count = db.get_unread_messages_count(user_id)
+        unread_details = {str(item['sender_id']): item['unread_count']
+                          for item in db.get_unread_messages_by_contact(user_id)}
+        return {"success": True, "messages": messages, "last_message_id": last_message_id,
+                "has_more": has_more, "unread_count": unread_count, "unread_details": unread_details}
+    except Exception as e:
+        return {"success": False, "message": f"同步消息失败: {str(e)}"}
+
+
 def route_send_message(data):
     """发送消息"""
     sender_id = data.get("sender_id")
@@ -581,29 +776,29 @@ def route_send_message(data):
         return {"success": False, "message": "缺少必要参数"}
 
     try:
-        db.send_message(sender_id, receiver_id, content)
+        message_id = db.send_message(sender_id, receiver_id, content)
+
+        # 构造实时消息
+        import datetime
+        message_data = {
+            "MessageID": message_id,
+            "sender_id": sender_id,
+            "receiver_id": receiver_id,
+            "content": content,
+            "timestamp": datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+        response = {
+            "type": "real_time_message",
+            "message": message_data
+        }
 
-        # 检查接收者是否在线
+        # 推送给接收者的所有会话；发送者的其他客户端也收到一份，用于同步显示
         if db.is_user_online(receiver_id):
-            # 构造实时消息
-            import datetime
-            message_data = {
-                "sender_id": sender_id,
-                "receiver_id": receiver_id,
-                "content": content,
-                "timestamp": datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            }
-
-            # 发送实时消息给在线接收者
-            response = {
-                "type": "real_time_message",
-                "message": message_data
-            }
-
-            # 使用连接管理器发送实时消息
             connection_manager.send_to_user(receiver_id, response)
+        if str(sender_id) != str(receiver_id):
+            connection_manager.send_to_user(sender_id, response)
 
-        return {"success": True, "message": "消息发送成功"}
+        return {"success": True, "message": "消息发送成功", "MessageID": message_id}
     except Exception as e:
         return {"success": False, "message": f"发送消息失败: {str(e)}"}
 
@@ -633,17 +828,10 @@ def route_get_user_profile(data):
         return {"success": False, "message": "缺少必要参数"}
 
     try:
-        user = db.get_user_by_id(target_id)
+        user = db.get_full_profile(target_id)
         if not user:
             return {"success": False, "message": "用户不存在"}
 
-        user["RoleID"] = db.get_role_by_uid(target_id)
-        user["WhiteState"] = db.get_whitelist_state(target_id) or 0
-        try:
-            user["QQID"] = db.get_qq_by_uid(target_id)
-        except:
-            user["QQID"] = None
-
         return {"success": True, "user": user}
     except Exception as e:
         return {"success": False, "message": f"获取用户资料失败: {str(e)}"}
@@ -740,7 +928,7 @@ def route_user_online(data):
         return {"success": False, "message": "缺少 user_id"}
 
     try:
-        db.user_online(user_id)
+        _set_presence(user_id, True)
         # 打印当前在线用户
         online_users = db.get_online_users()
         # 获取用户名
@@ -748,8 +936,7 @@ def route_user_online(data):
         username = user.get('Username', '未知用户') if user else '未知用户'
         print(f"[S] 用户 {username} (ID: {user_id}) 上线，当前在线用户: {online_users}")
 
-        # 返回当前在线用户列表
-        return {"success": True, "message": "在线状态已更新", "online_users": online_users}
+        return {"success": True, "message": "在线状态已更新"}
     except Exception as e:
         return {"success": False, "message": f"更新在线状态失败: {str(e)}"}
 
@@ -762,7 +949,10 @@ def route_user_offline(data):
         return {"success": False, "message": "缺少 user_id"}
 
     try:
-        db.user_offline(user_id)
+        # 该用户仍有其他客户端在线时保持在线状态
+        if connection_manager.session_count(user_id):
+            return {"success": True, "message": "其他客户端仍在线"}
+        _set_presence(user_id, False)
         # 打印当前在线用户
         online_users = db.get_online_users()
         # 获取用户名
@@ -770,8 +960,7 @@ def route_user_offline(data):
         username = user.get('Username', '未知用户') if user else '未知用户'
         print(f"[S] 用户 {username} (ID: {user_id}) 下线，当前在线用户: {online_users}")
 
-        # 返回当前在线用户列表
-        return {"success": True, "message": "离线状态已更新", "online_users": online_users}
+        return {"success": True, "message": "离线状态已更新"}
     except Exception as e:
         return {"success": False, "message": f"更新离线状态失败: {str(e)}"}
 
@@ -831,6 +1020,13 @@ def route_mark_messages_as_read(data):
         unread_count = db.get_unread_messages_count(user_id)
         unread_details = {str(item['sender_id']): item['unread_count']
                           for item in db.get_unread_messages_by_contact(user_id)}
+        # 已读回执推送到该用户的所有会话，使各客户端的未读数保持一致
+        connection_manager.send_to_user(user_id, {
+            "type": "read_receipt",
+            "contact_id": contact_id,
+            "unread_count": unread_count,
+            "unread_details": unread_details
+        })
         return {"success": True, "unread_count": unread_count, "unread_details": unread_details}
     except Exception as e:
         return {"success": False, "message": f"标记消息为已读失败: {str(e)}"}
@@ -840,23 +1036,15 @@ def route_mark_messages_as_read(data):
 def route_get_server_status(data):
     """获取服务器状态"""
     try:
-        # 检查MC服务器是否在线
-        mc_online = check_mc_server_online()
-
-        # 获取在线玩家列表
-        online_players = []
-        if mc_online:
-            try:
-                result = _rcon("list")
-                online_players = game_online_manager._parse_online_players(result)
-            except Exception as e:
-                print(f"获取在线玩家列表失败: {e}")
-        print(f"[S] 当前在线玩家: {online_players}")
+        # 直接读取后台维护的状态快照，不再为每个请求执行 RCON
+        snapshot = server_status.get()
         return {
             "success": True,
-            "mc_server_online": mc_online,
-            "online_players": online_players,
-            "online_count": len(online_players)
+            "mc_server_online": snapshot["online"],
+            "online_players": snapshot["players"],
+            "online_count": snapshot["count"],
+            "updated_at": snapshot["updated_at"],
+            "rcon_latency_ms": snapshot["latency_ms"]
         }
     except Exception as e:
         return {"success": False, "message": f"获取服务器状态失败: {str(e)}"}
@@ -924,17 +1112,17 @@ def route_get_game_online_users(data):
     try:
         game_online_users = game_online_manager.get_game_online_users()
 
-        # 获取用户详细信息
+        # 批量获取用户详细信息
         users_info = []
+        profiles = db.get_full_profiles(game_online_users)
         for uid in game_online_users:
-            user = db.get_user_by_id(uid)
+            user = profiles.get(uid)
             if user:
-                player_data = db._fetchone("SELECT PlayerName FROM PlayerData WHERE UserID = %s", (uid,))
                 users_info.append({
                     "user_id": uid,
                     "username": user["Username"],
                     "nickname": user["Nickname"],
-                    "player_name": player_data["PlayerName"] if player_data else "未知"
+                    "player_name": user["PlayerName"] or "未知"
                 })
 
         return {
@@ -965,6 +1153,24 @@ def route_refresh_game_online_status(data):
         return {"success": False, "message": f"刷新失败: {str(e)}"}
 
 
+def route_get_runtime_stats(data):
+    """获取服务端运行指标（连接池、资料缓存等）"""
+    user_id = data.get("user_id")
+
+    if not user_id:
+        return {"success": False, "message": "缺少 user_id"}
+
+    # 检查用户权限
+    user_role = db.get_role_by_uid(user_id)
+    if user_role != 1:  # 只有管理员可以查看
+        return {"success": False, "message": "权限不足"}
+
+    return {"success": True, "db_pool": db.pool.stats(), "profile_cache": db.profile_cache.stats(),
+            "geoip": geo_locator.stats(), "password_hasher": db.hasher.stats(), "rcon_pool": rcon_pool.stats(),
+            "server_status": server_status.stats(), "outbound": outbound_stats(),
+            "sign_log": db.sign_log.stats()}
+
+
 ROUTER = {
     "register": route_register,
     "login": route_login,
@@ -979,13 +1185,17 @@ ROUTER = {
     "whitelist_apply": route_whitelist_apply,
     "get_user_whitelist_applications": route_get_user_whitelist_applications,
     "get_all_whitelist_applications": route_get_all_whitelist_applications,
+    "get_whitelist_summary": route_get_whitelist_summary,
     "process_whitelist_application": route_process_whitelist_application,
+    "process_whitelist_applications_bulk": route_process_whitelist_applications_bulk,
     # 添加新的路由
     "get_users_count": route_get_users_count,
     "get_users_by_page": route_get_users_by_page,
+    "list_users": route_list_users,
     # 通信系统路由
     "get_contacts": route_get_contacts,
     "get_messages": route_get_messages,
+    "sync_messages": route_sync_messages,
     "send_message": route_send_message,
     "update_contact_remark": route_update_contact_remark,
     "get_user_profile": route_get_user_profile,
@@ -1003,30 +1213,135 @@ ROUTER = {
     "execute_mc_command": route_execute_mc_command,
     "kick_player": route_kick_player,
     "get_game_online_users": route_get_game_online_users,
-    "refresh_game_online_status": route_refresh_game_online_status
+    "refresh_game_online_status": route_refresh_game_online_status,
+    "get_runtime_stats": route_get_runtime_stats
+}
+
+# 支持流式响应的路由（请求带 stream: true 时使用），处理函数签名为 (session, req)
+STREAM_ROUTES = {
+    "get_all_users": route_stream_all_users,
 }
 
 
-def check_mc_server_online():
-    """检查Minecraft服务器是否在线"""
+def _parse_online_players(list_result):
+    """解析list命令的结果，提取在线玩家名"""
     try:
-        result = _rcon("list")
-        if "players online" in result:
-            print("[S] 服务器已上线，当前在线人数: %s" % len(result.split(":")[1].split(',')))
-        else:
-            print("[S] 服务器已离线")
-        return True
+        # 典型的list命令返回格式: "There are X players online: player1, player2, player3"
+        if "players online" in list_result:
+            # 提取冒号后面的玩家名部分
+            players_part = list_result.split(":", 1)[1].strip()
+            if players_part and players_part != "":
+                return [name.strip() for name in players_part.split(",")]
+        return []
     except Exception as e:
-        print(f"[S] 服务器离线检查失败: {e}")
-        return False
+        print(f"解析在线玩家列表失败: {e}")
+        return []
+
+
+# MC 服务器状态快照
+class ServerStatusMonitor:
+    """
+    后台定时执行一次 RCON list，维护全局共享的服务器状态快照
+    - 快照为不可变字典，刷新时整体替换引用，读取无需加锁
+    - 快照过期时由请求触发刷新，同一时刻的多个刷新请求合并为一次 RCON 调用
+    """
+
+    def __init__(self, interval=10, max_age=30):
+        self.interval = interval
+        self.max_age = max_age
+        self.running = False
+        self._snapshot = {"online": False, "players": [], "count": 0, "updated_at": None, "latency_ms": None}
+        self._refreshed_at = None  # 上次刷新完成的 monotonic 时间
+        self._lock = threading.Lock()
+        self._inflight = None      # 进行中的刷新（threading.Event）
+        self._stats = {"refreshes": 0, "coalesced": 0, "failures": 0}
+
+    def start(self):
+        """启动后台刷新线程"""
+        if not self.running:
+            self.running = True
+            threading.Thread(target=self._refresh_loop, daemon=True).start()
+            print(f"[S] 服务器状态快照每 {self.interval} 秒刷新一次")
+
+    def stop(self):
+        self.running = False
+
+    def _refresh_loop(self):
+        while self.running:
+            self.refresh()
+            time.sleep(self.interval)
+
+    def _probe(self):
+        start = time.perf_counter()
+        try:
+            result = _rcon("list")
+            online, players = True, _parse_online_players(result)
+        except Exception as e:
+            print(f"[S] 服务器离线检查失败: {e}")
+            online, players = False, []
+        latency_ms = round((time.perf_counter() - start) * 1000, 1)
+        return {"online": online, "players": players, "count": len(players),
+                "updated_at": datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                "latency_ms": latency_ms if online else None}
+
+    def refresh(self):
+        """立即刷新快照；已有刷新在进行时等待其结果，不重复调用 RCON"""
+        with self._lock:
+            event = self._inflight
+            leader = event is None
+            if leader:
+                event = self._inflight = threading.Event()
+            else:
+                self._stats["coalesced"] += 1
+        if not leader:
+            event.wait(RCON_CONFIG['timeout'] * 2)
+            return self._snapshot
+
+        try:
+            snapshot = self._probe()
+            previous = self._snapshot
+            self._snapshot = snapshot
+            self._refreshed_at = time.monotonic()
+            if snapshot["online"] != previous["online"] or previous["updated_at"] is None:
+                print(f"[S] 服务器{'已上线' if snapshot['online'] else '已离线'}，当前在线人数: {snapshot['count']}")
+        finally:
+            with self._lock:
+                self._inflight = None
+                self._stats["refreshes"] += 1
+                if not self._snapshot["online"]:
+                    self._stats["failures"] += 1
+            event.set()
+        return snapshot
+
+    def get(self):
+        """返回当前快照，过期时先合并刷新"""
+        refreshed_at = self._refreshed_at
+        if refreshed_at is None or time.monotonic() - refreshed_at > self.max_age:
+            return self.refresh()
+        return self._snapshot
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update(interval=self.interval, max_age=self.max_age, updated_at=self._snapshot["updated_at"])
+        return stats
+
+
+server_status = ServerStatusMonitor(SERVER_CONFIG['status_refresh_interval'], SERVER_CONFIG['status_max_age'])
+
+
+def check_mc_server_online():
+    """检查Minecraft服务器是否在线（读取状态快照）"""
+    return server_status.get()["online"]
 
 
 # 游戏内在线状态管理
 class GameOnlineManager:
     def __init__(self):
-        self.game_online_users = set()  # 存储游戏内在线的用户
+        self.game_online_users = frozenset()  # 存储游戏内在线的用户，每轮整体替换
         self.lock = threading.Lock()
         self.running = False
+        self.listeners = []  # 在线变化回调 fn(joined, left)，参数为 UserID 集合
 
     def start_monitoring(self):
         """开始监控游戏内在线状态"""
@@ -1041,12 +1356,15 @@ class GameOnlineManager:
         self.running = False
         print("停止监控游戏内在线状态")
 
+    def add_listener(self, callback):
+        """注册游戏内上线/下线回调"""
+        self.listeners.append(callback)
+
     def _monitor_loop(self):
         """监控循环，每60秒检查一次"""
         while self.running:
             try:
-                if check_mc_server_online():
-                    self._update_game_online_status()
+                self._update_game_online_status()
                 time.sleep(60)  # 每60秒检查一次
             except Exception as e:
                 print(f"监控循环出错: {e}")
@@ -1055,198 +1373,393 @@ class GameOnlineManager:
     def _update_game_online_status(self):
         """更新游戏内在线状态"""
         try:
-            # 获取在线玩家列表
-            result = _rcon("list")
-            print(f"MC服务器响应: {result}")
-            _rcon("wid reload")
+            # 刷新状态快照（同时更新 get_server_status 使用的快照），取其中的在线玩家列表
+            snapshot = server_status.refresh()
+            online_players = []
+            if snapshot["online"]:
+                _rcon("wid reload")
+                online_players = snapshot["players"]
 
-            # 解析在线玩家列表
-            online_players = self._parse_online_players(result)
+            # 一次查询批量反查 UserID（命中内存索引的玩家名不再查库）
+            uid_by_name = db.get_user_ids_by_player_names(online_players) if online_players else {}
+            current = frozenset(uid_by_name.values())
 
             with self.lock:
-                # 清空当前游戏在线状态
-                self.game_online_users.clear()
-
-                # 根据玩家名查找对应的用户ID并标记为游戏在线
-                for player_name in online_players:
-                    user_id = db.get_user_id_by_player_name(player_name)
-                    if user_id:
-                        self.game_online_users.add(user_id)
-                        print(f"玩家 {player_name} (UID: {user_id}) 游戏内在线")
-
-            print(f"当前游戏内在线用户: {self.game_online_users}")
+                previous, self.game_online_users = self.game_online_users, current
+            joined, left = current - previous, previous - current
+            if not joined and not left:
+                return
+
+            name_by_uid = {uid: name for name, uid in uid_by_name.items()}
+            for user_id in joined:
+                print(f"玩家 {name_by_uid[user_id]} (UID: {user_id}) 游戏内上线")
+            for user_id in left:
+                print(f"UID: {user_id} 游戏内下线")
+            print(f"当前游戏内在线用户: {set(current)}")
+            self._publish(joined, left)
 
         except Exception as e:
             print(f"更新游戏内在线状态失败: {e}")
 
+    def _publish(self, joined, left):
+        for callback in list(self.listeners):
+            try:
+                callback(joined, left)
+            except Exception as e:
+                print(f"[E] 游戏在线变化回调出错: {e}")
+
     def _parse_online_players(self, list_result):
         """解析list命令的结果，提取在线玩家名"""
-        try:
-            # 典型的list命令返回格式: "There are X players online: player1, player2, player3"
-            if "players online" in list_result:
-                # 提取冒号后面的玩家名部分
-                players_part = list_result.split(":", 1)[1].strip()
-                if players_part and players_part != "":
-                    return [name.strip() for name in players_part.split(",")]
-            return []
-        except Exception as e:
-            print(f"解析在线玩家列表失败: {e}")
-            return []
+        return _parse_online_players(list_result)
 
     def is_user_game_online(self, user_id):
         """检查用户是否游戏内在线"""
-        with self.lock:
-            return int(user_id) in self.game_online_users
+        return int(user_id) in self.game_online_users
 
     def get_game_online_users(self):
         """获取所有游戏内在线用户"""
-        with self.lock:
-            return list(self.game_online_users)
+        return list(self.game_online_users)
 
 
 # 创建全局游戏在线管理器实例
 game_online_manager = GameOnlineManager()
+game_online_manager.add_listener(_on_game_presence)
 
 
-class TCPHandler(socketserver.BaseRequestHandler):
-    def __init__(self, request, client_address, server):
-        # 保存客户端IP地址和当前用户ID的映射
-        self.client_user_map = {}
-        super().__init__(request, client_address, server)
-
-    @staticmethod
-    def _pack(msg: dict) -> bytes:
-        def _default(o):
-            if isinstance(o, (datetime.datetime, datetime.date)):
-                return o.isoformat()
-            if isinstance(o, decimal.Decimal):
-                return float(o)
-            if isinstance(o, bytes):
-                return o.decode('utf-8')
-            raise TypeError(f'Object of type {o.__class__.__name__} is not JSON serializable')
-
-        body = json.dumps(msg, ensure_ascii=False, separators=(',', ':'), default=_default).encode('utf-8')
-        return struct.pack('>I', len(body)) + body
-
-    @staticmethod
-    def _recv_exact(sock, n):
-        buf = bytearray()
-        while len(buf) < n:
-            chunk = sock.recv(n - len(buf))
-            if not chunk:
-                raise ConnectionResetError
-            buf.extend(chunk)
-        return bytes(buf)
-
-    def handle(self):
-        conn = self.request
-        client_ip = self.client_address[0]  # 获取客户端IP地址
-        current_user_id = None  # 当前连接的用户ID
+def _pack(msg: dict) -> bytes:
+    """按 4 字节长度前缀 + JSON 打包一帧"""
+    def _default(o):
+        if isinstance(o, (datetime.datetime, datetime.date)):
+            return o.isoformat()
+        if isinstance(o, decimal.Decimal):
+            return float(o)
+        if isinstance(o, bytes):
+            return o.decode('utf-8')
+        raise TypeError(f'Object of type {o.__class__.__name__} is not JSON serializable')
 
-        try:
-            while True:
-                len_bs = self._recv_exact(conn, 4)
-                body_len = struct.unpack('>I', len_bs)[0]
-                body = self._recv_exact(conn, body_len)
-                req = json.loads(body.decode('utf-8'))
-
-                # 获取客户端发送的IP地址（如果有的话）
-                client_sent_ip = req.get("client_ip", "未知")
-                if client_sent_ip != "未知":
-                    client_ip = client_sent_ip
-
-                # 记录用户ID与连接的关联
-                if req.get("type") == "login" and req.get("user_id"):
-                    current_user_id = req.get("user_id")
-                    self.client_user_map[conn] = current_user_id
-                    # 将连接添加到连接管理器
-                    connection_manager.add_connection(current_user_id, conn)
-                elif req.get("type") == "login" and req.get("username"):
-                    # 从登录请求中获取用户信息
-                    user = db.check_login(req.get("username"), req.get("password"))
-                    if user:
-                        current_user_id = user.get("UserID")
-                        self.client_user_map[conn] = current_user_id
-                        # 将连接添加到连接管理器
-                        connection_manager.add_connection(current_user_id, conn)
-
-                # 添加详细的日志信息
-                timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                req_type = req.get("type", "unknown")
-                user_info = f"UID:{req.get('user_id', 'N/A')}" if req.get("user_id") else "未登录用户"
-                print(f"[{timestamp}] [客户端 {client_ip}] [请求: {req_type}] [用户: {user_info}] 收到请求: {req}")
-
-                handler = ROUTER.get(req.get("type"))
-                if not handler:
-                    resp = {"success": False, "message": "未知请求类型"}
-                else:
-                    resp = handler(req)
+    body = json.dumps(msg, ensure_ascii=False, separators=(',', ':'), default=_default).encode('utf-8')
+    return struct.pack('>I', len(body)) + body
 
-                # 关键：把请求自带的 type & seq 原造带回
-                resp["type"] = req.get("type")
-                resp["seq"] = req.get("seq")
-                conn.sendall(self._pack(resp))
 
-                # 添加响应日志
-                success_status = "成功" if resp.get("success", False) else "失败"
-                message = resp.get("message", "")
-                print(f"[{timestamp}] [客户端 {client_ip}] [请求: {req_type}] [状态: {success_status}] 响应: {message}")
-        except (ConnectionResetError, BrokenPipeError):
-            # 记录客户端断开连接
-            timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            # 检查是否知道是哪个用户断开连接
-            user_id = self.client_user_map.get(conn)
-            if user_id:
-                # 标记用户为离线
-                db.user_offline(user_id)
-                # 从连接管理器中移除连接
-                connection_manager.remove_connection(user_id)
-                # 获取用户名
-                user = db.get_user_by_id(user_id)
-                username = user.get('Username', '未知用户') if user else '未知用户'
-                print(f"[{timestamp}] [客户端 {client_ip}] 用户 {username} (ID: {user_id}) 断开连接")
-
-                # 打印当前在线用户
-                online_users = db.get_online_users()
-                print(f"[S] 当前在线用户: {online_users}")
+# 出站发送指标（仅在事件循环线程中修改）
+OUTBOUND_STATS = {"sent": 0, "dropped": 0, "stalled": 0, "latency_total": 0.0, "latency_max": 0.0}
+_sessions = weakref.WeakSet()
+
+
+class ClientSession:
+    """
+    一条客户端长连接，由 asyncio 事件循环驱动
+    所有出站帧（响应与推送）进入同一个有界队列，由唯一的写协程按帧顺序写出，
+    保证帧不交错；慢速客户端只会积压自己的队列，不会阻塞发送方的请求
+    """
+
+    def __init__(self, reader, writer, loop):
+        self.reader = reader
+        self.writer = writer
+        self.loop = loop
+        peer = writer.get_extra_info('peername')
+        self.client_ip = peer[0] if peer else "未知"
+        self.user_id = None  # 当前连接登录的用户ID
+        self.closed = False
+        self.streaming = False  # 是否有进行中的流式响应
+        self.outbox = collections.deque()  # (帧, 入队时间)
+        self._inflight = 0  # 写协程已取出、尚未 drain 完成的帧数
+        self.max_depth = 0
+        self._wakeup = asyncio.Event()
+        self._drained = asyncio.Event()
+        self._writer_task = loop.create_task(self._writer_loop())
+        _sessions.add(self)
+
+    def _enqueue(self, frame, is_push):
+        """在事件循环线程中入队；推送在队列满时按策略丢弃或断开"""
+        if self.closed:
+            return False
+        if is_push and len(self.outbox) >= SERVER_CONFIG['outbound_high_water']:
+            if SERVER_CONFIG['outbound_policy'] == 'disconnect':
+                print(f"[W] 客户端 {self.client_ip} 出站队列已满，断开连接")
+                self.abort()
             else:
-                print(f"[{timestamp}] [客户端 {client_ip}] 未知用户断开连接")
+                OUTBOUND_STATS["dropped"] += 1
+                print(f"[W] 客户端 {self.client_ip} 出站队列已满，丢弃一条推送")
+            return False
+        self.outbox.append((frame, time.monotonic()))
+        self.max_depth = max(self.max_depth, len(self.outbox))
+        self._wakeup.set()
+        return True
+
+    async def send(self, frame):
+        """写回响应：队列达到高水位时等待写协程腾出空间，背压传导到请求读取"""
+        while len(self.outbox) >= SERVER_CONFIG['outbound_high_water'] and not self.closed:
+            self._drained.clear()
+            await self._drained.wait()
+        self._enqueue(frame, False)
+
+    async def send_when_drained(self, frame, low_water):
+        """等待未写出的帧（队列中与正在写出的）降到 low_water 以下再入队，用于流式响应"""
+        while len(self.outbox) + self._inflight > low_water and not self.closed:
+            self._drained.clear()
+            await self._drained.wait()
+        return self._enqueue(frame, False)
+
+    def send_blocking(self, frame, low_water):
+        """供执行器线程调用：等待积压降到 low_water 后入队，连接已关闭时返回 False"""
+        if self.closed:
+            return False
+        return asyncio.run_coroutine_threadsafe(self.send_when_drained(frame, low_water), self.loop).result()
+
+    def sendall(self, data: bytes):
+        """线程安全地推送一帧（实时消息、在线状态等），入队操作交给事件循环执行"""
+        if self.closed or self.writer.is_closing():
+            raise ConnectionResetError
+        self.loop.call_soon_threadsafe(self._enqueue, data, True)
+
+    async def _writer_loop(self):
+        try:
+            while True:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                if not self.outbox:
+                    if self.closed:
+                        break
+                    continue
+                batch = list(self.outbox)
+                self.outbox.clear()
+                self._inflight = len(batch)
+                for frame, _ in batch:
+                    self.writer.write(frame)
+                await asyncio.wait_for(self.writer.drain(), SERVER_CONFIG['outbound_stall_timeout'])
+                now = time.monotonic()
+                for _, queued_at in batch:
+                    latency = now - queued_at
+                    OUTBOUND_STATS["latency_total"] += latency
+                    OUTBOUND_STATS["latency_max"] = max(OUTBOUND_STATS["latency_max"], latency)
+                OUTBOUND_STATS["sent"] += len(batch)
+                self._inflight = 0
+                self._drained.set()
+        except asyncio.TimeoutError:
+            OUTBOUND_STATS["stalled"] += 1
+            print(f"[W] 客户端 {self.client_ip} 超过 {SERVER_CONFIG['outbound_stall_timeout']} 秒未读取数据，断开连接")
+            self.abort()
+        except (ConnectionResetError, BrokenPipeError):
+            self.closed = True
+        finally:
+            self._drained.set()
+
+    def abort(self):
+        """立即断开连接并丢弃未发送的数据，读循环随之结束并完成清理"""
+        self.closed = True
+        self.outbox.clear()
+        self._wakeup.set()
+        self._drained.set()
+        self.writer.transport.abort()
+
+    async def aclose(self):
+        """写完队列中剩余的帧后关闭连接"""
+        self.closed = True
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(self._writer_task, SERVER_CONFIG['outbound_stall_timeout'])
+        except Exception:
             pass
+        self.writer.close()
+
+
+def outbound_stats():
+    """所有连接的出站队列指标"""
+    sessions = list(_sessions)
+    stats = dict(OUTBOUND_STATS)
+    stats["sessions"] = len(sessions)
+    stats["queued"] = sum(len(s.outbox) for s in sessions)
+    stats["max_depth"] = max((s.max_depth for s in sessions), default=0)
+    stats["latency_avg_ms"] = round(stats["latency_total"] / stats["sent"] * 1000, 2) if stats["sent"] else 0.0
+    stats["latency_max_ms"] = round(stats.pop("latency_max") * 1000, 2)
+    stats.pop("latency_total")
+    return stats
+
+
+async def _read_frame(reader):
+    len_bs = await reader.readexactly(4)
+    body_len = struct.unpack('>I', len_bs)[0]
+    if body_len > SERVER_CONFIG['max_frame']:
+        raise ValueError(f"请求帧过大: {body_len} 字节")
+    body = await reader.readexactly(body_len)
+    return json.loads(body.decode('utf-8'))
+
+
+def _bind_session(session, user_id):
+    """把连接关联到用户；同一连接换号登录时先从原用户的会话中移除"""
+    if session.user_id and int(session.user_id) != int(user_id):
+        if not connection_manager.remove_connection(session.user_id, session):
+            _set_presence(session.user_id, False)
+    session.user_id = user_id
+    # 将连接添加到连接管理器
+    connection_manager.add_connection(user_id, session)
+
+
+def _process_request(session, req):
+    """在执行器线程中处理一次请求（可阻塞：数据库、RCON、等待 bcrypt 进程池等）"""
+    # 获取客户端发送的IP地址（如果有的话）
+    client_sent_ip = req.get("client_ip", "未知")
+    if client_sent_ip != "未知":
+        session.client_ip = client_sent_ip
+    client_ip = session.client_ip
+
+    # 主动下线：先解除本连接与用户的关联，其余会话不受影响
+    if req.get("type") == "user_offline" and session.user_id:
+        connection_manager.remove_connection(session.user_id, session)
+        session.user_id = None
+
+    # 记录用户ID与连接的关联
+    if req.get("type") == "login" and req.get("user_id"):
+        _bind_session(session, req.get("user_id"))
+
+    # 添加详细的日志信息
+    timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    req_type = req.get("type", "unknown")
+    user_info = f"UID:{req.get('user_id', 'N/A')}" if req.get("user_id") else "未登录用户"
+    print(f"[{timestamp}] [客户端 {client_ip}] [请求: {req_type}] [用户: {user_info}] 收到请求: {req}")
+
+    handler = ROUTER.get(req.get("type"))
+    if req.get("stream") and req_type in STREAM_ROUTES:
+        resp = STREAM_ROUTES[req_type](session, req)
+    elif not handler:
+        resp = {"success": False, "message": "未知请求类型"}
+    else:
+        try:
+            resp = handler(req)
+        except ServerBusyError as e:
+            resp = {"success": False, "message": str(e), "busy": True}
+
+    # 用户名登录成功后，直接用登录结果中的 UserID 关联连接，无需再次校验密码
+    if req_type == "login" and req.get("username") and resp.get("success"):
+        _bind_session(session, resp["user"]["UserID"])
+
+    # 关键：把请求自带的 type & seq 原造带回
+    resp["type"] = req.get("type")
+    resp["seq"] = req.get("seq")
+
+    # 添加响应日志
+    success_status = "成功" if resp.get("success", False) else "失败"
+    message = resp.get("message", "")
+    print(f"[{timestamp}] [客户端 {client_ip}] [请求: {req_type}] [状态: {success_status}] 响应: {message}")
+    return resp
+
+
+def _on_disconnect(session):
+    """连接断开后的清理：标记离线并移除连接"""
+    timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    user_id = session.user_id
+    if not user_id:
+        print(f"[{timestamp}] [客户端 {session.client_ip}] 未知用户断开连接")
+        return
+    session.user_id = None
+    # 从连接管理器中移除本连接；最后一个会话关闭时才标记离线（在执行器线程中，直接推送状态变化）
+    remaining = connection_manager.remove_connection(user_id, session)
+    if not remaining and db.user_offline(user_id):
+        publish_presence(user_id)
+    # 获取用户名
+    user = db.get_user_by_id(user_id)
+    username = user.get('Username', '未知用户') if user else '未知用户'
+    print(f"[{timestamp}] [客户端 {session.client_ip}] 用户 {username} (ID: {user_id}) 断开连接")
+
+    # 打印当前在线用户
+    online_users = db.get_online_users()
+    print(f"[S] 当前在线用户: {online_users}")
+
+
+def _executor_for(req_type):
+    return rcon_executor if req_type in RCON_ROUTES else db_executor
+
+
+async def _run_request(session, req, inflight):
+    """处理单个请求并在完成后立即写回响应（同一连接的请求可乱序完成，客户端按 seq 匹配）"""
+    loop = asyncio.get_running_loop()
+    try:
+        try:
+            resp = await loop.run_in_executor(_executor_for(req.get("type")), _process_request, session, req)
         except Exception as e:
             traceback.print_exc()
-        finally:
-            # 清理连接相关的资源
-            if conn in self.client_user_map:
-                # 确保在finally块中也处理用户离线逻辑
-                user_id = self.client_user_map.get(conn)
-                if user_id:
-                    db.user_offline(user_id)
-                    # 从连接管理器中移除连接
-                    connection_manager.remove_connection(user_id)
-                    # 获取用户名
-                    user = db.get_user_by_id(user_id)
-                    username = user.get('Username', '未知用户') if user else '未知用户'
-                    timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                    print(f"[{timestamp}] [客户端 {client_ip}] 用户 {username} (ID: {user_id}) 断开连接")
-
-                    # 打印当前在线用户
-                    online_users = db.get_online_users()
-                    print(f"[S] 当前在线用户: {online_users}")
-                del self.client_user_map[conn]
+            resp = {"success": False, "message": f"服务器内部错误: {e}",
+                    "type": req.get("type"), "seq": req.get("seq")}
+        await session.send(_pack(resp))
+    finally:
+        inflight.release()
+
+
+async def _handle_client(reader, writer):
+    """单个客户端连接的协程：持续读取请求并并发处理，单连接并发数受 max_inflight_per_conn 限制"""
+    loop = asyncio.get_running_loop()
+    session = ClientSession(reader, writer, loop)
+    inflight = asyncio.Semaphore(SERVER_CONFIG['max_inflight_per_conn'])
+    tasks = set()
+    try:
+        while True:
+            req = await _read_frame(reader)
+            # 达到并发上限时在此等待，不再读取新请求，形成背压
+            await inflight.acquire()
+            task = asyncio.create_task(_run_request(session, req, inflight))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+    except (asyncio.IncompleteReadError, ConnectionResetError, BrokenPipeError):
+        pass  # 客户端断开连接
+    except Exception:
+        traceback.print_exc()
+    finally:
+        # 等待已受理的请求执行完毕，再做离线清理
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        await loop.run_in_executor(db_executor, _on_disconnect, session)
+        await session.aclose()
+
+
+async def serve(host, port):
+    server = await asyncio.start_server(_handle_client, host, port, backlog=SERVER_CONFIG['backlog'])
+    print(f"[+] Desktop-Server 启动 @ {host}:{port}")
+    async with server:
+        await server.serve_forever()
 
 
 # --------------------------------------------------
 # 启动入口
 # --------------------------------------------------
 if __name__ == "__main__":
-    HOST, PORT = "0.0.0.0", 8000
-    server = socketserver.ThreadingTCPServer((HOST, PORT), TCPHandler)
-    print(f"[+] Desktop-Server 启动 @ {HOST}:{PORT}")
+    HOST, PORT = SERVER_CONFIG['host'], SERVER_CONFIG['port']
+
+    # 先于其他线程创建 bcrypt 进程池
+    db.hasher.start()
+
+    # 启动时应用尚未执行的数据库迁移（索引等）
+    try:
+        db.migrate()
+    except Exception as e:
+        print(f"[!] 数据库迁移失败: {e}")
+
+    # 一次性导入旧版白名单申请文件（表为空时）
+    try:
+        imported = db.import_whitelist_files()
+        if imported:
+            print(f"[S] 已导入白名单申请文件 {imported} 条")
+    except Exception as e:
+        print(f"[!] 导入白名单申请文件失败: {e}")
 
-    # 启动时立即获取一次服务器在线情况
+    # 由赠与流水重建今日赠与计数
+    try:
+        db.load_gift_counters()
+    except Exception as e:
+        print(f"[!] 载入今日赠与计数失败: {e}")
+
+    # 由签到日志重建今日已签到集合
+    try:
+        print(f"[S] 已载入今日签到 {db.sign_log.load()} 人")
+    except Exception as e:
+        print(f"[!] 载入今日签到记录失败: {e}")
+
+    # 启动时立即获取一次服务器在线情况，之后由后台线程定时刷新
     print("[+] 正在初始化服务器状态...")
     try:
-        if check_mc_server_online():
+        online = server_status.refresh()["online"]
+        server_status.start()
+        if online:
             print("[+] Minecraft服务器在线")
             # 启动游戏内在线状态监控
             game_online_manager.start_monitoring()
@@ -1255,4 +1768,7 @@ if __name__ == "__main__":
     except Exception as e:
         print(f"[!] 初始化服务器状态时出错: {e}")
 
-    server.serve_forever()
+    try:
+        asyncio.run(serve(HOST, PORT))
+    finally:
+        db.sign_log.close()
@@ -232,6 +232,16 @@ class TestProtocol:
         assert resp.get("success") is True, f"获取资料失败: {resp.get('message')}"
         assert "user" in resp, "响应中应包含用户信息"
 
+    def test_get_user_profile_fields(self, test_client, authenticated_user):
+        """测试：联表查询返回的资料包含角色、白名单、QQ字段"""
+        resp = test_client.send_request("get_user_profile", {
+            "user_id": authenticated_user["user_id"],
+            "target_id": authenticated_user["user_id"]
+        })
+        assert resp.get("success") is True, f"获取资料失败: {resp.get('message')}"
+        for key in ("RoleID", "WhiteState", "QQID", "Nickname", "Bio"):
+            assert key in resp["user"], f"资料缺少字段 {key}"
+
     def test_sign_in(self, test_client, authenticated_user):
         """测试：签到功能"""
         resp = test_client.send_request("sign", {
@@ -263,6 +273,75 @@ class TestProtocol:
         })
         assert resp.get("success") is True, f"发送消息失败: {resp.get('message')}"
 
+    def test_get_messages_paged(self, test_client, authenticated_user):
+        """测试：消息游标分页"""
+        uid = authenticated_user["user_id"]
+        for i in range(3):
+            test_client.send_request("send_message", {"sender_id": uid, "receiver_id": uid, "content": f"分页测试 {i}"})
+
+        first = test_client.send_request("get_messages", {"user_id": uid, "contact_id": uid, "limit": 2})
+        assert first.get("success") is True, f"获取消息失败: {first.get('message')}"
+        assert len(first["messages"]) == 2, "应只返回 limit 条消息"
+        assert first["has_more"] is True and first["before_message_id"], "应返回继续翻页的游标"
+
+        ids = [m["MessageID"] for m in first["messages"]]
+        assert ids == sorted(ids), "消息应按时间正序排列"
+
+        older = test_client.send_request("get_messages", {"user_id": uid, "contact_id": uid, "limit": 2,
+                                                          "before_message_id": first["before_message_id"]})
+        assert older.get("success") is True
+        assert all(m["MessageID"] < min(ids) for m in older["messages"]), "上一页消息应早于当前页"
+
+    def test_sync_messages(self, test_client, authenticated_user):
+        """测试：增量同步返回高水位之后的新消息（可能附带高水位之下的重读窗口）"""
+        uid = authenticated_user["user_id"]
+        base = test_client.send_request("sync_messages", {"user_id": uid, "since_message_id": None})
+        assert base.get("success") is True, f"同步失败: {base.get('message')}"
+        assert base["messages"] == [], "建立同步起点时不应返回消息"
+
+        sent = test_client.send_request("send_message", {"sender_id": uid, "receiver_id": uid, "content": "同步测试"})
+        delta = test_client.send_request("sync_messages", {"user_id": uid,
+                                                           "since_message_id": base["last_message_id"]})
+        assert delta.get("success") is True
+        ids = [m["MessageID"] for m in delta["messages"]]
+        assert sent["MessageID"] in ids, "应返回新发送的消息"
+        assert ids == sorted(set(ids)), "同步结果应按 MessageID 正序且不重复"
+        assert delta["last_message_id"] >= max(ids[-1], base["last_message_id"]), "高水位不应后退"
+        assert "unread_count" in delta and "unread_details" in delta
+
+    def test_multi_session_login(self, server_config, test_client, authenticated_user):
+        """测试：同一用户可多端同时登录，实时消息推送到每个会话"""
+        uid = authenticated_user["user_id"]
+        sessions = [ServerClient(server_config["host"], server_config["port"]) for _ in range(2)]
+        try:
+            for client in sessions:
+                client.connect()
+                resp = client.send_request_raw("login", {"username": TEST_USERNAME, "password": TEST_PASSWORD})
+                assert resp.get("success") is True, f"多端登录失败: {resp.get('message')}"
+
+            test_client.send_request("send_message", {"sender_id": uid, "receiver_id": uid, "content": "多端推送测试"})
+            for client in sessions:
+                body_len = struct.unpack('>I', client._recv_exact(4))[0]
+                push = json.loads(client._recv_exact(body_len).decode('utf-8'))
+                assert push.get("type") == "real_time_message", "每个会话都应收到实时消息"
+                assert push["message"]["content"] == "多端推送测试"
+        finally:
+            for client in sessions:
+                client.disconnect()
+
+    def test_stream_all_users_requires_admin(self, server_config, authenticated_user):
+        """测试：流式获取所有用户仅限管理员，普通用户直接收到带结束标记的失败响应"""
+        client = ServerClient(server_config["host"], server_config["port"])
+        client.connect()
+        try:
+            resp = client.send_request_raw("get_all_users", {"stream": True,
+                                                             "user_id": authenticated_user["user_id"]})
+            assert resp.get("seq") == client.seq
+            assert resp.get("success") is False and resp.get("done") is True, "普通用户不应能流式导出用户"
+            assert "权限不足" in resp.get("message", "")
+        finally:
+            client.disconnect()
+
     def test_get_unread_messages(self, test_client, authenticated_user):
         """测试：获取未读消息"""
         resp = test_client.send_request("get_unread_messages", {
@@ -365,6 +444,12 @@ class TestUnit:
         })
         assert resp.get("success") is False, "不存在的用户应该返回失败"
 
+    def test_profile_invalid_user_id(self, test_client):
+        """测试：非数字的 user_id 按用户不存在处理"""
+        resp = test_client.send_request("profile", {"user_id": "abc"})
+        assert resp.get("success") is False
+        assert resp.get("message") == "用户不存在"
+
     def test_insufficient_permission(self, test_client, authenticated_user):
         """测试：普通用户不能修改权限"""
         resp = test_client.send_request("update_role", {
@@ -395,6 +480,37 @@ class TestUnit:
         assert resp.get("success") is False, "重复申请应该失败"
         assert "未审核" in resp.get("message", ""), "错误消息应提示未审核状态"
 
+    def test_user_whitelist_applications(self, test_client, authenticated_user):
+        """测试：用户申请记录来自申请表，待审核申请带有申请ID"""
+        uid = authenticated_user["user_id"]
+        test_client.send_request("whitelist_apply", {
+            "user_id": uid,
+            "playername": TEST_PLAYERNAME,
+            "genuine": 1,
+            "reason": "test reason"
+        })
+
+        resp = test_client.send_request("get_user_whitelist_applications", {"user_id": uid})
+        assert resp.get("success") is True, f"获取申请记录失败: {resp.get('message')}"
+        pending = [app for app in resp["applications"] if app["status"] == "待审核"]
+        assert len(pending) <= 1, "同一用户最多只有一条待审核申请"
+        for app in resp["applications"]:
+            for key in ("id", "date", "playername", "status", "content"):
+                assert key in app, f"申请记录缺少字段 {key}"
+
+    def test_process_whitelist_requires_admin(self, test_client, authenticated_user):
+        """测试：普通用户不能审核白名单申请（包括自己的申请）"""
+        uid = authenticated_user["user_id"]
+        apps = test_client.send_request("get_user_whitelist_applications", {"user_id": uid})
+        pending = [app for app in apps.get("applications", []) if app["status"] == "待审核"]
+        resp = test_client.send_request("process_whitelist_application", {
+            "user_id": uid,
+            "id": pending[0]["id"] if pending else 1,
+            "approved": True
+        })
+        assert resp.get("success") is False, "普通用户不应该能审核白名单"
+        assert "权限不足" in resp.get("message", "")
+
     def test_add_self_as_contact(self, test_client, authenticated_user):
         """测试：不能添加自己为联系人"""
         resp = test_client.send_request("add_contact", {
@@ -403,6 +519,50 @@ class TestUnit:
         })
         assert resp.get("success") is False, "不能添加自己为联系人"
 
+    def test_geoip_offline_resolver(self, tmp_path):
+        """测试：离线网段文件解析与网段缓存（不依赖服务器与网络）"""
+        from geoip import GeoLocator, OfflineResolver, LOCAL_ADDRESS, UNKNOWN_ADDRESS
+        range_file = tmp_path / "ip_ranges.txt"
+        range_file.write_text("# 测试网段\n1.0.1.0/24 福建省 福州市\n8.8.0.0/16 美国\n", encoding="utf-8")
+
+        locator = GeoLocator([OfflineResolver(str(range_file))])
+        assert locator.cached("1.0.1.9") is None, "未解析前不应有缓存"
+        assert locator.resolve("1.0.1.9") == "福建省 福州市"
+        assert locator.cached("1.0.1.200") == "福建省 福州市", "同一 /24 网段应命中缓存"
+        assert locator.resolve("8.8.8.8") == "美国"
+        assert locator.resolve("9.9.9.9") == UNKNOWN_ADDRESS
+        assert locator.resolve("127.0.0.1") == LOCAL_ADDRESS
+        assert locator.resolve("not an ip") == UNKNOWN_ADDRESS
+
+
+    def test_sign_log_day_rollover(self, tmp_path, monkeypatch):
+        """测试：签到日志跨日时旧日志先落盘，新日志的记录按各自的序号落盘（不依赖服务器）"""
+        import datetime
+        from tools import SignLog
+        synced = []  # 每次 fsync 的文件 inode
+        real_fsync = os.fsync
+        monkeypatch.setattr(os, "fsync", lambda fd: (synced.append(os.fstat(fd).st_ino), real_fsync(fd)))
+        log = SignLog(log_dir=str(tmp_path))
+        day1, day2 = datetime.date(2026, 1, 1), datetime.date(2026, 1, 2)
+
+        assert log.try_mark(1, day1) and log.try_mark(2, day1)
+        # 模拟前一天的签到在写入后、fsync 前遇到跨日
+        with log._lock:
+            seq, old_file = log._append("3")
+        assert log.try_mark(1, day2), "新的一天应能再次签到"
+        log._sync(seq, old_file)  # 旧日志已在跨日时落盘并关闭，不应影响新日志的序号
+        assert log._synced == 1 and log._written == 1, "序号应按日志文件计"
+        assert log.try_mark(2, day2) and log._synced == 2
+        log.close()
+
+        day1_file, day2_file = tmp_path / "2026-01-01.txt", tmp_path / "2026-01-02.txt"
+        assert day1_file.read_text(encoding="utf-8").split() == ["1", "2", "3"]
+        assert day2_file.read_text(encoding="utf-8").split() == ["1", "2"]
+        day1_ino, day2_ino = day1_file.stat().st_ino, day2_file.stat().st_ino
+        # 旧日志最后一次落盘（跨日）早于新日志的第一次落盘；关闭时落盘当前日志
+        assert max(i for i, ino in enumerate(synced) if ino == day1_ino) < synced.index(day2_ino), "跨日时应先落盘旧日志"
+        assert synced[-1] == day2_ino, "关闭时应落盘当前日志"
+        assert SignLog(log_dir=str(tmp_path)).load(day1) == 3
 
 # ==================== 压力测试 ====================
 class TestStress:
@@ -1,10 +1,18 @@
 import sys
+import os
 import mysql.connector
 import bcrypt
 import datetime
 import uuid as _uuid
 from mcrcon import MCRcon
 import re  # 添加正则表达式模块用于格式验证
+import time
+import threading
+import contextlib
+import select
+import socket
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 
 # ----------------------- 基础配置 -----------------------
 DB_CONFIG = {
@@ -14,10 +22,71 @@ DB_CONFIG = {
     'database': 'User_All'
 }
 
+# 连接池配置
+POOL_CONFIG = {
+    'size': 10,             # 池内最多同时存在的 MySQL 连接数
+    'wait_timeout': 5,      # 池满时借用连接的最长等待时间（秒）
+    'max_lifetime': 1800,   # 单个连接的最长存活时间（秒），超过后关闭重建
+    'max_idle': 300,        # 连接的最长空闲时间（秒），超过后关闭
+    'validate_after': 1,    # 空闲超过该秒数的连接在借出前先 ping 一次
+}
+
+# 资料缓存配置
+CACHE_CONFIG = {
+    'profile_maxsize': 4096,  # 最多缓存的 (UserID, 字段) 条目数
+    'profile_ttl': 300,       # 缓存条目有效期（秒）
+}
+
+# 每日赠与上限
+GIFT_CONFIG = {
+    'coin_limit': 5,  # 每人每天最多赠出的金币数
+    'star_limit': 1,  # 每人每天最多赠出的星星数
+    'amount': 1,      # 单次赠与数量
+    'legacy_dir': 'gift_records',  # 迁移前的赠与记录 {date}.json，仅在启动时用于补齐当天计数
+}
+
+# 签到记录：每天一个追加日志 签到日志/{date}.txt，每行一个 UserID，"-UserID" 表示撤销
+SIGN_CONFIG = {
+    'log_dir': '签到日志',
+}
+
+# 白名单申请
+WHITELIST_CONFIG = {
+    'daily_limit': 3,           # 每人每天最多提交的申请数
+    'legacy_dir': '白名单相关',  # 旧版申请文件目录，表为空时启动一次性导入
+    'page_size': 20,            # 审批队列默认每页条数
+    'max_page_size': 100,       # 审批队列每页条数上限
+    'bulk_max': 50,             # 批量审批单次最多处理的申请数
+}
+
+# 管理员用户列表（按 UserID 键集分页）
+USER_LIST_CONFIG = {
+    'page_size': 10,       # 默认每页条数
+    'max_page_size': 100,  # 每页条数上限
+    'count_ttl': 30,       # 各筛选条件下用户总数的缓存时间（秒），总数为近似值
+}
+
+# WhitelistApplications.Status 取值
+WHITELIST_PENDING, WHITELIST_APPROVED, WHITELIST_REJECTED = 0, 1, 2
+WHITELIST_STATUS = {WHITELIST_PENDING: "待审核", WHITELIST_APPROVED: "已通过", WHITELIST_REJECTED: "未通过"}
+
+# 密码哈希配置：bcrypt 在独立进程池中执行，避免占用请求线程与 GIL
+PASSWORD_CONFIG = {
+    'rounds': 12,                   # bcrypt 代价因子；修改后旧哈希会在用户下次登录时自动重算
+    'workers': os.cpu_count() or 2, # 进程数，默认与 CPU 核数一致
+    'max_queue': 64,                # 排队+执行中的任务上限，超过后直接返回"服务器繁忙"
+}
+
+# 数据库迁移脚本目录，文件名形如 001_xxx.sql
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Database', 'migrations')
+
 RCON_CONFIG = {
     'host': '127.0.0.1',
     'port': 25575,
-    'password': 'IloveCzy'
+    'password': 'IloveCzy',
+    'pool_size': 2,         # 长连接会话数
+    'timeout': 5,           # 单条命令的收发超时（秒），同时也是池满时的等待时间
+    'validate_after': 30,   # 空闲超过该秒数的会话借出前先检查套接字是否已被对端关闭
 }
 
 
@@ -26,18 +95,32 @@ def _get_now():
     return datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
 
-def _hash_pwd(plain):
-    return bcrypt.hashpw(plain.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+def _to_uid(uid):
+    """将请求中的用户 ID 转为整数，非法值返回 None"""
+    try:
+        return int(uid)
+    except (TypeError, ValueError):
+        return None
+
+
+def _hash_pwd(plain, rounds=PASSWORD_CONFIG['rounds']):
+    return bcrypt.hashpw(plain.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
 
 
 def _check_pwd(plain, hashed):
     return bcrypt.checkpw(plain.encode('utf-8'), hashed.encode('utf-8'))
 
 
-def _rcon(cmd: str) -> str:
-    """执行单条 RCON 命令并返回结果"""
-    with MCRcon(RCON_CONFIG['host'], RCON_CONFIG['password'], RCON_CONFIG['port']) as r:
-        return r.command(cmd)
+def _bcrypt_rounds(hashed):
+    """从 $2b$12$... 形式的哈希中解析代价因子，解析失败返回 None"""
+    parts = hashed.split('$') if hashed else []
+    if len(parts) >= 4 and parts[2].isdigit():
+        return int(parts[2])
+    return None
+
+
+def _noop():
+    return True
 
 
 # 添加邮箱格式验证函数
@@ -53,20 +136,847 @@ def _validate_phone(phone):
     return re.match(pattern, phone) is not None
 
 
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+def _list_migrations(migrations_dir):
+    """按版本号返回迁移脚本 [(版本号, 名称, 路径)]"""
+    migrations = []
+    if not os.path.isdir(migrations_dir):
+        return migrations
+    for filename in os.listdir(migrations_dir):
+        match = re.match(r'^(\d+)_(.+)\.sql$', filename)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(migrations_dir, filename)))
+    migrations.sort()
+    return migrations
+
+
+def _split_sql(script):
+    """去掉 -- 注释后按分号拆分 SQL 脚本"""
+    lines = [line for line in script.splitlines() if not line.strip().startswith('--')]
+    return [stmt.strip() for stmt in '\n'.join(lines).split(';') if stmt.strip()]
+
+
+# ----------------------- 缓存 -----------------------
+_MISSING = object()  # 缓存未命中标记（缓存值本身可能为 None）
+
+
+class TTLCache:
+    """线程安全的 LRU + TTL 缓存"""
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (过期时间, 值)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    def get(self, key):
+        """命中返回缓存值，未命中或已过期返回 _MISSING"""
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self._stats["misses"] += 1
+                return _MISSING
+            if item[0] <= now:
+                del self._data[key]
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return _MISSING
+            self._data.move_to_end(key)
+            self._stats["hits"] += 1
+            return item[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._data)
+        stats["maxsize"] = self.maxsize
+        stats["ttl"] = self.ttl
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+class ProfileCache:
+    """按 UserID 组织的资料读穿缓存，资料变更时调用 invalidate(uid) 失效"""
+
+    FIELDS = ('user', 'full', 'role', 'white', 'qq')
+
+    def __init__(self, maxsize=4096, ttl=300):
+        self._cache = TTLCache(maxsize, ttl)
+        # 全局清空次数 + 每个 UserID 的失效次数：加载期间发生过失效时，不再写回旧数据
+        self._epoch = 0
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def version(self, uid):
+        with self._lock:
+            return self._epoch, self._versions.get(int(uid), 0)
+
+    def lookup(self, uid, field):
+        value = self._cache.get((int(uid), field))
+        return dict(value) if isinstance(value, dict) else value
+
+    def store(self, uid, field, value, version):
+        uid = int(uid)
+        with self._lock:
+            if (self._epoch, self._versions.get(uid, 0)) != version:
+                return
+            self._cache.set((uid, field), dict(value) if isinstance(value, dict) else value)
+
+    def get_or_load(self, uid, field, loader, cache_none=True):
+        value = self.lookup(uid, field)
+        if value is not _MISSING:
+            return value
+        version = self.version(uid)
+        value = loader()
+        if value is not None or cache_none:
+            self.store(uid, field, value, version)
+        return value
+
+    def invalidate(self, uid):
+        uid = int(uid)
+        with self._lock:
+            self._versions[uid] = self._versions.get(uid, 0) + 1
+            for field in self.FIELDS:
+                self._cache.pop((uid, field))
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._cache.clear()
+
+    def stats(self):
+        return self._cache.stats()
+
+
+class PlayerNameIndex:
+    """
+    玩家名 → UserID 的内存索引（键为小写玩家名，与 MySQL 默认排序规则一样不区分大小写）
+    未注册的玩家名记为 None，避免每轮都查库；注册、白名单审核时通过 assign 维护
+    """
+
+    def __init__(self):
+        self._by_name = {}
+        self._by_uid = {}
+        self._epoch = 0  # assign/clear 次数：查库期间索引被修改时，不再写回查询结果
+        self._lock = threading.Lock()
+
+    def lookup(self, names):
+        """返回 ({玩家名: UserID 或 None}, 未命中的玩家名列表, 当前 epoch)"""
+        found, missing = {}, []
+        with self._lock:
+            for name in names:
+                key = name.lower()
+                if key in self._by_name:
+                    found[name] = self._by_name[key]
+                else:
+                    missing.append(name)
+            return found, missing, self._epoch
+
+    def store(self, mapping, epoch):
+        """写回查库结果 {玩家名: UserID 或 None}"""
+        with self._lock:
+            if epoch != self._epoch:
+                return
+            for name, uid in mapping.items():
+                self._by_name[name.lower()] = uid
+                if uid is not None:
+                    self._by_uid[uid] = name.lower()
+
+    def assign(self, uid, name):
+        """用户的玩家名变更（注册、白名单审核通过）"""
+        uid = int(uid)
+        with self._lock:
+            self._epoch += 1
+            old = self._by_uid.pop(uid, None)
+            if old is not None and self._by_name.get(old) == uid:
+                del self._by_name[old]
+            if name:
+                self._by_name[name.lower()] = uid
+                self._by_uid[uid] = name.lower()
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._by_name.clear()
+            self._by_uid.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"names": len(self._by_name), "users": len(self._by_uid)}
+
+
+class DailyCounter:
+    """
+    按 (UserID, 类型) 统计当天数量的内存计数器，日期变化时自动清零
+    try_acquire 原子地完成"检查上限 + 预占"，写库失败时用 release 退回
+    """
+
+    def __init__(self):
+        self._day = None
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def _roll(self, day):
+        if day != self._day:
+            self._day = day
+            self._counts = {}
+
+    def load(self, day, rows):
+        """用 [(UserID, 类型, 数量)] 重建某天的计数"""
+        with self._lock:
+            self._day = day
+            self._counts = {(int(uid), kind): int(n) for uid, kind, n in rows}
+
+    def get(self, uid, kind, day):
+        with self._lock:
+            self._roll(day)
+            return self._counts.get((int(uid), kind), 0)
+
+    def try_acquire(self, uid, kind, amount, limit, day):
+        with self._lock:
+            self._roll(day)
+            key = (int(uid), kind)
+            if self._counts.get(key, 0) + amount > limit:
+                return False
+            self._counts[key] = self._counts.get(key, 0) + amount
+            return True
+
+    def release(self, uid, kind, amount, day):
+        with self._lock:
+            if day != self._day:
+                return
+            key = (int(uid), kind)
+            self._counts[key] = max(0, self._counts.get(key, 0) - amount)
+
+    def stats(self):
+        with self._lock:
+            return {"day": self._day, "entries": len(self._counts)}
+
+
+class SignLog:
+    """
+    当天已签到用户集合（内存），由追加日志持久化，日期变化或启动时从日志重建
+    try_mark 原子地完成"检查 + 标记"；写入后按组提交 fsync：
+    同时等待落盘的多个签到只由其中一个线程执行一次 fsync。
+    记录序号按日志文件计，跨日时先 fsync 旧日志再关闭，并从 0 重新计数
+    """
+
+    def __init__(self, log_dir='签到日志'):
+        self.log_dir = log_dir
+        self._day = None
+        self._signed = set()
+        self._file = None
+        self._lock = threading.Lock()       # 保护集合与写入
+        self._sync_lock = threading.Lock()  # 同一时刻只有一个线程 fsync
+        self._written = 0                   # 当前日志已写入（未必落盘）的记录序号
+        self._synced = 0                    # 当前日志已 fsync 的记录序号
+        self._stats = {"marks": 0, "rejects": 0, "fsyncs": 0}
+
+    def _path(self, day):
+        return os.path.join(self.log_dir, f"{day.strftime('%Y-%m-%d')}.txt")
+
+    def _roll(self, day):
+        """切换到指定日期：关闭旧日志，读取当天日志重建集合"""
+        if day == self._day:
+            return
+        self._close_file()
+        signed = set()
+        path = self._path(day)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    # 崩溃时可能留下半行，忽略无法解析的行
+                    if line.startswith('-') and line[1:].isdigit():
+                        signed.discard(int(line[1:]))
+                    elif line.isdigit():
+                        signed.add(int(line))
+        self._day = day
+        self._signed = signed
+
+    def _close_file(self):
+        """落盘并关闭当前日志，序号清零（调用方持有 _lock）"""
+        if self._file:
+            try:
+                os.fsync(self._file.fileno())
+                self._stats["fsyncs"] += 1
+            except OSError as e:
+                print(f"[W] 签到日志落盘失败: {e}")
+            self._file.close()
+            self._file = None
+        self._written = self._synced = 0
+
+    def _append(self, line):
+        if self._file is None:
+            os.makedirs(self.log_dir, exist_ok=True)
+            self._file = open(self._path(self._day), 'a', encoding='utf-8')
+        self._file.write(line + "\n")
+        self._file.flush()
+        self._written += 1
+        return self._written, self._file
+
+    def _sync(self, seq, file):
+        with self._sync_lock:
+            with self._lock:
+                # 日志已在跨日/关闭时落盘，或已被其他线程的 fsync 覆盖
+                if file is not self._file or self._synced >= seq:
+                    return
+                target = self._written
+            try:
+                os.fsync(file.fileno())
+            except (OSError, ValueError):
+                return  # fsync 期间日志被跨日关闭，关闭前已落盘
+            with self._lock:
+                if file is self._file:
+                    self._synced = max(self._synced, target)
+                self._stats["fsyncs"] += 1
+
+    def load(self, day=None):
+        """启动时重建当天集合，返回已签到人数"""
+        with self._lock:
+            self._roll(day or datetime.date.today())
+            return len(self._signed)
+
+    def contains(self, uid, day=None):
+        with self._lock:
+            self._roll(day or datetime.date.today())
+            return int(uid) in self._signed
+
+    def try_mark(self, uid, day=None):
+        """未签到则标记并写入日志（返回前已落盘），已签到返回 False"""
+        uid = int(uid)
+        with self._lock:
+            self._roll(day or datetime.date.today())
+            if uid in self._signed:
+                self._stats["rejects"] += 1
+                return False
+            self._signed.add(uid)
+            seq, file = self._append(str(uid))
+            self._stats["marks"] += 1
+        self._sync(seq, file)
+        return True
+
+    def unmark(self, uid, day=None):
+        """发放奖励失败时撤销标记"""
+        uid = int(uid)
+        with self._lock:
+            if (day or datetime.date.today()) != self._day or uid not in self._signed:
+                return
+            self._signed.discard(uid)
+            seq, file = self._append(f"-{uid}")
+        self._sync(seq, file)
+
+    def close(self):
+        """落盘并关闭日志（服务退出时调用）"""
+        with self._lock:
+            self._close_file()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, day=str(self._day), signed=len(self._signed))
+
+
 # ----------------------- 连接池 -----------------------
+class _PooledConnection:
+    __slots__ = ('conn', 'created_at', 'last_used')
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = self.last_used = time.monotonic()
+
+
+class ConnectionPool:
+    """有界、线程安全的 MySQL 连接池（借出时健康检查，按存活/空闲时间淘汰）"""
+
+    def __init__(self, cfg, size=10, wait_timeout=5, max_lifetime=1800, max_idle=300, validate_after=1):
+        self.cfg = cfg
+        self.size = size
+        self.wait_timeout = wait_timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.validate_after = validate_after
+        self._idle = []  # 空闲连接栈，后进先出，让冷连接自然过期
+        self._total = 0  # 已创建且未关闭的连接数（含借出中）
+        self._cond = threading.Condition()
+        self._stats = {
+            "borrows": 0, "waits": 0, "timeouts": 0,
+            "wait_time_total": 0.0, "wait_time_max": 0.0,
+            "created": 0, "evicted": 0, "broken": 0,
+        }
+
+    def _is_stale(self, entry, now):
+        return (now - entry.created_at > self.max_lifetime
+                or now - entry.last_used > self.max_idle)
+
+    def _is_healthy(self, entry, now):
+        if now - entry.last_used < self.validate_after:
+            return True
+        try:
+            entry.conn.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def _record_borrow(self, start):
+        waited = time.monotonic() - start
+        with self._cond:
+            self._stats["borrows"] += 1
+            self._stats["wait_time_total"] += waited
+            if waited > self._stats["wait_time_max"]:
+                self._stats["wait_time_max"] = waited
+
+    def acquire(self):
+        """借出一个可用连接；池满时最多等待 wait_timeout 秒"""
+        start = time.monotonic()
+        deadline = start + self.wait_timeout
+        counted_wait = False
+        while True:
+            stale, entry, create = [], None, False
+            with self._cond:
+                now = time.monotonic()
+                while self._idle and entry is None:
+                    candidate = self._idle.pop()
+                    if self._is_stale(candidate, now):
+                        stale.append(candidate.conn)
+                        self._total -= 1
+                        self._stats["evicted"] += 1
+                    else:
+                        entry = candidate
+                if entry is None:
+                    if self._total < self.size:
+                        self._total += 1
+                        create = True
+                    else:
+                        remaining = deadline - now
+                        if remaining <= 0:
+                            self._stats["timeouts"] += 1
+                            raise mysql.connector.errors.PoolError(
+                                f"等待数据库连接超时（{self.wait_timeout}s，连接池大小 {self.size}）")
+                        if not counted_wait:
+                            self._stats["waits"] += 1
+                            counted_wait = True
+                        self._cond.wait(remaining)
+                if stale:
+                    self._cond.notify(len(stale))
+            for conn in stale:
+                _close_quietly(conn)
+
+            if create:
+                try:
+                    entry = _PooledConnection(mysql.connector.connect(**self.cfg))
+                except Exception:
+                    with self._cond:
+                        self._total -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._stats["created"] += 1
+                self._record_borrow(start)
+                return entry
+
+            if entry is not None:
+                if self._is_healthy(entry, time.monotonic()):
+                    self._record_borrow(start)
+                    return entry
+                # 失效连接直接丢弃，继续尝试下一个
+                _close_quietly(entry.conn)
+                with self._cond:
+                    self._total -= 1
+                    self._stats["broken"] += 1
+                    self._cond.notify()
+
+    def release(self, entry, discard=False):
+        """归还连接；出错的连接直接关闭，未结束的事务先回滚"""
+        if not discard:
+            try:
+                if entry.conn.in_transaction:
+                    entry.conn.rollback()
+            except Exception:
+                discard = True
+        now = time.monotonic()
+        if not discard and now - entry.created_at > self.max_lifetime:
+            discard = True
+        with self._cond:
+            if discard:
+                self._total -= 1
+                self._stats["evicted"] += 1
+            else:
+                entry.last_used = now
+                self._idle.append(entry)
+            self._cond.notify()
+        if discard:
+            _close_quietly(entry.conn)
+
+    def close_all(self):
+        """关闭所有空闲连接"""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._total -= len(idle)
+            self._cond.notify_all()
+        for entry in idle:
+            _close_quietly(entry.conn)
+
+    def stats(self):
+        """连接池指标快照"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats["size"] = self.size
+            stats["open"] = self._total
+            stats["idle"] = len(self._idle)
+            stats["in_use"] = self._total - len(self._idle)
+        stats["wait_time_avg"] = stats["wait_time_total"] / stats["borrows"] if stats["borrows"] else 0.0
+        return stats
+
+
+# ----------------------- RCON 会话池 -----------------------
+class _RconSession:
+    __slots__ = ('rcon', 'last_used')
+
+    def __init__(self, rcon):
+        self.rcon = rcon
+        self.last_used = time.monotonic()
+
+
+class RconPool:
+    """
+    长连接、已认证的 RCON 会话池
+    - 借出前检查空闲较久的会话是否已断开，断开则重连
+    - 复用的会话执行失败时重连并重试一次（超时不重试）
+    - batch() 在同一会话上连续发送多条命令
+    """
+
+    def __init__(self, host, password, port=25575, size=2, timeout=5, validate_after=30):
+        self.host = host
+        self.password = password
+        self.port = port
+        self.size = size
+        self.timeout = timeout
+        self.validate_after = validate_after
+        self._idle = []
+        self._total = 0
+        self._cond = threading.Condition()
+        self._stats = {"commands": 0, "connects": 0, "reconnects": 0, "errors": 0, "timeouts": 0}
+
+    def _connect(self):
+        rcon = MCRcon(self.host, self.password, self.port)
+        rcon.connect()
+        rcon.socket.settimeout(self.timeout)
+        with self._cond:
+            self._stats["connects"] += 1
+        return _RconSession(rcon)
+
+    @staticmethod
+    def _is_alive(session):
+        """对端关闭的套接字会变为可读且读到 0 字节"""
+        sock = session.rcon.socket
+        try:
+            readable, _, _ = select.select([sock], [], [], 0)
+            if not readable:
+                return True
+            return sock.recv(1, socket.MSG_PEEK) != b''
+        except (OSError, ValueError):
+            return False
+
+    def _acquire(self):
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while True:
+                if self._idle:
+                    session = self._idle.pop()
+                    break
+                if self._total < self.size:
+                    self._total += 1
+                    session = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise TimeoutError("等待 RCON 会话超时")
+                self._cond.wait(remaining)
+        if session is not None:
+            if time.monotonic() - session.last_used < self.validate_after or self._is_alive(session):
+                return session, True
+            _close_rcon(session)
+            with self._cond:
+                self._stats["reconnects"] += 1
+        try:
+            return self._connect(), False
+        except Exception:
+            self._discard()
+            raise
+
+    def _release(self, session):
+        session.last_used = time.monotonic()
+        with self._cond:
+            self._idle.append(session)
+            self._cond.notify()
+
+    def _discard(self, session=None):
+        if session is not None:
+            _close_rcon(session)
+        with self._cond:
+            self._total -= 1
+            self._cond.notify()
+
+    def batch(self, cmds):
+        """在同一会话上依次执行多条命令，返回结果列表"""
+        session, reused = self._acquire()
+        results = []
+        try:
+            while len(results) < len(cmds):
+                try:
+                    results.append(session.rcon.command(cmds[len(results)]))
+                except socket.timeout:
+                    raise
+                except Exception:
+                    # 复用的会话可能已被服务器断开：重连后从失败的命令继续，只重试一次
+                    if not reused:
+                        raise
+                    reused = False
+                    _close_rcon(session)
+                    with self._cond:
+                        self._stats["reconnects"] += 1
+                    session = self._connect()
+        except Exception:
+            with self._cond:
+                self._stats["errors"] += 1
+            self._discard(session)
+            raise
+        with self._cond:
+            self._stats["commands"] += len(cmds)
+        self._release(session)
+        return results
+
+    def command(self, cmd):
+        return self.batch([cmd])[0]
+
+    def close_all(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._total -= len(idle)
+            self._cond.notify_all()
+        for session in idle:
+            _close_rcon(session)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats["size"] = self.size
+            stats["open"] = self._total
+            stats["idle"] = len(self._idle)
+        return stats
+
+
+def _close_rcon(session):
+    try:
+        session.rcon.disconnect()
+    except Exception:
+        pass
+
+
+rcon_pool = RconPool(RCON_CONFIG['host'], RCON_CONFIG['password'], RCON_CONFIG['port'],
+                     RCON_CONFIG['pool_size'], RCON_CONFIG['timeout'], RCON_CONFIG['validate_after'])
+
+
+def _rcon(cmd: str) -> str:
+    """执行单条 RCON 命令并返回结果（复用会话池中的长连接）"""
+    return rcon_pool.command(cmd)
+
+
+def _rcon_batch(cmds):
+    """在同一个 RCON 会话上依次执行多条命令，返回结果列表"""
+    return rcon_pool.batch(cmds)
+
+
+def _parse_whitelist_file(path):
+    """解析旧版申请文件内容，返回 (Genuine, 申请理由)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    genuine = 1 if "游玩方式：正版" in content else 0
+    reason = content.split("申请介绍：", 1)[1].strip() if "申请介绍：" in content else ""
+    return genuine, reason
+
+
+class InsufficientBalanceError(Exception):
+    """条件扣减未命中（余额不足），用于回滚整笔转账"""
+
+
+class ServerBusyError(Exception):
+    """后台任务队列已满，请求被拒绝（由路由层转换为"服务器繁忙"响应）"""
+
+
+# ----------------------- 密码哈希进程池 -----------------------
+class PasswordHasher:
+    """
+    bcrypt 哈希/校验的进程池封装
+    排队中与执行中的任务总数超过 max_queue 时立即抛出 ServerBusyError，
+    防止登录/注册高峰时请求无限堆积
+    """
+
+    def __init__(self, rounds=12, workers=2, max_queue=64):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_queue)
+        self._stats = {"submitted": 0, "rejected": 0, "pending": 0, "rehashed": 0}
+
+    def start(self):
+        """提前创建进程池；应在启动其他线程之前调用，避免 fork 时复制加锁状态"""
+        self._submit(_noop).result()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    def _release_slot(self, _future):
+        with self._lock:
+            self._stats["pending"] -= 1
+        self._slots.release()
+
+    def _submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats["rejected"] += 1
+            raise ServerBusyError("服务器繁忙，请稍后重试")
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._stats["submitted"] += 1
+            self._stats["pending"] += 1
+        future.add_done_callback(self._release_slot)
+        return future
+
+    def hash(self, plain):
+        return self._submit(_hash_pwd, plain, self.rounds).result()
+
+    def check(self, plain, hashed):
+        return self._submit(_check_pwd, plain, hashed).result()
+
+    def needs_rehash(self, hashed):
+        return _bcrypt_rounds(hashed) != self.rounds
+
+    def rehash(self, plain):
+        """按当前代价因子重新计算哈希（登录时升级旧哈希）"""
+        hashed = self.hash(plain)
+        with self._lock:
+            self._stats["rehashed"] += 1
+        return hashed
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update(rounds=self.rounds, workers=self.workers, max_queue=self.max_queue)
+        return stats
+
+
 class DatabaseManager:
-    def __init__(self, cfg=None):
+    def __init__(self, cfg=None, pool_cfg=None):
         self.cfg = cfg or DB_CONFIG
-        # 添加在线用户列表
+        self.pool = ConnectionPool(self.cfg, **(pool_cfg or POOL_CONFIG))
+        # 当前线程在 transaction() 中固定使用的连接
+        self._local = threading.local()
+        # 资料读穿缓存（get_user_by_id / get_full_profile / 角色 / 白名单 / QQ）
+        self.profile_cache = ProfileCache(CACHE_CONFIG['profile_maxsize'], CACHE_CONFIG['profile_ttl'])
+        # bcrypt 进程池（首次使用时创建）
+        self.hasher = PasswordHasher(**PASSWORD_CONFIG)
+        # 添加在线用户列表（上下线在锁内比较并修改，多个执行器线程并发更新）
         self.online_users = set()
+        self._online_lock = threading.Lock()
+        # 玩家名 → UserID 索引（游戏在线状态按玩家名批量反查用户）
+        self.player_index = PlayerNameIndex()
+        # 当天每个用户各类礼物的已赠数量（启动时由 GiftRecords 重建）
+        self.gift_counter = DailyCounter()
+        # 管理员用户列表各筛选条件下的总数（短期缓存）
+        self.user_count_cache = TTLCache(256, USER_LIST_CONFIG['count_ttl'])
+        # 当天已签到用户（内存集合 + 追加日志）
+        self.sign_log = SignLog(**SIGN_CONFIG)
 
     # ---------- 内部 ----------
+    @contextlib.contextmanager
     def _conn(self):
-        return mysql.connector.connect(**self.cfg)
+        """从连接池借出连接，用完自动归还；处于事务中时复用事务连接"""
+        pinned = getattr(self._local, 'conn', None)
+        if pinned is not None:
+            yield pinned
+            return
+        entry = self.pool.acquire()
+        broken = False
+        try:
+            yield entry.conn
+        except (mysql.connector.errors.InterfaceError, mysql.connector.errors.OperationalError):
+            broken = True
+            raise
+        finally:
+            self.pool.release(entry, discard=broken)
+
+    def _in_transaction(self):
+        return getattr(self._local, 'conn', None) is not None
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """事务上下文：块内语句共用一个连接，正常结束时统一提交一次，出错时整体回滚
+
+        嵌套调用会并入最外层事务。
+        """
+        if self._in_transaction():
+            yield self._local.conn
+            return
+        with self._conn() as c:
+            self._local.conn = c
+            try:
+                yield c
+                c.commit()
+            except Exception:
+                try:
+                    c.rollback()
+                except Exception:
+                    pass  # 连接已失效，归还时会被连接池丢弃
+                raise
+            finally:
+                self._local.conn = None
 
     def _fetchone(self, sql, params=None):
         with self._conn() as c:
-            with c.cursor(dictionary=True) as cur:
+            # buffered：多行结果只取第一行时不会在复用的连接上留下未读结果
+            with c.cursor(dictionary=True, buffered=True) as cur:
                 cur.execute(sql, params or ())
                 return cur.fetchone()
 
@@ -80,9 +990,52 @@ class DatabaseManager:
         with self._conn() as c:
             with c.cursor() as cur:
                 cur.execute(sql, params or ())
-                c.commit()
+                if not self._in_transaction():
+                    c.commit()
                 return cur.lastrowid
 
+    def _execute_rowcount(self, sql, params=None):
+        """执行写语句并返回受影响的行数（用于条件更新）"""
+        with self._conn() as c:
+            with c.cursor() as cur:
+                cur.execute(sql, params or ())
+                if not self._in_transaction():
+                    c.commit()
+                return cur.rowcount
+
+    def invalidate_profile(self, uid):
+        """用户资料、角色、白名单或 QQ 变更后使缓存失效"""
+        self.profile_cache.invalidate(uid)
+
+    # ---------- 数据库迁移 ----------
+    def migrate(self, migrations_dir=MIGRATIONS_DIR):
+        """按版本号依次执行尚未应用的迁移脚本，返回本次应用的版本号列表"""
+        self._execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INT PRIMARY KEY,
+                name VARCHAR(255) NOT NULL,
+                applied_at DATETIME NOT NULL
+            )
+        """)
+        applied = {row['version'] for row in self._fetchall("SELECT version FROM schema_migrations")}
+        done = []
+        for version, name, path in _list_migrations(migrations_dir):
+            if version in applied:
+                continue
+            with open(path, 'r', encoding='utf-8') as f:
+                statements = _split_sql(f.read())
+            # DDL 在 MySQL 中会隐式提交，无法整体回滚；版本号只在全部语句成功后记录
+            with self._conn() as c:
+                with c.cursor() as cur:
+                    for stmt in statements:
+                        cur.execute(stmt)
+                    cur.execute("INSERT INTO schema_migrations (version, name, applied_at) VALUES (%s, %s, %s)",
+                                (version, name, _get_now()))
+                c.commit()
+            print(f"[S] 已应用数据库迁移 {version:03d}_{name}")
+            done.append(version)
+        return done
+
     # ---------- 登录/注册 ----------
     def register_user(self, username, password, nickname, email, phone, playername):
         try:
@@ -94,55 +1047,69 @@ class DatabaseManager:
             if not _validate_phone(phone):
                 return "手机号格式不正确"
 
-            # 检查用户名、邮箱和手机号是否已存在
-            existing_user = self._fetchone(
-                "SELECT Username, Email, Phone FROM Users WHERE Username = %s OR Email = %s OR Phone = %s",
-                (username, email, phone)
-            )
-
-            if existing_user:
-                # 返回具体的错误信息，仿照app.py的逻辑
-                if existing_user['Username'] == username:
-                    return "用户名已存在"
-                elif existing_user['Email'] == email:
-                    return "邮箱已被使用"
-                elif existing_user['Phone'] == phone:
-                    return "手机号已被使用"
-
-            # 插入数据到数据库，仿照app.py的注册逻辑
-            # 1. 创建新用户
-            uid = self._execute(
-                "INSERT INTO Users (Username, Password, Nickname, Email, Phone, CreatedAt) VALUES (%s,%s,%s,%s,%s,%s)",
-                (username, _hash_pwd(password), nickname, email, phone, _get_now())
-            )
-
-            # 2. 在用户权限组中添加默认权限 (RoleID=3)
-            self._execute("INSERT INTO UserRoles_Con (UserID, RoleID) VALUES (%s, 3)", (uid,))
-
-            # 3. 创建用户档案信息
-            import random
-            gender_choices = ['武装直升机', '沃尔玛购物袋', '死亡花岗岩', '男', '女']
-            self._execute(
-                "INSERT INTO UserProfiles (UserID, FirstName, LastName, Birthday, Gender, Bio) VALUES (%s, %s, %s, %s, %s, %s)",
-                (uid, 'New', 'User', '2024-1-01', random.choice(gender_choices), '没有简介')
-            )
-
-            # 4. 创建玩家数据
-            # 生成UUID（仿照app.py中调用get_uuid的方式）
-            import uuid
-            player_uuid = str(uuid.uuid4()).replace('-', '')
-            self._execute(
-                "INSERT INTO PlayerData (UserID, RoleID, PlayerName, WhiteState, uuid) VALUES (%s, %s, %s, %s, %s)",
-                (uid, 3, playername, 0, player_uuid)
-            )
-
+            # 先在进程池中算好哈希，避免持有事务连接等待 bcrypt
+            hashed = self.hasher.hash(password)
+
+            # 查重与四张表的插入在同一事务内完成，避免注册中途失败留下残缺数据
+            with self.transaction():
+                # 检查用户名、邮箱和手机号是否已存在
+                existing_user = self._fetchone(
+                    "SELECT Username, Email, Phone FROM Users WHERE Username = %s OR Email = %s OR Phone = %s",
+                    (username, email, phone)
+                )
+
+                if existing_user:
+                    # 返回具体的错误信息，仿照app.py的逻辑
+                    if existing_user['Username'] == username:
+                        return "用户名已存在"
+                    elif existing_user['Email'] == email:
+                        return "邮箱已被使用"
+                    elif existing_user['Phone'] == phone:
+                        return "手机号已被使用"
+
+                # 插入数据到数据库，仿照app.py的注册逻辑
+                # 1. 创建新用户
+                uid = self._execute(
+                    "INSERT INTO Users (Username, Password, Nickname, Email, Phone, CreatedAt) VALUES (%s,%s,%s,%s,%s,%s)",
+                    (username, hashed, nickname, email, phone, _get_now())
+                )
+
+                # 2. 在用户权限组中添加默认权限 (RoleID=3)
+                self._execute("INSERT INTO UserRoles_Con (UserID, RoleID) VALUES (%s, 3)", (uid,))
+
+                # 3. 创建用户档案信息
+                import random
+                gender_choices = ['武装直升机', '沃尔玛购物袋', '死亡花岗岩', '男', '女']
+                self._execute(
+                    "INSERT INTO UserProfiles (UserID, FirstName, LastName, Birthday, Gender, Bio) VALUES (%s, %s, %s, %s, %s, %s)",
+                    (uid, 'New', 'User', '2024-1-01', random.choice(gender_choices), '没有简介')
+                )
+
+                # 4. 创建玩家数据
+                # 生成UUID（仿照app.py中调用get_uuid的方式）
+                import uuid
+                player_uuid = str(uuid.uuid4()).replace('-', '')
+                self._execute(
+                    "INSERT INTO PlayerData (UserID, RoleID, PlayerName, WhiteState, uuid) VALUES (%s, %s, %s, %s, %s)",
+                    (uid, 3, playername, 0, player_uuid)
+                )
+
+            self.player_index.assign(uid, playername)
             return True
         except mysql.connector.Error as e:
             return str(e)
 
     def check_login(self, username, password):
         user = self._fetchone("SELECT * FROM Users WHERE Username=%s", (username,))
-        if user and _check_pwd(password, user['Password']):
+        if user and self.hasher.check(password, user['Password']):
+            # 代价因子与配置不一致时，用本次登录的明文重新计算哈希
+            if self.hasher.needs_rehash(user['Password']):
+                try:
+                    self._execute("UPDATE Users SET Password=%s WHERE UserID=%s",
+                                  (self.hasher.rehash(password), user['UserID']))
+                    self.invalidate_profile(user['UserID'])
+                except ServerBusyError:
+                    pass  # 繁忙时跳过，下次登录再重算
             user['CreatedAt'] = user['CreatedAt'].isoformat() if user['CreatedAt'] else None
             return user
         return None
@@ -152,10 +1119,11 @@ class DatabaseManager:
         sql, params = "UPDATE Users SET Nickname=%s, Email=%s, Phone=%s", (nickname, email, phone)
         if password:
             sql += ", Password=%s"
-            params += (_hash_pwd(password),)
+            params += (self.hasher.hash(password),)
         sql += " WHERE UserID=%s"
         params += (uid,)
         self._execute(sql, params)
+        self.invalidate_profile(uid)
         return True
 
     def update_user_personal_info(self, uid, first_name, last_name, gender, birthday, bio):
@@ -165,9 +1133,13 @@ class DatabaseManager:
                  WHERE UserID=%s"""
         params = (first_name, last_name, gender, birthday, bio, uid)
         self._execute(sql, params)
+        self.invalidate_profile(uid)
         return True
 
     def get_user_by_id(self, uid):
+        return self.profile_cache.get_or_load(uid, 'user', lambda: self._load_user_by_id(uid), cache_none=False)
+
+    def _load_user_by_id(self, uid):
         user = self._fetchone("SELECT * FROM Users WHERE UserID=%s", (uid,))
         if user:
             # 获取用户个人资料
@@ -176,21 +1148,87 @@ class DatabaseManager:
                 user.update(profile)
         return user
 
-    def get_all_users(self):
-        # 修改查询语句，包含RoleID字段
-        return self._fetchall("""
-            SELECT u.*, 
+    def get_full_profiles(self, uids):
+        """一次联表查询批量获取完整资料（基本信息、个人资料、角色、白名单、QQ），返回 {UserID: 资料}
+        无法转换为整数的 ID 视为不存在"""
+        profiles, versions = {}, {}
+        for uid in {_to_uid(uid) for uid in uids} - {None}:
+            cached = self.profile_cache.lookup(uid, 'full')
+            if cached is _MISSING:
+                versions[uid] = self.profile_cache.version(uid)
+            else:
+                profiles[uid] = cached
+        if not versions:
+            return profiles
+        uids = list(versions)
+        placeholders = ", ".join(["%s"] * len(uids))
+        rows = self._fetchall(f"""
+            SELECT u.*,
+                   p.FirstName, p.LastName, p.Birthday, p.Gender, p.Bio,
                    ur.RoleID,
-                   pd.PlayerName, 
-                   pd.Genuine, 
-                   pd.WhiteState, 
-                   pd.PassDate, 
+                   pd.PlayerName,
+                   pd.WhiteState,
                    qq.QQID
             FROM Users u
+            LEFT JOIN UserProfiles p ON u.UserID = p.UserID
             LEFT JOIN UserRoles_Con ur ON u.UserID = ur.UserID
             LEFT JOIN PlayerData pd ON u.UserID = pd.UserID
             LEFT JOIN UserQQ_Con qq ON u.UserID = qq.UserID
-        """)
+            WHERE u.UserID IN ({placeholders})
+        """, tuple(uids))
+        for row in rows:
+            # 关联表可能有多行，与逐条查询一致只取第一条
+            if row['UserID'] in profiles:
+                continue
+            # 缺省值与 get_role_by_uid / get_whitelist_state 保持一致
+            if row['RoleID'] is None:
+                row['RoleID'] = 3
+            row['WhiteState'] = row['WhiteState'] or 0
+            profiles[row['UserID']] = row
+            self.profile_cache.store(row['UserID'], 'full', row, versions[row['UserID']])
+        return profiles
+
+    def get_full_profile(self, uid):
+        """单条联表查询获取用户完整资料，不存在时返回 None"""
+        return self.get_full_profiles([uid]).get(_to_uid(uid))
+
+    ALL_USERS_SQL = """
+        SELECT u.*, 
+               ur.RoleID,
+               pd.PlayerName, 
+               pd.Genuine, 
+               pd.WhiteState, 
+               pd.PassDate, 
+               qq.QQID
+        FROM Users u
+        LEFT JOIN UserRoles_Con ur ON u.UserID = ur.UserID
+        LEFT JOIN PlayerData pd ON u.UserID = pd.UserID
+        LEFT JOIN UserQQ_Con qq ON u.UserID = qq.UserID
+    """
+
+    def get_all_users(self):
+        # 修改查询语句，包含RoleID字段
+        return self._fetchall(self.ALL_USERS_SQL)
+
+    def iter_all_users(self, chunk_size=500):
+        """
+        按 UserID 键集逐块读取全部用户（生成器，每次产出至多 chunk_size 个用户）
+        每块是一次独立的短查询，连接在两块之间归还连接池，调用方发送得再慢也不占用连接
+        """
+        last_id = 0
+        while True:
+            rows = self._fetchall(self.ALL_USERS_SQL + " WHERE u.UserID > %s ORDER BY u.UserID LIMIT %s",
+                                  (last_id, chunk_size))
+            if not rows:
+                return
+            last_id = rows[-1]['UserID']
+            # 关联表可能有多行，每个用户只取第一行（被 LIMIT 截断的多余行不会在下一块重复出现）
+            chunk, seen = [], set()
+            for row in rows:
+                if row['UserID'] not in seen:
+                    seen.add(row['UserID'])
+                    chunk.append(row)
+            yield chunk
 
     def get_users_count(self):
         """获取用户总数"""
@@ -216,6 +1254,114 @@ class DatabaseManager:
             LIMIT {page_size} OFFSET {offset}
         """)
 
+    def _user_filter_sql(self, role=None, white_state=None, online=None, name_prefix=None):
+        """用户列表筛选条件 → (FROM 子句, WHERE 条件列表, 参数列表)；只连接筛选用到的表"""
+        joins, where, params = [], [], []
+        if role is not None:
+            joins.append("LEFT JOIN UserRoles_Con ur ON u.UserID = ur.UserID")
+            # 没有角色记录的用户按普通用户(3)处理，与 get_role_by_uid 一致
+            where.append("(ur.RoleID = %s OR ur.RoleID IS NULL)" if int(role) == 3 else "ur.RoleID = %s")
+            params.append(int(role))
+        if white_state is not None or name_prefix:
+            joins.append("LEFT JOIN PlayerData pd ON u.UserID = pd.UserID")
+        if white_state is not None:
+            where.append("pd.WhiteState = 1" if white_state else "(pd.WhiteState = 0 OR pd.WhiteState IS NULL)")
+        if online is not None:
+            online_ids = self.get_online_users()
+            if online_ids:
+                placeholders = ", ".join(["%s"] * len(online_ids))
+                where.append(f"u.UserID {'IN' if online else 'NOT IN'} ({placeholders})")
+                params.extend(online_ids)
+            elif online:
+                where.append("FALSE")
+        if name_prefix:
+            escaped = name_prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            where.append("(u.Username LIKE %s OR u.Nickname LIKE %s OR pd.PlayerName LIKE %s)")
+            params.extend([escaped] * 3)
+        return "FROM Users u " + " ".join(joins), where, params
+
+    def count_users(self, role=None, white_state=None, online=None, name_prefix=None):
+        """符合筛选条件的用户数（缓存 count_ttl 秒，注册/上下线后可能略有滞后）"""
+        key = (role, white_state, online, name_prefix or None)
+        count = self.user_count_cache.get(key)
+        if count is not _MISSING:
+            return count
+        from_sql, where, params = self._user_filter_sql(role, white_state, online, name_prefix)
+        where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+        count = self._fetchone(f"SELECT COUNT(DISTINCT u.UserID) AS n {from_sql} {where_sql}", tuple(params))['n']
+        self.user_count_cache.set(key, count)
+        return count
+
+    def list_users(self, after_id=None, before_id=None, last=False, page_size=10,
+                   role=None, white_state=None, online=None, name_prefix=None):
+        """
+        按 UserID 键集分页获取用户列表，任意深度的页与首页代价相同
+        - after_id ：下一页（UserID > after_id）
+        - before_id：上一页（UserID < before_id）
+        - last     ：最后一页
+        先按筛选条件取出当前页的 UserID，再按主键取完整行
+        返回 {"users": [...], "has_prev": bool, "has_next": bool}
+        """
+        from_sql, where, params = self._user_filter_sql(role, white_state, online, name_prefix)
+
+        def page_ids(extra, extra_params, order, limit):
+            conds = where + extra
+            where_sql = f"WHERE {' AND '.join(conds)}" if conds else ""
+            rows = self._fetchall(f"""
+                SELECT DISTINCT u.UserID {from_sql} {where_sql}
+                ORDER BY u.UserID {order} LIMIT %s
+            """, tuple(params) + tuple(extra_params) + (limit,))
+            return [r['UserID'] for r in rows]
+
+        backward = before_id is not None or last
+        if before_id is not None:
+            ids = page_ids(["u.UserID < %s"], [before_id], "DESC", page_size + 1)
+        elif last:
+            ids = page_ids([], [], "DESC", page_size + 1)
+        elif after_id is not None:
+            ids = page_ids(["u.UserID > %s"], [after_id], "ASC", page_size + 1)
+        else:
+            ids = page_ids([], [], "ASC", page_size + 1)
+
+        # 沿翻页方向多取一条判断该方向是否还有数据，另一方向用一次索引探测判断
+        more = len(ids) > page_size
+        ids = sorted(ids[:page_size])
+        if backward:
+            has_prev = more
+            boundary = ids[-1] if ids else before_id
+            has_next = boundary is not None and bool(page_ids(["u.UserID > %s"], [boundary], "ASC", 1))
+        else:
+            has_next = more
+            boundary = ids[0] if ids else after_id
+            has_prev = boundary is not None and bool(page_ids(["u.UserID < %s"], [boundary], "DESC", 1))
+
+        users = []
+        if ids:
+            placeholders = ", ".join(["%s"] * len(ids))
+            rows = self._fetchall(f"""
+                SELECT u.*,
+                       ur.RoleID,
+                       pd.PlayerName,
+                       pd.Genuine,
+                       pd.WhiteState,
+                       pd.PassDate,
+                       qq.QQID
+                FROM Users u
+                LEFT JOIN UserRoles_Con ur ON u.UserID = ur.UserID
+                LEFT JOIN PlayerData pd ON u.UserID = pd.UserID
+                LEFT JOIN UserQQ_Con qq ON u.UserID = qq.UserID
+                WHERE u.UserID IN ({placeholders})
+                ORDER BY u.UserID
+            """, tuple(ids))
+            seen = set()
+            for row in rows:
+                # 关联表可能有多行，每个用户只取第一条
+                if row['UserID'] not in seen:
+                    seen.add(row['UserID'])
+                    row.pop('Password', None)
+                    users.append(row)
+        return {"users": users, "has_prev": has_prev, "has_next": has_next}
+
     # ---------- 通信系统 ----------
     def get_user_contacts(self, user_id):
         """获取用户的联系人列表（与当前用户有过可见通信的用户）"""
@@ -234,6 +1380,15 @@ class DatabaseManager:
         """
         return self._fetchall(query, (user_id, user_id, user_id))
 
+    def get_contact_watchers(self, user_id):
+        """反向联系人：把 user_id 作为联系人的用户（与 get_user_contacts 的可见性条件对称）"""
+        query = """
+        SELECT sender_id AS UserID FROM messages WHERE receiver_id = %s AND visible_to_sender = TRUE
+        UNION
+        SELECT receiver_id AS UserID FROM messages WHERE sender_id = %s AND visible_to_receiver = TRUE
+        """
+        return [r['UserID'] for r in self._fetchall(query, (user_id, user_id)) if r['UserID'] != int(user_id)]
+
     # 添加获取未读消息数的方法
     def get_unread_messages_count(self, user_id):
         """获取用户未读消息数"""
@@ -270,19 +1425,28 @@ class DatabaseManager:
     # 添加获取在线用户列表的方法
     def get_online_users(self):
         """获取当前在线用户列表"""
-        return list(self.online_users)
+        with self._online_lock:
+            return list(self.online_users)
 
     # 添加用户上线方法
     def user_online(self, user_id):
-        """标记用户为在线状态"""
-        self.online_users.add(int(user_id))
-        return True
+        """标记用户为在线状态，返回状态是否发生变化"""
+        user_id = int(user_id)
+        with self._online_lock:
+            if user_id in self.online_users:
+                return False
+            self.online_users.add(user_id)
+            return True
 
     # 添加用户下线方法
     def user_offline(self, user_id):
-        """标记用户为离线状态"""
-        self.online_users.discard(int(user_id))
-        return True
+        """标记用户为离线状态，返回状态是否发生变化"""
+        user_id = int(user_id)
+        with self._online_lock:
+            if user_id not in self.online_users:
+                return False
+            self.online_users.discard(user_id)
+            return True
 
     # 添加检查用户是否在线的方法
     def is_user_online(self, user_id):
@@ -352,6 +1516,78 @@ class DatabaseManager:
         """
         return self._fetchall(query, (user1_id, user2_id, user2_id, user1_id))
 
+    def get_messages_page(self, user1_id, user2_id, limit=50, before_message_id=None):
+        """按 MessageID 游标分页获取两个用户之间的可见消息
+
+        返回 (messages, next_cursor)：messages 为 MessageID 小于 before_message_id 的最新 limit 条，
+        按时间正序排列；next_cursor 为继续向前翻页时使用的 before_message_id，没有更早的消息时为 None。
+        """
+        cursor_cond = "AND MessageID < %s" if before_message_id else ""
+        cursor_params = (before_message_id,) if before_message_id else ()
+        # 两个方向分别走 (sender_id, receiver_id) 索引倒序取 limit+1 条再合并，
+        # 用 UNION 去重，兼容与自己对话时两个分支命中同一条消息
+        query = f"""
+        SELECT m.*, u1.Username as sender_name, u2.Username as receiver_name
+        FROM (
+            (SELECT * FROM messages
+             WHERE sender_id = %s AND receiver_id = %s AND visible_to_sender = TRUE {cursor_cond}
+             ORDER BY MessageID DESC LIMIT %s)
+            UNION
+            (SELECT * FROM messages
+             WHERE sender_id = %s AND receiver_id = %s AND visible_to_receiver = TRUE {cursor_cond}
+             ORDER BY MessageID DESC LIMIT %s)
+        ) m
+        JOIN Users u1 ON m.sender_id = u1.UserID
+        JOIN Users u2 ON m.receiver_id = u2.UserID
+        ORDER BY m.MessageID DESC
+        LIMIT %s
+        """
+        params = ((user1_id, user2_id) + cursor_params + (limit + 1,)
+                  + (user2_id, user1_id) + cursor_params + (limit + 1,)
+                  + (limit + 1,))
+        rows = self._fetchall(query, params)
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        rows.reverse()
+        next_cursor = rows[0]['MessageID'] if has_more and rows else None
+        return rows, next_cursor
+
+    def get_messages_since(self, user_id, since_message_id, limit=500):
+        """获取 MessageID 大于 since_message_id 的、该用户可见的所有会话消息（按 MessageID 正序）
+
+        返回 (messages, has_more)，has_more 为 True 时应以最后一条的 MessageID 继续同步。
+        """
+        query = """
+        SELECT m.*, u1.Username as sender_name, u2.Username as receiver_name
+        FROM (
+            (SELECT * FROM messages
+             WHERE receiver_id = %s AND visible_to_receiver = TRUE AND MessageID > %s
+             ORDER BY MessageID LIMIT %s)
+            UNION
+            (SELECT * FROM messages
+             WHERE sender_id = %s AND visible_to_sender = TRUE AND MessageID > %s
+             ORDER BY MessageID LIMIT %s)
+        ) m
+        JOIN Users u1 ON m.sender_id = u1.UserID
+        JOIN Users u2 ON m.receiver_id = u2.UserID
+        ORDER BY m.MessageID
+        LIMIT %s
+        """
+        rows = self._fetchall(query, (user_id, since_message_id, limit + 1,
+                                      user_id, since_message_id, limit + 1,
+                                      limit + 1))
+        return rows[:limit], len(rows) > limit
+
+    def get_last_message_id(self, user_id):
+        """获取与该用户相关的最新一条消息的 MessageID，没有消息时返回 0"""
+        row = self._fetchone("""
+        SELECT GREATEST(
+            COALESCE((SELECT MAX(MessageID) FROM messages WHERE receiver_id = %s), 0),
+            COALESCE((SELECT MAX(MessageID) FROM messages WHERE sender_id = %s), 0)
+        ) as last_id
+        """, (user_id, user_id))
+        return row['last_id'] if row else 0
+
     def send_message(self, sender_id, receiver_id, content):
         """发送消息"""
         # 限制消息长度为250字
@@ -363,26 +1599,26 @@ class DatabaseManager:
         VALUES (%s, %s, %s, %s, TRUE, TRUE)
         """
         timestamp = _get_now()
-        self._execute(query, (sender_id, receiver_id, content, timestamp))
-
-        return True
+        # 返回新消息的 MessageID，便于客户端按 MessageID 去重
+        return self._execute(query, (sender_id, receiver_id, content, timestamp))
 
     def delete_contact(self, user_id, contact_id):
         """删除联系人（隐藏聊天记录）"""
         # 将用户与该联系人的聊天记录对自己设为不可见
-        query = """
-        UPDATE messages 
-        SET visible_to_sender = FALSE 
-        WHERE sender_id = %s AND receiver_id = %s
-        """
-        self._execute(query, (user_id, contact_id))
+        with self.transaction():
+            query = """
+            UPDATE messages 
+            SET visible_to_sender = FALSE 
+            WHERE sender_id = %s AND receiver_id = %s
+            """
+            self._execute(query, (user_id, contact_id))
 
-        query = """
-        UPDATE messages 
-        SET visible_to_receiver = FALSE 
-        WHERE receiver_id = %s AND sender_id = %s
-        """
-        self._execute(query, (user_id, contact_id))
+            query = """
+            UPDATE messages 
+            SET visible_to_receiver = FALSE 
+            WHERE receiver_id = %s AND sender_id = %s
+            """
+            self._execute(query, (user_id, contact_id))
 
         # 删除备注信息
         import os
@@ -429,123 +1665,140 @@ class DatabaseManager:
 
         return True
 
-    def give_gift(self, sender_id, receiver_id, gift_type):
-        """赠与礼物"""
-        import datetime
-        import os
+    def load_gift_counters(self):
+        """按 GiftRecords 重建当天的赠与计数（服务启动时调用）
+        升级当天迁移前已写入旧 JSON 文件的赠与也计入，避免当天额度被重置"""
+        today = datetime.date.today()
+        rows = self._fetchall("""
+            SELECT SenderID, GiftType, SUM(Amount) AS total FROM GiftRecords
+            WHERE GiftDate = %s GROUP BY SenderID, GiftType
+        """, (today,))
+        counts = {}
+        for r in rows:
+            key = (int(r['SenderID']), r['GiftType'])
+            counts[key] = counts.get(key, 0) + int(r['total'])
+        legacy = self._load_legacy_gift_counts(today)
+        for key, n in legacy.items():
+            counts[key] = counts.get(key, 0) + n
+        self.gift_counter.load(today, [(uid, kind, n) for (uid, kind), n in counts.items()])
+        print(f"[S] 已载入今日赠与计数 {len(rows)} 条" + (f"，旧记录文件 {len(legacy)} 条" if legacy else ""))
+
+    def _load_legacy_gift_counts(self, today):
+        """汇总旧版 gift_records/{date}.json 中当天的赠与，返回 {(UserID, 类型): 数量}"""
         import json
+        file_name = os.path.join(GIFT_CONFIG['legacy_dir'], f"{today.strftime('%Y-%m-%d')}.json")
+        if not os.path.exists(file_name):
+            return {}
+        counts = {}
+        try:
+            with open(file_name, 'r', encoding='utf-8') as f:
+                records = json.load(f)
+            for record in records:
+                key = (int(record["sender_id"]), record["gift_type"])
+                counts[key] = counts.get(key, 0) + int(record["amount"])
+        except Exception as e:
+            print(f"[W] 读取旧赠与记录失败: {e}")
+            return {}
+        return counts
 
-        # 获取今天的日期
-        today = datetime.date.today().strftime("%Y-%m-%d")
-
-        # 检查今日赠与记录
-        gift_info = self.get_user_gift_info(sender_id)
-
-        # 检查是否达到上限
-        if gift_type == "coin":
-            if gift_info["coins_given_today"] >= 5:
-                return {"success": False, "message": "今日金币赠与已达上限"}
-        elif gift_type == "star":
-            if gift_info["stars_given_today"] >= 1:
-                return {"success": False, "message": "今日星星赠与已达上限"}
-
-        # 获取发送者和接收者信息
-        sender = self.get_user_by_id(sender_id)
-        receiver = self.get_user_by_id(receiver_id)
-
-        if not sender or not receiver:
-            return {"success": False, "message": "用户不存在"}
-
-        # 检查发送者是否有足够的礼物
-        if gift_type == "coin" and sender["Coins"] < 1:
-            return {"success": False, "message": "金币不足"}
-        elif gift_type == "star" and sender["Stars"] < 1:
-            return {"success": False, "message": "星星不足"}
-
-        # 执行赠与
-        amount = 1
-        if gift_type == "coin":
-            # 更新发送者和接收者的金币
-            self._execute("UPDATE Users SET Coins = Coins - %s WHERE UserID = %s", (amount, sender_id))
-            self._execute("UPDATE Users SET Coins = Coins + %s WHERE UserID = %s", (amount, receiver_id))
-        elif gift_type == "star":
-            # 更新发送者和接收者的星星
-            self._execute("UPDATE Users SET Stars = Stars - %s WHERE UserID = %s", (amount, sender_id))
-            self._execute("UPDATE Users SET Stars = Stars + %s WHERE UserID = %s", (amount, receiver_id))
-
-        # 记录赠与到本地文件
-        gift_record = {
-            "sender_id": sender_id,
-            "receiver_id": receiver_id,
-            "gift_type": gift_type,
-            "amount": amount,
-            "gift_date": today,
-            "timestamp": datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        }
+    # ---------- 余额 ----------
+    BALANCE_COLUMNS = ('Coins', 'Stars')
 
-        # 创建赠与记录目录
-        os.makedirs("gift_records", exist_ok=True)
-        file_name = f"gift_records/{today}.json"
+    def transfer(self, sender_id, receiver_id, column, amount, ledger=None):
+        """
+        原子转账：条件扣减（余额 >= amount）、入账与流水写入在同一事务、同一连接内完成
+        ledger 为可选的 (sql, params)，与余额变更一起提交
+        返回 {UserID: {"Coins":…, "Stars":…}} 新余额；余额不足抛出 InsufficientBalanceError，
+        接收者不存在抛出 ValueError，两种情况均整体回滚
+        """
+        if column not in self.BALANCE_COLUMNS:
+            raise ValueError(f"未知的余额字段: {column}")
+        sender_id, receiver_id = int(sender_id), int(receiver_id)
+        debit = (f"UPDATE Users SET {column} = {column} - %s WHERE UserID = %s AND {column} >= %s",
+                 (amount, sender_id, amount))
+        credit = (f"UPDATE Users SET {column} = {column} + %s WHERE UserID = %s", (amount, receiver_id))
+        # 两行按 UserID 升序加锁，互相转账的并发事务不会死锁
+        steps = [('debit', debit), ('credit', credit)]
+        if receiver_id < sender_id:
+            steps.reverse()
+        try:
+            with self.transaction():
+                for kind, (sql, params) in steps:
+                    if not self._execute_rowcount(sql, params):
+                        if kind == 'debit':
+                            raise InsufficientBalanceError(column)
+                        raise ValueError("用户不存在")
+                if ledger:
+                    self._execute(*ledger)
+                rows = self._fetchall("SELECT UserID, Coins, Stars FROM Users WHERE UserID IN (%s, %s)",
+                                      (sender_id, receiver_id))
+        finally:
+            self.invalidate_profile(sender_id)
+            self.invalidate_profile(receiver_id)
+        return {r['UserID']: {"Coins": r['Coins'], "Stars": r['Stars']} for r in rows}
+
+    def grant(self, uid, coins=0, stars=0):
+        """系统发放奖励（签到等），返回新余额 {"Coins":…, "Stars":…}"""
+        with self.transaction():
+            self._execute("UPDATE Users SET Coins = Coins + %s, Stars = Stars + %s WHERE UserID = %s",
+                          (coins, stars, uid))
+            row = self._fetchone("SELECT Coins, Stars FROM Users WHERE UserID = %s", (uid,))
+        self.invalidate_profile(uid)
+        return row
 
-        # 读取现有记录
-        records = []
-        if os.path.exists(file_name):
-            try:
-                with open(file_name, 'r', encoding='utf-8') as f:
-                    records = json.load(f)
-            except Exception:
-                records = []
+    def give_gift(self, sender_id, receiver_id, gift_type):
+        """赠与礼物"""
+        today = datetime.date.today()
+        amount = GIFT_CONFIG['amount']
+        limit = GIFT_CONFIG['coin_limit'] if gift_type == "coin" else GIFT_CONFIG['star_limit']
 
-        # 添加新记录
-        records.append(gift_record)
+        # 检查并预占今日额度，写库失败时退回
+        if not self.gift_counter.try_acquire(sender_id, gift_type, amount, limit, today):
+            return {"success": False, "message": "今日金币赠与已达上限" if gift_type == "coin" else "今日星星赠与已达上限"}
 
-        # 保存记录
+        committed = False
         try:
-            with open(file_name, 'w', encoding='utf-8') as f:
-                json.dump(records, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"保存赠与记录失败: {e}")
+            # 获取发送者和接收者信息（昵称用于赠与消息，通常命中资料缓存）
+            sender = self.get_user_by_id(sender_id)
+            receiver = self.get_user_by_id(receiver_id)
+
+            if not sender or not receiver:
+                return {"success": False, "message": "用户不存在"}
+
+            # 余额检查由条件扣减完成，扣减、入账与赠与流水在同一事务内提交
+            column = "Coins" if gift_type == "coin" else "Stars"
+            ledger = ("""
+                INSERT INTO GiftRecords (SenderID, ReceiverID, GiftType, Amount, GiftDate, CreatedAt)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            """, (sender_id, receiver_id, gift_type, amount, today, _get_now()))
+            try:
+                balances = self.transfer(sender_id, receiver_id, column, amount, ledger)
+            except InsufficientBalanceError:
+                return {"success": False, "message": "金币不足" if gift_type == "coin" else "星星不足"}
+            except ValueError as e:
+                return {"success": False, "message": str(e)}
+            committed = True
+        finally:
+            if not committed:
+                self.gift_counter.release(sender_id, gift_type, amount, today)
 
         return {
             "success": True,
             "amount": amount,
             "sender_name": sender["Nickname"],
-            "receiver_name": receiver["Nickname"]
+            "receiver_name": receiver["Nickname"],
+            "sender_balance": balances.get(int(sender_id)),
+            "receiver_balance": balances.get(int(receiver_id))
         }
 
     def get_user_gift_info(self, user_id):
         """获取用户今日赠与信息"""
-        import datetime
-        import os
-        import json
-
-        today = datetime.date.today().strftime("%Y-%m-%d")
-        file_name = f"gift_records/{today}.json"
-
-        coins_given = 0
-        stars_given = 0
-
-        # 读取今日赠与记录
-        if os.path.exists(file_name):
-            try:
-                with open(file_name, 'r', encoding='utf-8') as f:
-                    records = json.load(f)
-
-                # 统计用户今日赠与
-                for record in records:
-                    if record["sender_id"] == user_id:
-                        if record["gift_type"] == "coin":
-                            coins_given += record["amount"]
-                        elif record["gift_type"] == "star":
-                            stars_given += record["amount"]
-            except Exception as e:
-                print(f"读取赠与记录失败: {e}")
-
+        today = datetime.date.today()
         return {
-            "coins_given_today": coins_given,
-            "stars_given_today": stars_given,
-            "coin_limit": 5,
-            "star_limit": 1
+            "coins_given_today": self.gift_counter.get(user_id, "coin", today),
+            "stars_given_today": self.gift_counter.get(user_id, "star", today),
+            "coin_limit": GIFT_CONFIG['coin_limit'],
+            "star_limit": GIFT_CONFIG['star_limit']
         }
 
     def _save_message_to_file(self, sender_id, receiver_id, content, timestamp):
@@ -567,17 +1820,22 @@ class DatabaseManager:
 
     # ---------- 角色 ----------
     def get_role_by_uid(self, uid):
-        row = self._fetchone("SELECT RoleID FROM UserRoles_Con WHERE UserID=%s", (uid,))
-        return row['RoleID'] if row else 3
+        def load():
+            row = self._fetchone("SELECT RoleID FROM UserRoles_Con WHERE UserID=%s", (uid,))
+            return row['RoleID'] if row else 3
+        return self.profile_cache.get_or_load(uid, 'role', load)
 
     def update_user_role(self, uid, role_id):
         self._execute("UPDATE UserRoles_Con SET RoleID=%s WHERE UserID=%s", (role_id, uid))
+        self.invalidate_profile(uid)
         return True
 
     # ---------- 白名单 ----------
     def get_whitelist_state(self, uid):
-        row = self._fetchone("SELECT WhiteState FROM PlayerData WHERE UserID=%s", (uid,))
-        return row['WhiteState'] if row else 0  # 修复：处理None值，返回默认值0
+        def load():
+            row = self._fetchone("SELECT WhiteState FROM PlayerData WHERE UserID=%s", (uid,))
+            return row['WhiteState'] if row else 0  # 修复：处理None值，返回默认值0
+        return self.profile_cache.get_or_load(uid, 'white', load)
 
     def add_to_whitelist(self, uid):
         name_row = self._fetchone("SELECT PlayerName FROM PlayerData WHERE UserID=%s", (uid,))
@@ -586,6 +1844,7 @@ class DatabaseManager:
         name = name_row['PlayerName']
         _rcon(f"whitelist add {name}")
         self._execute("UPDATE PlayerData SET WhiteState=1, PassDate=%s WHERE UserID=%s", (_get_now()[:10], uid))
+        self.invalidate_profile(uid)
         return True
 
     def remove_whitelist(self, uid):
@@ -593,90 +1852,213 @@ class DatabaseManager:
         if name_row:
             _rcon(f"whitelist remove {name_row['PlayerName']}")
         self._execute("UPDATE PlayerData SET WhiteState=0 WHERE UserID=%s", (uid,))
+        self.invalidate_profile(uid)
+        return True
+
+    @staticmethod
+    def _whitelist_row(row):
+        """申请记录 → 接口字段；content 沿用旧申请文件的格式，客户端据此解析"""
+        genuine_text = "正版" if row['Genuine'] == 1 else "离线"
+        return {
+            "id": row['ApplicationID'],
+            "date": row['ApplyDate'].strftime('%Y-%m-%d'),
+            "user_id": row['UserID'],
+            "playername": row['PlayerName'],
+            "genuine": row['Genuine'],
+            "reason": row['Reason'],
+            "status": WHITELIST_STATUS.get(row['Status'], "未知"),
+            "content": f"申请人ID: {row['UserID']}:{row['PlayerName']}\n游玩方式：{genuine_text}\n申请介绍：{row['Reason']}\n",
+        }
+
+    def submit_whitelist_application(self, uid, playername, genuine, reason):
+        """提交白名单申请：检查待审核申请与每日次数后写入，成功返回 True，否则返回原因"""
+        today = datetime.date.today()
+        limit = WHITELIST_CONFIG['daily_limit']
+        with self.transaction():
+            # 锁住该用户的 Users 行（每个用户必有），同一用户的并发申请依次完成检查与写入
+            self._fetchone("SELECT UserID FROM Users WHERE UserID=%s FOR UPDATE", (uid,))
+            if self._fetchone("SELECT 1 FROM WhitelistApplications WHERE UserID=%s AND Status=%s LIMIT 1",
+                              (uid, WHITELIST_PENDING)):
+                return "您有未审核的申请，请等待审核完成后再申请"
+            row = self._fetchone("SELECT COUNT(*) AS n FROM WhitelistApplications WHERE UserID=%s AND ApplyDate=%s",
+                                 (uid, today))
+            if row['n'] >= limit:
+                return f"您今天已达到申请次数上限（{limit}次）"
+            self._execute("""
+                INSERT INTO WhitelistApplications (UserID, PlayerName, Genuine, Reason, ApplyDate, Status, CreatedAt)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+            """, (uid, playername, 1 if genuine == 1 else 0, reason, today, WHITELIST_PENDING, _get_now()))
         return True
 
     def get_whitelist_applications(self, uid):
+        """获取用户的白名单申请记录（最新的在前）"""
+        rows = self._fetchall("""
+            SELECT * FROM WhitelistApplications WHERE UserID=%s
+            ORDER BY ApplyDate DESC, ApplicationID DESC
+        """, (uid,))
+        return [self._whitelist_row(r) for r in rows]
+
+    def query_whitelist_applications(self, status=None, date_from=None, date_to=None, genuine=None,
+                                     descending=True, page=1, page_size=20):
         """
-        获取用户的白名单申请记录
+        分页查询白名单申请（管理员审批队列），返回 (当前页记录, 符合条件的总数)
+        status / genuine 为 None 时不筛选；日期范围为闭区间，按 (申请日期, 申请ID) 排序
         """
-        import os
-        import json
-        from datetime import datetime
-
-        applications = []
-
-        # 检查申请记录目录是否存在
-        if os.path.exists("whitelist_applications"):
-            # 遍历所有申请记录文件
-            for filename in os.listdir("whitelist_applications"):
-                if filename.startswith(f"{uid}_") and filename.endswith(".json"):
-                    filepath = os.path.join("whitelist_applications", filename)
-                    try:
-                        with open(filepath, "r", encoding="utf-8") as f:
-                            app_data = json.load(f)
-                            applications.append(app_data)
-                    except Exception:
-                        continue
-
-        # 按申请时间排序（最新的在前）
-        applications.sort(key=lambda x: x["date"], reverse=True)
+        where, params = [], []
+        if status is not None:
+            where.append("Status=%s")
+            params.append(status)
+        if date_from:
+            where.append("ApplyDate>=%s")
+            params.append(date_from)
+        if date_to:
+            where.append("ApplyDate<=%s")
+            params.append(date_to)
+        if genuine is not None:
+            where.append("Genuine=%s")
+            params.append(genuine)
+        where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+        order = "DESC" if descending else "ASC"
+
+        total = self._fetchone(f"SELECT COUNT(*) AS n FROM WhitelistApplications {where_sql}", tuple(params))['n']
+        rows = self._fetchall(f"""
+            SELECT * FROM WhitelistApplications {where_sql}
+            ORDER BY ApplyDate {order}, ApplicationID {order}
+            LIMIT %s OFFSET %s
+        """, tuple(params) + (page_size, (page - 1) * page_size))
+        return [self._whitelist_row(r) for r in rows], total
+
+    def get_whitelist_summary(self):
+        """各状态的申请数与今日新增申请数"""
+        rows = self._fetchall("SELECT Status, COUNT(*) AS n FROM WhitelistApplications GROUP BY Status")
+        counts = {r['Status']: r['n'] for r in rows}
+        # 列出全部状态，使今日计数可走 (Status, ApplyDate) 索引
+        today = self._fetchone("""
+            SELECT COUNT(*) AS n FROM WhitelistApplications WHERE Status IN (%s, %s, %s) AND ApplyDate=%s
+        """, (WHITELIST_PENDING, WHITELIST_APPROVED, WHITELIST_REJECTED, datetime.date.today()))['n']
+        return {
+            "pending": counts.get(WHITELIST_PENDING, 0),
+            "approved": counts.get(WHITELIST_APPROVED, 0),
+            "rejected": counts.get(WHITELIST_REJECTED, 0),
+            "today": today,
+        }
 
-        return applications
+    def review_whitelist_application(self, approved, application_id=None, uid=None, playername=None, date=None):
+        """
+        将待审核申请标记为通过/未通过，返回该申请行（UserID、PlayerName 等），不存在或已处理时返回 None
+        优先按 application_id 定位，否则按 (UserID, 日期, 玩家名)；
+        在调用方的事务内执行时申请行被锁定至提交；后续加白应以返回的行为准，而不是请求参数
+        """
+        status = WHITELIST_APPROVED if approved else WHITELIST_REJECTED
+        with self.transaction():
+            if application_id:
+                row = self._fetchone("""
+                    SELECT ApplicationID, UserID, PlayerName, Genuine FROM WhitelistApplications
+                    WHERE ApplicationID=%s AND Status=%s FOR UPDATE
+                """, (application_id, WHITELIST_PENDING))
+            else:
+                row = self._fetchone("""
+                    SELECT ApplicationID, UserID, PlayerName, Genuine FROM WhitelistApplications
+                    WHERE UserID=%s AND ApplyDate=%s AND PlayerName=%s AND Status=%s LIMIT 1 FOR UPDATE
+                """, (uid, date, playername, WHITELIST_PENDING))
+            if not row:
+                return None
+            self._execute("UPDATE WhitelistApplications SET Status=%s, ReviewedAt=%s WHERE ApplicationID=%s",
+                          (status, _get_now(), row['ApplicationID']))
+            return row
+
+    def import_whitelist_files(self, base_dir=None):
+        """
+        一次性导入旧版申请文件（仅在表为空时执行），返回导入条数
+        - 白名单申请/{日期}/{UserID}-{玩家名}.txt          → 待审核
+        - 已审核白名单/{日期}#{UserID}-{玩家名}#{结果}.txt → 已通过 / 未通过
+        """
+        base_dir = base_dir or WHITELIST_CONFIG['legacy_dir']
+        if not os.path.isdir(base_dir):
+            return 0
+        if self._fetchone("SELECT 1 FROM WhitelistApplications LIMIT 1"):
+            return 0
+
+        entries = []  # (日期, UserID, 玩家名, 状态, 文件路径)
+        pending_dir = os.path.join(base_dir, "白名单申请")
+        if os.path.isdir(pending_dir):
+            for date_dir in sorted(os.listdir(pending_dir)):
+                date_path = os.path.join(pending_dir, date_dir)
+                if not os.path.isdir(date_path):
+                    continue
+                for filename in sorted(os.listdir(date_path)):
+                    if filename.endswith(".txt") and "-" in filename:
+                        uid, playername = filename[:-4].split("-", 1)
+                        entries.append((date_dir, uid, playername, WHITELIST_PENDING,
+                                        os.path.join(date_path, filename)))
+        reviewed_dir = os.path.join(base_dir, "已审核白名单")
+        if os.path.isdir(reviewed_dir):
+            for filename in sorted(os.listdir(reviewed_dir)):
+                parts = filename[:-4].split("#")
+                if not filename.endswith(".txt") or len(parts) < 3 or "-" not in parts[1]:
+                    continue
+                uid, playername = parts[1].split("-", 1)
+                status = WHITELIST_APPROVED if parts[2] == "已通过" else WHITELIST_REJECTED
+                entries.append((parts[0], uid, playername, status, os.path.join(reviewed_dir, filename)))
+
+        imported = 0
+        with self.transaction():
+            for date, uid, playername, status, path in entries:
+                try:
+                    apply_date = datetime.datetime.strptime(date, '%Y-%m-%d').date()
+                    genuine, reason = _parse_whitelist_file(path)
+                    mtime = datetime.datetime.fromtimestamp(os.path.getmtime(path)).strftime('%Y-%m-%d %H:%M:%S')
+                    self._execute("""
+                        INSERT INTO WhitelistApplications
+                            (UserID, PlayerName, Genuine, Reason, ApplyDate, Status, CreatedAt, ReviewedAt)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                    """, (int(uid), playername, genuine, reason, apply_date, status, mtime,
+                          None if status == WHITELIST_PENDING else mtime))
+                    imported += 1
+                except (ValueError, OSError, mysql.connector.errors.IntegrityError) as e:
+                    # 日期/用户ID 无法解析或用户已不存在的文件跳过
+                    print(f"[W] 跳过白名单申请文件 {path}: {e}")
+        return imported
 
     # ---------- 签到 ----------
     def has_sign_today(self, uid):
-        # 修改为与app.py一致的逻辑，使用文件检查而非数据库表
-        import os
-        from datetime import date
-        today_date = date.today().strftime('%Y-%m-%d')
-        file_name = f"签到日志/{today_date}.txt"
-        try:
-            with open(file_name, 'r') as file:
-                lines_in_file = file.readlines()
-            lines_in_file = [line.strip() for line in lines_in_file]
-            return str(uid) in lines_in_file
-        except FileNotFoundError:
-            return False
+        return self.sign_log.contains(uid)
 
     def do_sign(self, uid):
-        # 修改为与app.py一致的逻辑
-        import os
+        """签到并发放奖励；今日已签到返回 None"""
         import random
-        from datetime import date
 
-        # 检查今日是否已签到
-        if self.has_sign_today(uid):
+        # 检查并标记今日签到（原子操作，并发重复请求只有一个成功）
+        if not self.sign_log.try_mark(uid):
             return None
 
-        # 写入签到日志文件
-        today_date = date.today().strftime('%Y-%m-%d')
-        file_name = f"签到日志/{today_date}.txt"
-        os.makedirs(os.path.dirname(file_name), exist_ok=True)
-        with open(file_name, 'a') as file:
-            file.write(f"{uid}\n")
-
-        # 获取用户角色
-        role = self.get_role_by_uid(uid)
+        # 发放奖励失败时撤销签到标记，以便用户重试
+        try:
+            # 获取用户角色
+            role = self.get_role_by_uid(uid)
 
-        # 计算签到奖励
-        coin = random.randint(1, 10)
-        star = 0
+            # 计算签到奖励
+            coin = random.randint(1, 10)
+            star = 0
 
-        # VIP额外奖励
-        if role <= 2:
-            coin += random.randint(1, 5)
+            # VIP额外奖励
+            if role <= 2:
+                coin += random.randint(1, 5)
 
-        # 星星奖励
-        stars_random = random.randint(0, 100)
-        if stars_random < 5:  # 5%获得1颗星星
-            star = 1
-        elif stars_random == 99:  # 1%获得5颗星星
-            star = 5
+            # 星星奖励
+            stars_random = random.randint(0, 100)
+            if stars_random < 5:  # 5%获得1颗星星
+                star = 1
+            elif stars_random == 99:  # 1%获得5颗星星
+                star = 5
 
-        # 更新用户数据
-        self._execute("UPDATE Users SET Coins=Coins+%s, Stars=Stars+%s WHERE UserID=%s", (coin, star, uid))
+            # 更新用户数据
+            balance = self.grant(uid, coins=coin, stars=star)
+        except Exception:
+            self.sign_log.unmark(uid)
+            raise
 
-        return {"coin": coin, "star": star}
+        return {"coin": coin, "star": star, "balance": balance}
 
     # ---------- 排行榜 ----------
     def coin_leaderboard(self):
@@ -687,17 +2069,24 @@ class DatabaseManager:
 
     # ---------- 登录日志 ----------
     def log_login(self, uid, ip, address):
-        self._execute("INSERT INTO UserLoginRecords (UserID, IPAddress, Address) VALUES (%s,%s,%s)",
-                      (uid, ip, address))
+        """写入登录记录，返回 RecordID（地址可稍后由 update_login_address 补全）"""
+        return self._execute("INSERT INTO UserLoginRecords (UserID, IPAddress, Address) VALUES (%s,%s,%s)",
+                             (uid, ip, address[:100]))
+
+    def update_login_address(self, record_id, address):
+        self._execute("UPDATE UserLoginRecords SET Address=%s WHERE RecordID=%s", (address[:100], record_id))
 
     # ---------- QQ 绑定 ----------
     def get_qq_by_uid(self, uid):
-        r = self._fetchone("SELECT QQID FROM UserQQ_Con WHERE UserID=%s", (uid,))
-        return r['QQID'] if r else None
+        def load():
+            r = self._fetchone("SELECT QQID FROM UserQQ_Con WHERE UserID=%s", (uid,))
+            return r['QQID'] if r else None
+        return self.profile_cache.get_or_load(uid, 'qq', load)
 
     def bind_qq(self, uid, qq):
         self._execute("INSERT INTO UserQQ_Con (UserID, QQID) VALUES (%s,%s) ON DUPLICATE KEY UPDATE QQID=%s",
                       (uid, qq, qq))
+        self.invalidate_profile(uid)
         return True
 
     # ---------- 通用 ----------
@@ -715,14 +2104,29 @@ class DatabaseManager:
             return self._fetchall(sql, params)
         else:
             self._execute(sql, params)
+            # 任意写语句都可能改动资料，整体清空缓存
+            self.profile_cache.clear()
+            self.player_index.clear()
             return True
+
     def get_user_id_by_player_name(self, player_name):
         """通过玩家名获取用户ID"""
-        result = self._fetchone(
-            "SELECT u.UserID FROM Users u JOIN PlayerData pd ON u.UserID = pd.UserID WHERE pd.PlayerName = %s", 
-            (player_name,)
-        )
-        return result['UserID'] if result else None
+        return self.get_user_ids_by_player_names([player_name]).get(player_name)
+
+    def get_user_ids_by_player_names(self, player_names):
+        """批量通过玩家名获取用户ID，返回 {玩家名: UserID}（未注册的玩家名不出现在结果中）"""
+        found, missing, epoch = self.player_index.lookup(player_names)
+        if missing:
+            placeholders = ",".join(["%s"] * len(missing))
+            rows = self._fetchall(f"""
+                SELECT pd.PlayerName, u.UserID FROM Users u JOIN PlayerData pd ON u.UserID = pd.UserID
+                WHERE pd.PlayerName IN ({placeholders})
+            """, tuple(missing))
+            by_lower = {r['PlayerName'].lower(): r['UserID'] for r in rows}
+            loaded = {name: by_lower.get(name.lower()) for name in missing}
+            self.player_index.store(loaded, epoch)
+            found.update(loaded)
+        return {name: uid for name, uid in found.items() if uid is not None}
 
     def get_user_by_player_name(self, player_name):
         """通过玩家名获取用户信息"""